@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Allocation throughput of the allocator runtime (pykit.runtime.allocator)
+against malloc, in nanoseconds per allocation. A compiled loop calls a
+function that allocates `count` objects, writes to them and frees them:
+
+    malloc      malloc() and free() from libc
+    pool        size-class pool (env["lower.allocator"] = "pool")
+    arena       function-scoped arena, freed at return ("arena")
+
+    $ python benchmarks/bench_alloc.py [ncalls] [llvmlite|c] [count]
+"""
+
+from __future__ import print_function, division, absolute_import
+import sys
+import ctypes
+import ctypes.util
+import timeit
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const, GlobalValue
+from pykit.runtime import allocator
+
+I = types.Int64
+P = types.Pointer(I)
+
+libc = ctypes.CDLL(ctypes.util.find_library('c'))
+
+def libc_function(name, signature):
+    # Renamed, LLVM would remove malloc/free pairs
+    address = ctypes.cast(getattr(libc, name), ctypes.c_void_p).value
+    return GlobalValue('libc_' + name, signature, external=True,
+                       address=address)
+
+malloc = libc_function('malloc', allocator.signatures['pykit_alloc'])
+free = libc_function('free', allocator.signatures['pykit_free'])
+
+def make_work(size, use_malloc, count):
+    """Allocate `count` objects, write x to them and free them"""
+    func = Function("work", ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    x, = func.args
+    objects = []
+    for i in range(count):
+        if use_malloc:
+            p = b.call(allocator.void_p, [malloc, [Const(size, I)]])
+            objects.append((p, b.ptrcast(P, [p])))
+        else:
+            p = b.new_data(P, [Const(size, I)])
+            objects.append((p, p))
+        b.ptrstore(types.Void, [objects[-1][1], x])
+
+    result = Const(0, I)
+    for p, ptr in objects:
+        result = b.add(I, [result, b.ptrload(I, [ptr])])
+        if use_malloc:
+            b.call(types.Void, [free, [p]])
+        else:
+            b.gc_dealloc(types.Void, [p])
+    b.ret(result)
+    return func
+
+def make_loop(work):
+    """sum(work(i) for i in range(n))"""
+    func = Function("loop", ['n'], types.Function(I, [I]))
+    entry, cond, body, exit = [func.new_block(name) for name in
+                                   ('entry', 'cond', 'body', 'exit')]
+    n, = func.args
+    b = Builder(func)
+    with b.at_end(entry):
+        b.jump(cond)
+    with b.at_end(cond):
+        i = b.phi(I, [[], []])
+        s = b.phi(I, [[], []])
+        b.cbranch(b.lt(types.Bool, [i, n]), body, exit)
+    with b.at_end(body):
+        s2 = b.add(I, [s, b.call(I, [work, [i]])])
+        i2 = b.add(I, [i, Const(1, I)])
+        b.jump(cond)
+    with b.at_end(exit):
+        b.ret(s)
+    i.set_args([[entry, body], [Const(0, I), i2]])
+    s.set_args([[entry, body], [Const(0, I), s2]])
+    return func
+
+def compile(codegen, size, mode, count):
+    env = environment.fresh_env()
+    env["codegen.cache"] = {}
+    env["lower.allocator"] = "pool" if mode == "malloc" else mode
+    codegen.install(env)
+    work = make_work(size, mode == "malloc", count)
+    func = make_loop(work)
+    pipeline.lower(work, env)
+    lfunc, env = pipeline.codegen(func, env)
+    return env, codegen.wrapper(lfunc, env)
+
+def main(ncalls=250000, backend='llvmlite', count=4):
+    codegen = __import__('pykit.codegen.' + backend,
+                         fromlist=['install', 'wrapper'])
+    modes = ('malloc', 'pool', 'arena')
+    print("Allocation throughput, %s, ns/allocation" % backend)
+    print("%-8s" % 'size' + ''.join("%10s" % mode for mode in modes))
+    for size in (16, 64, 256, 4096):
+        timings = []
+        for mode in modes:
+            env, cfunc = compile(codegen, size, mode, count) # keep env alive
+            t = min(timeit.repeat(lambda: cfunc(ncalls), number=1, repeat=5))
+            timings.append(t / (ncalls * count) * 1e9)
+        print("%-8d" % size + ''.join("%10.2f" % t for t in timings))
+
+if __name__ == '__main__':
+    main(*[int(arg) if arg.isdigit() else arg for arg in sys.argv[1:]])
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Call overhead of a small compiled function, in nanoseconds per call:
+
+    uncached    build a ctypes wrapper for every call (the old execute())
+    execute     execute() with the cached wrapper
+    ctypes      calling the cached ctypes wrapper directly
+    batched     per element of a batched call (see pykit.codegen.batched)
+
+    $ python benchmarks/bench_call_overhead.py [ncalls] [llvmlite|c]
+"""
+
+from __future__ import print_function, division, absolute_import
+import sys
+import timeit
+
+import numpy as np
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder
+from pykit.codegen import batched
+
+F = types.Float64
+
+def make_axpy():
+    func = Function("axpy", ['a', 'x'], types.Function(F, [F, F]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    a, x = func.args
+    b.ret(b.add(F, [b.mul(F, [a, x]), x]))
+    return func
+
+def main(ncalls=100000, backend='llvmlite'):
+    codegen = __import__('pykit.codegen.' + backend,
+                         fromlist=['install', 'wrapper'])
+    func = make_axpy()
+    env = environment.fresh_env()
+    env["codegen.cache"] = {}
+    codegen.install(env)
+    lfunc, env = pipeline.codegen(func, env)
+
+    def uncached():
+        env["codegen.%s.wrappers" % codegen.name].clear()
+        return codegen.execute(lfunc, env, 2.0, 3.0)
+
+    cfunc = codegen.wrapper(lfunc, env)
+    batch = batched.batched(func, env, codegen)
+    a, x = np.full(ncalls, 2.0), np.full(ncalls, 3.0)
+
+    timings = [
+        ('uncached', uncached, ncalls // 10),
+        ('execute', lambda: codegen.execute(lfunc, env, 2.0, 3.0), ncalls),
+        ('ctypes', lambda: cfunc(2.0, 3.0), ncalls),
+    ]
+
+    print("Call overhead of axpy(a, x), %s, ns/call" % backend)
+    for name, f, n in timings:
+        t = min(timeit.repeat(f, number=n, repeat=3))
+        print("%-10s %10.1f" % (name, t / n * 1e9))
+    t = min(timeit.repeat(lambda: batch(a, x), number=1, repeat=3))
+    print("%-10s %10.1f" % ('batched', t / ncalls * 1e9))
+
+if __name__ == '__main__':
+    main(*[int(arg) if arg.isdigit() else arg for arg in sys.argv[1:]])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Costful vs zero-cost exceptions (env["lower.exceptions"]) on call-heavy
+code with rare errors. A chain of `depth` functions each call the next one,
+the last one raises for a magic argument that is never passed on the hot
+path. Each function is compiled in its own module, so calls are not inlined.
+
+    hot path    ns per call of the chain from a native loop, no errors
+    error       ns per call from Python raising an error at the bottom
+
+    $ python benchmarks/bench_exceptions.py [ncalls] [depth]
+"""
+
+from __future__ import print_function, division, absolute_import
+import sys
+import timeit
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen import llvmlite as codegen
+
+I = types.Int64
+MAGIC = -12345
+
+def make_chain(depth):
+    """f0(x) raises for MAGIC, fk(x) = f(k-1)(x) + 1"""
+    leaf = Function("f0", ['x'], types.Function(I, [I]))
+    b = Builder(leaf)
+    b.position_at_end(leaf.new_block("entry"))
+    x, = leaf.args
+    b.check_error(x, Const(MAGIC, I))
+    b.ret(b.add(I, [x, Const(1, I)]))
+
+    chain = [leaf]
+    for k in range(1, depth):
+        func = Function("f%d" % k, ['x'], types.Function(I, [I]))
+        b = Builder(func)
+        b.position_at_end(func.new_block("entry"))
+        result = b.call(I, [chain[-1], func.args])
+        b.check_error(result, Const(MAGIC, I))
+        b.ret(b.add(I, [result, Const(1, I)]))
+        chain.append(func)
+    return chain
+
+def make_driver(callee):
+    """sum(callee(i & 255) for i in range(n))"""
+    func = Function("drive", ['n'], types.Function(I, [I]))
+    entry, cond, body, exit = [func.new_block(name) for name in
+                                   ('entry', 'cond', 'body', 'exit')]
+    n, = func.args
+    b = Builder(func)
+    with b.at_end(entry):
+        b.jump(cond)
+    with b.at_end(cond):
+        i = b.phi(I, [[], []])
+        s = b.phi(I, [[], []])
+        b.cbranch(b.lt(types.Bool, [i, n]), body, exit)
+    with b.at_end(body):
+        x = b.bitand(I, [i, Const(255, I)])
+        result = b.call(I, [callee, [x]])
+        b.check_error(result, Const(MAGIC, I))
+        s2 = b.add(I, [s, result])
+        i2 = b.add(I, [i, Const(1, I)])
+        b.jump(cond)
+    with b.at_end(exit):
+        b.ret(s)
+    i.set_args([[entry, body], [Const(0, I), i2]])
+    s.set_args([[entry, body], [Const(0, I), s2]])
+    return func
+
+def compile(model, depth):
+    env = environment.fresh_env()
+    env["codegen.cache"] = {}
+    env["lower.exceptions"] = model
+    codegen.install(env)
+
+    chain = make_chain(depth)
+    funcs = chain + [make_driver(chain[-1])]
+    lfuncs = []
+    for func in funcs:
+        pipeline.lower(func, env)
+        lfunc, env = pipeline.codegen(func, env)
+        codegen.optimize(lfunc, env)
+        lfuncs.append(lfunc)
+    return env, lfuncs[-2], lfuncs[-1]
+
+def main(ncalls=1000000, depth=8):
+    print("Exceptions, call chain of depth %d, ns/call" % depth)
+    print("%-10s %10s %10s" % ('model', 'hot path', 'error'))
+    for model in ('costful', 'zerocost'):
+        env, top, drive = compile(model, depth)
+        drive = codegen.wrapper(drive, env)
+        top = codegen.wrapper(top, env)
+
+        t = min(timeit.repeat(lambda: drive(ncalls), number=1, repeat=5))
+        hot = t / ncalls * 1e9
+        nerrors = 10000
+        t = min(timeit.repeat(lambda: top(MAGIC), number=nerrors, repeat=3))
+        error = t / nerrors * 1e9
+        print("%-10s %10.2f %10.1f" % (model, hot, error))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
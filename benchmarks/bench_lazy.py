@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Time to first result for a function whose call graph contains many
+rarely used functions, compiling the call graph eagerly versus lazily
+(see pykit.codegen.lazy).
+
+    $ python benchmarks/bench_lazy.py [nfuncs] [llvmlite|c]
+"""
+
+from __future__ import print_function, division, absolute_import
+import sys
+import time
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen import lazy
+
+I = types.Int32
+
+def make_function(i):
+    """f_i(x) = sum(x * k for k in range(16)) + i"""
+    func = Function("f_%d" % i, ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    x, = func.args
+    result = Const(i, I)
+    for k in range(16):
+        result = b.add(I, [result, b.mul(I, [x, Const(k, I)])])
+    b.ret(result)
+    return func
+
+def make_main(callees):
+    """main(x) = x if x >= 0 else f_n(...f_1(f_0(x)))"""
+    func = Function("main", ['x'], types.Function(I, [I]))
+    entry, rare, exit = [func.new_block(name)
+                             for name in ('entry', 'rare', 'exit')]
+    b = Builder(func)
+    x, = func.args
+    with b.at_end(entry):
+        b.cbranch(b.ge(types.Bool, [x, Const(0, I)]), exit, rare)
+    with b.at_end(rare):
+        result = x
+        for callee in callees:
+            result = b.call(I, [callee, [result]])
+        b.ret(result)
+    with b.at_end(exit):
+        b.ret(x)
+    return func
+
+def first_result(codegen, nfuncs, lazily):
+    main = make_main([make_function(i) for i in range(nfuncs)])
+    t = time.time()
+    env = environment.fresh_env()
+    env["codegen.cache"] = {}
+    codegen.install(env)
+    if lazily:
+        lazy.install(env, codegen)
+        cfunc = lazy.slot(main, env)
+    else:
+        lfunc, env = pipeline.codegen(main, env)
+        cfunc = env["codegen.%s.ctypes" % codegen.name]
+    assert cfunc(1) == 1
+    return time.time() - t
+
+def main(nfuncs=1000, backend='llvmlite'):
+    codegen = __import__('pykit.codegen.' + backend, fromlist=['install'])
+    print("Time to first result, %d functions, %s" % (nfuncs, backend))
+    for name, lazily in [('eager', False), ('lazy', True)]:
+        print("%-8s %8.3fs" % (name, first_result(codegen, nfuncs, lazily)))
+
+if __name__ == '__main__':
+    main(*[int(arg) if arg.isdigit() else arg for arg in sys.argv[1:]])
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compile 1000 functions one after another and report the time per
+function, reoptimizing the entire module after each function versus
+optimizing only the new functions and running the module passes over each
+batch of new functions.
+
+    $ python benchmarks/bench_llvm_compile.py [nfuncs] [batchsize]
+"""
+
+from __future__ import print_function, division, absolute_import
+import sys
+import time
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen import llvm as codegen
+from pykit.codegen.llvm import llvm_utils
+
+I = types.Int32
+
+def make_function(i):
+    """f_i(x) = sum(x * k for k in range(i % 16)) + i"""
+    func = Function("f_%d" % i, ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    x, = func.args
+    result = Const(i, I)
+    for k in range(i % 16):
+        result = b.add(I, [result, b.mul(I, [x, Const(k, I)])])
+    b.ret(result)
+    return func
+
+def fresh():
+    env = environment.fresh_env()
+    env["codegen.cache"] = {}
+    codegen.install(env)
+    return env
+
+def compile_module(funcs):
+    """Reoptimize the whole module after every function"""
+    env = fresh()
+    with codegen.batch(env): # keep all functions in one module
+        for func in funcs:
+            lfunc, env = pipeline.codegen(func, env)
+            llvm_utils.optimize(env["codegen.llvm.module"],
+                                env["codegen.llvm.machine"],
+                                env["codegen.llvm.opt"])
+
+def compile_incremental(funcs, batchsize):
+    """Optimize new functions only, module passes once per batch"""
+    env = fresh()
+    for start in range(0, len(funcs), batchsize):
+        with codegen.batch(env):
+            for func in funcs[start:start + batchsize]:
+                lfunc, env = pipeline.codegen(func, env)
+                codegen.optimize(lfunc, env)
+
+def bench(name, f, *args):
+    t = time.time()
+    f(*args)
+    elapsed = time.time() - t
+    nfuncs = len(args[0])
+    print("%-12s %8.3fs total %8.3fms/function" % (
+        name, elapsed, elapsed / nfuncs * 1000))
+
+def main(nfuncs=1000, batchsize=100):
+    funcs = [make_function(i) for i in range(nfuncs)]
+    print("Compiling %d functions, batch size %d" % (nfuncs, batchsize))
+    bench("incremental", compile_incremental, funcs, batchsize)
+    bench("module", compile_module, funcs)
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Wall-clock time to compile a module of independent functions to objects
+with llvmlite, in one process versus partitioned over worker processes
+(pykit.codegen.llvmlite.parallel).
+
+    $ python benchmarks/bench_parallel_compile.py [nfuncs] [jobs]
+"""
+
+from __future__ import print_function, division, absolute_import
+import sys
+import time
+import multiprocessing
+
+from pykit import environment, types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen import llvmlite as codegen
+from pykit.codegen.llvmlite import aot, parallel
+
+I = types.Int32
+
+def make_function(i, size=200):
+    """f_i(x) = x * 0 + x * 1 + ... + i"""
+    func = Function("f_%d" % i, ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    x, = func.args
+    result = Const(i, I)
+    for k in range(size):
+        result = b.add(I, [result, b.mul(I, [x, Const(k ^ i, I)])])
+    b.ret(result)
+    return func
+
+def fresh():
+    env = environment.fresh_env()
+    env["codegen.cache"] = {}
+    codegen.install(env)
+    env["pipeline.codegen"] = [p for p in env["pipeline.codegen"]
+                                   if p not in ("passes.codegen",
+                                                "passes.llvmlite.ctypes")]
+    return env
+
+def bench(name, f):
+    t = time.time()
+    f()
+    print("%-12s %8.3fs" % (name, time.time() - t))
+
+def main(nfuncs=500, jobs=multiprocessing.cpu_count()):
+    print("Compiling %d functions, %d jobs" % (nfuncs, jobs))
+    funcs = [make_function(i) for i in range(nfuncs)]
+    bench("serial", lambda: aot.emit_object(funcs, fresh()))
+    funcs = [make_function(i) for i in range(nfuncs)]
+    bench("parallel", lambda: parallel.emit_objects(funcs, fresh(), jobs))
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
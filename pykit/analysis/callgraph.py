@@ -29,4 +29,24 @@ def callgraph(func, graph=None, seen=None):
                 graph.add_edge(func, callee)
                 callgraph(callee, graph, seen)
 
-    return graph
\ No newline at end of file
+    return graph
+
+def module_callgraph(module):
+    """
+    Build a call graph of all functions in the module.
+    """
+    graph = nx.DiGraph()
+    seen = set()
+    for func in module.functions.values():
+        callgraph(func, graph, seen)
+    return graph
+
+def bottom_up(graph):
+    """
+    Return the strongly connected components of the call graph in
+    bottom-up order, i.e. callees before callers ([[Function]]).
+    """
+    sccs = [list(scc) for scc in nx.strongly_connected_components(graph)]
+    condensed = nx.condensation(graph, sccs)
+    order = list(nx.topological_sort(condensed))
+    return [sccs[i] for i in reversed(order)]
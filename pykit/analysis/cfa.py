@@ -8,7 +8,7 @@ phi Operations in the IR.
 from __future__ import print_function, division, absolute_import
 import collections
 
-from pykit.ir import ops, Builder, Undef
+from pykit.ir import ops, Block, Builder, Undef
 from pykit.analysis import defuse
 from pykit.utils import mergedicts
 
@@ -46,7 +46,8 @@ def cfg(func):
         elif op.opcode == 'ret':
             targets = []
         else:
-            assert op.opcode == ops.exc_throw # exc_throw
+            assert op.opcode in (ops.exc_throw, ops.exc_unwind)
+            targets = []
             # Below we add all exception handlers as targets. There's nothing
             # to do here (except add the exit block?)
 
@@ -205,14 +206,96 @@ def merge_blocks(func, pred, succ):
     pred.extend(succ)
     func.del_block(succ)
 
+    # Patch phis in the successors, which now have `pred` as predecessor
+    for target in pred.terminator.args:
+        if isinstance(target, Block):
+            for phi in target.leaders:
+                if phi.opcode == 'phi':
+                    blocks, values = phi.args
+                    blocks = [pred if b is succ else b for b in blocks]
+                    phi.set_args([blocks, values])
+
 def simplify(func, cfg):
     """
     Simplify control flow. Merge consecutive blocks where the parent has one
     child, the child one parent, and both have compatible instruction leaders.
+    Phis in the child have a single incoming value and are removed.
+
+    Returns the list of blocks that were merged into their predecessor.
     """
-    for block in reversed(list(func.blocks)):
-        if len(cfg.predecessors(block)) == 1 and not list(block.leaders):
+    merged = {} # { block : block it was merged into }
+    for block in list(func.blocks):
+        leaders = block.leaders
+        if (len(cfg.predecessors(block)) == 1 and
+                all(op.opcode == 'phi' for op in leaders)):
             [pred] = cfg.predecessors(block)
+            if len(cfg[pred]) != 1 or pred.terminator.opcode != 'jump':
+                continue
+
+            # Merge into the block that absorbed `pred`, so that every op
+            # is moved only once
+            while pred in merged:
+                pred = merged[pred]
+
             exc_block = any(op.opcode in ('exc_setup',) for op in pred.leaders)
-            if not exc_block and len(cfg[pred]) == 1:
-                merge_blocks(func, pred, block)
\ No newline at end of file
+            if pred is not block and not exc_block:
+                for phi in leaders:
+                    value = phi.args[1][0]
+                    phi.replace_uses(value)
+                    phi.delete()
+                merge_blocks(func, pred, block)
+                merged[block] = pred
+
+    return list(merged)
+
+# ______________________________________________________________________
+
+def reachable(func, cfg):
+    """Return the set of blocks reachable from the entry block"""
+    seen = set([func.startblock])
+    worklist = [func.startblock]
+    while worklist:
+        block = worklist.pop()
+        for succ in cfg.successors(block):
+            if succ not in seen:
+                seen.add(succ)
+                worklist.append(succ)
+    return seen
+
+def delete_blocks(func, blocks):
+    """
+    Delete the given blocks, which must not be reachable from the remaining
+    blocks. The Ops in the blocks must not be used outside the blocks,
+    except by phis, whose incoming values from the deleted blocks are removed.
+    """
+    blocks = set(blocks)
+    for block in blocks:
+        for op in block:
+            op.set_args(_clear(op.args))
+
+    for block in func.blocks:
+        if block in blocks:
+            continue
+        for phi in block.leaders:
+            if phi.opcode == 'phi':
+                preds, values = phi.args
+                if any(pred in blocks for pred in preds):
+                    incoming = [(p, v) for p, v in zip(preds, values)
+                                           if p not in blocks]
+                    phi.set_args([[p for p, v in incoming],
+                                  [v for p, v in incoming]])
+
+    for block in blocks:
+        for op in block:
+            op.delete()
+        func.del_block(block)
+
+def _clear(args):
+    return [[] if isinstance(arg, list) else None for arg in args]
+
+def delete_unreachable(func, flow=None):
+    """Delete blocks unreachable from the entry block, return them"""
+    live = reachable(func, flow or cfg(func))
+    dead = [block for block in func.blocks if block not in live]
+    delete_blocks(func, dead)
+    return dead
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generic bit-vector data flow framework.
+
+Items tracked by a data flow problem (values, definitions, expressions) are
+numbered densely and sets of items are represented as integer bitsets, so
+meet and transfer functions are a handful of bigint operations per block:
+
+    forward:    IN(b)  = meet(OUT(p) | edge(p, b) for p in preds(b))
+                OUT(b) = gen(b) | (IN(b) & ~kill(b))
+
+    backward:   OUT(b) = meet(IN(s) | edge(b, s) for s in succs(b))
+                IN(b)  = gen(b) | (OUT(b) & ~kill(b))
+
+The `edge` contribution is used e.g. by liveness for phi operands, which are
+live at the end of the corresponding predecessor only.
+
+Problems provided:
+
+    liveness(func)                  backward, union
+    reaching_definitions(func)      forward, union
+    available_expressions(func)     forward, intersection
+"""
+
+from __future__ import print_function, division, absolute_import
+import heapq
+import binascii
+from collections import defaultdict
+
+from pykit.ir import Op, FuncArg, Const, defs, ops
+from pykit.analysis import cfa
+from pykit.utils import flatten
+
+#===------------------------------------------------------------------===
+# Bitsets
+#===------------------------------------------------------------------===
+
+def bitset(indices):
+    """Build an integer bitset from an iterable of indices"""
+    indices = list(indices)
+    if not indices:
+        return 0
+    buf = bytearray(max(indices) // 8 + 1)
+    for i in indices:
+        buf[i >> 3] |= 1 << (i & 7)
+    buf.reverse()
+    return int(binascii.hexlify(bytes(buf)), 16)
+
+def members(bits):
+    """Return the list of indices set in bitset `bits`"""
+    digits = bin(bits)[:1:-1]
+    return [i for i, digit in enumerate(digits) if digit == '1']
+
+class Numbering(object):
+    """
+    Dense numbering of items:
+
+        index: { item : index }
+        items: [item]
+    """
+
+    def __init__(self, items=()):
+        self.index = {}
+        self.items = []
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        """Number an item if not numbered already, returns its index"""
+        if item not in self.index:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+        return self.index[item]
+
+    def bitset(self, items):
+        """Set of items -> bitset"""
+        index = self.index
+        return bitset(index[item] for item in items)
+
+    def decode(self, bits):
+        """Bitset -> set of items"""
+        items = self.items
+        return set(items[i] for i in members(bits))
+
+    @property
+    def universe(self):
+        """Bitset of all items"""
+        return (1 << len(self.items)) - 1
+
+    def __len__(self):
+        return len(self.items)
+
+#===------------------------------------------------------------------===
+# Solver
+#===------------------------------------------------------------------===
+
+FORWARD, BACKWARD = 'forward', 'backward'
+UNION, INTERSECTION = 'union', 'intersection'
+
+class DataFlowProblem(object):
+    """
+    Bit-vector data flow problem. Subclasses set `direction` and `meet`
+    and fill in `numbering`, `gen` and `kill` ({ block : bitset }).
+
+        boundary: value at the entry (forward) or exits (backward)
+        edges:    { (src, dst) : bitset } flowing along CFG edges
+    """
+
+    direction = FORWARD
+    meet = UNION
+
+    def __init__(self, func, cfg):
+        self.func = func
+        self.cfg = cfg
+        self.numbering = Numbering()
+        self.gen = {}
+        self.kill = {}
+        self.edges = {}
+        self.boundary = 0
+
+    @property
+    def top(self):
+        """Initial value for the meet: empty for union, all for intersection"""
+        if self.meet == UNION:
+            return 0
+        return self.numbering.universe
+
+
+class DataFlowResult(object):
+    """
+    Solution of a DataFlowProblem:
+
+        ins:  { block : bitset at block entry }
+        outs: { block : bitset at block exit }
+    """
+
+    def __init__(self, problem, ins, outs):
+        self.problem = problem
+        self.numbering = problem.numbering
+        self.ins = ins
+        self.outs = outs
+
+    def at_entry(self, block):
+        """Set of items at the start of the block"""
+        return self.numbering.decode(self.ins[block])
+
+    def at_exit(self, block):
+        """Set of items at the end of the block"""
+        return self.numbering.decode(self.outs[block])
+
+
+def postorder(func, cfg):
+    """Blocks in post-order, followed by blocks unreachable from the entry"""
+    seen = set([func.startblock])
+    order = []
+    stack = [(func.startblock, iter(cfg.successors(func.startblock)))]
+    while stack:
+        block, successors = stack[-1]
+        for succ in successors:
+            if succ not in seen:
+                seen.add(succ)
+                stack.append((succ, iter(cfg.successors(succ))))
+                break
+        else:
+            stack.pop()
+            order.append(block)
+
+    order.extend(block for block in func.blocks if block not in seen)
+    return order
+
+def solve(problem):
+    """
+    Solve a DataFlowProblem with a worklist algorithm.
+    Returns a DataFlowResult.
+    """
+    func, cfg = problem.func, problem.cfg
+    forward = problem.direction == FORWARD
+    union = problem.meet == UNION
+    gen, kill, edges = problem.gen, problem.kill, problem.edges
+    top = problem.top
+
+    order = postorder(func, cfg)
+    if forward:
+        order.reverse()
+        sources = dict((b, list(cfg.predecessors(b))) for b in order)
+        sinks = dict((b, list(cfg.successors(b))) for b in order)
+    else:
+        sources = dict((b, list(cfg.successors(b))) for b in order)
+        sinks = dict((b, list(cfg.predecessors(b))) for b in order)
+
+    # before: IN for forward problems, OUT for backward problems
+    before = dict.fromkeys(order, top)
+    after = dict((b, gen[b] | (top & ~kill[b])) for b in order)
+    keep = dict((b, ~kill[b]) for b in order)
+
+    # Process the worklist in (reverse) post-order
+    priority = dict((b, i) for i, b in enumerate(order))
+    worklist = list(range(len(order)))
+    queued = set(order)
+    while worklist:
+        block = order[heapq.heappop(worklist)]
+        queued.discard(block)
+
+        # Meet
+        incoming = sources[block]
+        if not incoming:
+            value = problem.boundary
+        else:
+            value = None
+            for src in incoming:
+                if forward:
+                    v = after[src] | edges.get((src, block), 0)
+                else:
+                    v = after[src] | edges.get((block, src), 0)
+                if value is None:
+                    value = v
+                elif union:
+                    value |= v
+                else:
+                    value &= v
+        before[block] = value
+
+        # Transfer
+        new = gen[block] | (value & keep[block])
+        if new != after[block]:
+            after[block] = new
+            for sink in sinks[block]:
+                if sink not in queued:
+                    queued.add(sink)
+                    heapq.heappush(worklist, priority[sink])
+
+    if forward:
+        return DataFlowResult(problem, before, after)
+    return DataFlowResult(problem, after, before)
+
+#===------------------------------------------------------------------===
+# Liveness
+#===------------------------------------------------------------------===
+
+def _locals(args):
+    return [arg for arg in flatten(args) if isinstance(arg, (Op, FuncArg))]
+
+class Liveness(DataFlowProblem):
+    """
+    Live values (FuncArg and Op). Phi operands are live at the end of the
+    corresponding predecessor, not at the start of the phi's block.
+    """
+
+    direction = BACKWARD
+    meet = UNION
+
+    def __init__(self, func, cfg):
+        super(Liveness, self).__init__(func, cfg)
+        numbering = self.numbering
+        for arg in func.args:
+            numbering.add(arg)
+        for op in func.ops:
+            numbering.add(op)
+
+        index = numbering.index
+        phi_uses = defaultdict(list) # { (pred, block) : [index] }
+        for block in func.blocks:
+            uses, defined = [], set()
+            for op in block:
+                if op.opcode == ops.phi:
+                    for pred, value in zip(*op.args):
+                        if isinstance(value, (Op, FuncArg)):
+                            phi_uses[pred, block].append(index[value])
+                else:
+                    for arg in _locals(op.args):
+                        if arg not in defined:
+                            uses.append(index[arg])
+                defined.add(op)
+
+            self.gen[block] = bitset(uses)
+            self.kill[block] = numbering.bitset(defined)
+
+        for edge, uses in phi_uses.items():
+            self.edges[edge] = bitset(uses)
+
+
+def liveness(func, cfg=None):
+    """
+    Compute the values live at the start and end of each block.
+    Returns a DataFlowResult.
+    """
+    return solve(Liveness(func, cfg or cfa.cfg(func)))
+
+#===------------------------------------------------------------------===
+# Reaching definitions
+#===------------------------------------------------------------------===
+
+class ReachingDefinitions(DataFlowProblem):
+    """
+    Definitions of stack variables: the `alloca` allocating the variable
+    (undefined value) and each `store` to the variable.
+    """
+
+    direction = FORWARD
+    meet = UNION
+
+    def __init__(self, func, cfg):
+        super(ReachingDefinitions, self).__init__(func, cfg)
+        numbering = self.numbering
+        vardefs = defaultdict(list) # { alloca : [index] }
+        for op in func.ops:
+            var = self.defined_var(op)
+            if var is not None:
+                vardefs[var].append(numbering.add(op))
+
+        for block in func.blocks:
+            last = {} # { alloca : definition }
+            for op in block:
+                var = self.defined_var(op)
+                if var is not None:
+                    last[var] = op
+
+            self.gen[block] = numbering.bitset(last.values())
+            self.kill[block] = bitset(i for var in last for i in vardefs[var])
+
+    @staticmethod
+    def defined_var(op):
+        """The stack variable defined by `op`, or None"""
+        if op.opcode == ops.alloca:
+            return op
+        elif op.opcode == ops.store and isinstance(op.args[1], Op):
+            return op.args[1]
+
+
+def reaching_definitions(func, cfg=None):
+    """
+    Compute the variable definitions (alloca and store Ops) reaching the
+    start and end of each block. Returns a DataFlowResult.
+    """
+    return solve(ReachingDefinitions(func, cfg or cfa.cfg(func)))
+
+#===------------------------------------------------------------------===
+# Available expressions
+#===------------------------------------------------------------------===
+
+pure_ops = set(defs.unary) | set(defs.binary) | set(defs.compare)
+pure_ops.discard(ops.contains)
+
+def _key(value):
+    if isinstance(value, Const):
+        return ('const', str(value))
+    return value
+
+def expression(op):
+    """Hashable expression computed by `op`, or None if not pure"""
+    if op.opcode in pure_ops or op.opcode == ops.load:
+        return (op.opcode, op.type, tuple(_key(arg) for arg in op.args))
+
+
+class AvailableExpressions(DataFlowProblem):
+    """
+    Pure expressions (unary, binary and compare operations and loads)
+    computed on every path. Loads are killed by stores to the loaded
+    variable. Loads of variables with other uses than loads and stores,
+    and loads through pointers, are also killed by stores through pointers
+    that may alias and by any other op that may write memory.
+    """
+
+    direction = FORWARD
+    meet = INTERSECTION
+
+    def __init__(self, func, cfg):
+        super(AvailableExpressions, self).__init__(func, cfg)
+        numbering = self.numbering
+        for op in func.ops:
+            expr = expression(op)
+            if expr is not None:
+                numbering.add(expr)
+
+        index = numbering.index
+        loads = defaultdict(list)  # { var : [expression index] }
+        for expr in numbering.items:
+            if expr[0] == ops.load:
+                loads[expr[2][0]].append(index[expr])
+
+        promotable = cfa.find_allocas(func)
+        escaping = [i for var, idxs in loads.items()
+                          if var not in promotable for i in idxs]
+
+        for block in func.blocks:
+            killed = {}    # { expression index : position }
+            generated = {} # { expression index : position }
+            for pos, op in enumerate(block):
+                expr = expression(op)
+                if expr is not None:
+                    generated[index[expr]] = pos
+                elif op.opcode == ops.store:
+                    for i in loads.get(op.args[1], ()):
+                        killed[i] = pos
+                    if op.args[1] not in promotable:
+                        for i in escaping:
+                            killed[i] = pos
+                elif op.opcode in (ops.call, ops.ptrstore, ops.setfield,
+                                   ops.setindex, ops.setslice):
+                    for i in escaping:
+                        killed[i] = pos
+
+            self.gen[block] = bitset(i for i, pos in generated.items()
+                                         if killed.get(i, -1) < pos)
+            self.kill[block] = bitset(killed)
+
+
+def available_expressions(func, cfg=None):
+    """
+    Compute the expressions available at the start and end of each block.
+    Returns a DataFlowResult over expression tuples (see `expression()`).
+    """
+    return solve(AvailableExpressions(func, cfg or cfa.cfg(func)))
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+Escape analysis for aggregate allocations.
+
+An allocation (new_tuple, new_struct, new_list) escapes if the allocated
+value may outlive the function activation or be accessed in a way we do
+not track: it is passed to a call, returned, thrown, stored to memory
+(store, ptrstore), stored into another aggregate, merged through a phi,
+or used by any other operation that does not merely access its fields.
+
+    t = new_tuple(x, y)
+    a = getindex(t, 0)          # { t: [] }
+
+    t = new_tuple(x, y)
+    ret(t)                      # { t: [ret(t)] }
+"""
+
+from __future__ import print_function, division, absolute_import
+from pykit.ir import ops
+
+allocations = (ops.new_tuple, ops.new_struct, ops.new_list)
+
+def escaping_uses(func, value):
+    """Return the uses through which `value` escapes ([Op])"""
+    return [use for use in func.uses[value] if escapes(use, value)]
+
+def escapes(use, value):
+    """Whether `value` escapes through Operation `use`"""
+    opcode, args = use.opcode, use.args
+    if opcode in (ops.getfield, ops.length):
+        return args[0] is not value
+    elif opcode == ops.getindex:
+        return args[0] is not value or _contains(args[1], value)
+    elif opcode == ops.setfield:
+        # Writing to the aggregate, but not storing the aggregate itself
+        return args[0] is not value or args[2] is value
+    elif opcode == ops.setindex:
+        return (args[0] is not value or args[2] is value or
+                _contains(args[1], value))
+    return True
+
+def _contains(values, value):
+    return any(v is value for v in values)
+
+def escape_analysis(func, env=None):
+    """
+    Compute the escaping uses of all aggregate allocations in `func`:
+
+        { allocation Op : [escaping use Op] }
+
+    An allocation with an empty list does not escape.
+    """
+    return dict((op, escaping_uses(func, op))
+                    for op in func.ops if op.opcode in allocations)
+
+def non_escaping(func):
+    """Return all allocations in `func` that do not escape ([Op])"""
+    return [op for op in func.ops
+                   if op.opcode in allocations and not escaping_uses(func, op)]
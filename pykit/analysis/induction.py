@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+
+"""
+Induction variable analysis and trip counts for loops in SSA form.
+
+A basic induction variable is a phi in the loop header that is incremented
+by a loop-invariant step on every iteration:
+
+    i  = phi([preheader, latch], [init, i2])
+    i2 = add(i, step)
+
+A derived induction variable is an affine function of a basic one,
+computed with add, sub and mul with loop-invariant values, or a ptradd
+of a loop-invariant pointer and an integer induction variable:
+
+    j = factor * i + offset             (+ pointer)
+
+The factor, offset and step are expressions built from Python ints,
+loop-invariant Values and ('add', a, b) and ('mul', a, b) tuples (see
+`add` and `mul` below), to be materialized by transformations. Trip counts
+with loop-invariant bounds also use ('div', a, b) and ('max', a, b).
+"""
+
+from __future__ import print_function, division, absolute_import
+import numbers
+
+from pykit.ir import Op, FuncArg, Const, ops
+from pykit.analysis import cfa, loop_detection
+
+#===------------------------------------------------------------------===
+# Symbolic affine expressions
+#===------------------------------------------------------------------===
+
+def is_const(expr):
+    """Whether the expression is a compile-time constant (a Python int)"""
+    return isinstance(expr, numbers.Integral)
+
+def add(a, b):
+    if is_const(a) and is_const(b):
+        return a + b
+    elif a == 0:
+        return b
+    elif b == 0:
+        return a
+    elif is_const(b) and isinstance(a, tuple) and a[0] == 'add' and \
+            is_const(a[2]):
+        return add(a[1], a[2] + b)
+    return ('add', a, b)
+
+def mul(a, b):
+    if is_const(a) and is_const(b):
+        return a * b
+    elif a == 0 or b == 0:
+        return 0
+    elif a == 1:
+        return b
+    elif b == 1:
+        return a
+    return ('mul', a, b)
+
+def div(a, b):
+    """Division of a non-negative expression by a positive constant"""
+    if is_const(a) and is_const(b):
+        return a // b
+    elif b == 1:
+        return a
+    return ('div', a, b)
+
+def maximum(a, b):
+    if is_const(a) and is_const(b):
+        return max(a, b)
+    return ('max', a, b)
+
+def _expr(value):
+    """Turn a loop-invariant Value into an expression"""
+    if isinstance(value, Const) and is_const(value.const):
+        return int(value.const)
+    return value
+
+#===------------------------------------------------------------------===
+# Induction variables
+#===------------------------------------------------------------------===
+
+class BasicInductionVariable(object):
+    """
+    Basic induction variable of a loop:
+
+        phi:    the phi in the loop header
+        inits:  { predecessor outside the loop : initial Value }
+        step:   step expression
+        update: the Op computing the value for the next iteration
+    """
+
+    def __init__(self, phi, inits, step, update):
+        self.phi = phi
+        self.inits = inits
+        self.step = step
+        self.update = update
+
+    @property
+    def init(self):
+        """The initial value if it is the same from all predecessors"""
+        values = set(map(_key, self.inits.values()))
+        if len(values) == 1:
+            return _expr(list(self.inits.values())[0])
+
+    def __repr__(self):
+        return "BasicIV(%s, step=%s)" % (self.phi, self.step)
+
+
+class InductionVariable(object):
+    """
+    Induction variable with value `pointer + factor * basic + offset`, where
+    `basic` is a BasicInductionVariable and `pointer` is None for integers.
+    """
+
+    def __init__(self, op, basic, factor=1, offset=0, pointer=None):
+        self.op = op
+        self.basic = basic
+        self.factor = factor
+        self.offset = offset
+        self.pointer = pointer
+
+    @property
+    def is_basic(self):
+        return self.op is self.basic.phi
+
+    def __repr__(self):
+        return "IV(%s = %s * %s + %s)" % (self.op, self.factor,
+                                          self.basic.phi, self.offset)
+
+
+def _key(value):
+    if isinstance(value, Const):
+        return ('const', value.type, value.const)
+    return value
+
+def is_invariant(value, blocks):
+    """Whether `value` is invariant in the loop consisting of `blocks`"""
+    if isinstance(value, Op):
+        return value.block not in blocks
+    return isinstance(value, (Const, FuncArg))
+
+def _is_int(value):
+    return value.type.is_int
+
+def find_basic_ivs(func, loop, cfg):
+    """Find the basic induction variables of a loop: { phi : BasicIV }"""
+    blocks = set(loop.blocks)
+    header = loop.head
+    result = {}
+    for phi in header.leaders:
+        if phi.opcode != ops.phi or not _is_int(phi):
+            continue
+
+        inits, updates = {}, set()
+        for pred, value in zip(*phi.args):
+            if pred in blocks:
+                updates.add(value)
+            else:
+                inits[pred] = value
+        if len(updates) != 1 or not inits:
+            continue
+
+        [update] = updates
+        step = _step(phi, update, blocks)
+        if step is not None:
+            result[phi] = BasicInductionVariable(phi, inits, step, update)
+
+    return result
+
+def _step(phi, update, blocks):
+    """Step of `update = phi + step`, or None"""
+    if not isinstance(update, Op) or update.block not in blocks:
+        return None
+    if update.opcode == ops.add:
+        left, right = update.args
+        if left is phi and is_invariant(right, blocks):
+            return _expr(right)
+        if right is phi and is_invariant(left, blocks):
+            return _expr(left)
+    elif update.opcode == ops.sub:
+        left, right = update.args
+        if left is phi and is_invariant(right, blocks):
+            return mul(-1, _expr(right))
+
+def find_induction_variables(func, loop, cfg=None):
+    """
+    Find the basic and derived induction variables of a loop.
+    Returns { Op : InductionVariable }.
+    """
+    cfg = cfg or cfa.cfg(func)
+    blocks = set(loop.blocks)
+    ivs = {}
+    for phi, basic in find_basic_ivs(func, loop, cfg).items():
+        ivs[phi] = InductionVariable(phi, basic)
+
+    # Blocks are in depth-first order, so definitions precede their uses
+    for block in loop.blocks:
+        for op in block:
+            if op not in ivs:
+                iv = _derive(op, ivs, blocks)
+                if iv is not None:
+                    ivs[op] = iv
+
+    return ivs
+
+def _derive(op, ivs, blocks):
+    """Derive an induction variable from `op`, or return None"""
+    if op.opcode not in (ops.add, ops.sub, ops.mul, ops.ptradd):
+        return None
+
+    left, right = op.args
+    if op.opcode == ops.ptradd:
+        iv = ivs.get(right)
+        if (iv is not None and iv.pointer is None and
+                is_invariant(left, blocks)):
+            return InductionVariable(op, iv.basic, iv.factor, iv.offset, left)
+        return None
+
+    if not _is_int(op):
+        return None
+
+    liv, riv = ivs.get(left), ivs.get(right)
+    if liv and riv:
+        if (op.opcode != ops.mul and liv.basic is riv.basic and
+                liv.pointer is None and riv.pointer is None):
+            sign = 1 if op.opcode == ops.add else -1
+            return InductionVariable(
+                op, liv.basic,
+                add(liv.factor, mul(sign, riv.factor)),
+                add(liv.offset, mul(sign, riv.offset)))
+        return None
+
+    if liv and is_invariant(right, blocks):
+        iv, other = liv, _expr(right)
+    elif riv and is_invariant(left, blocks) and op.opcode != ops.sub:
+        iv, other = riv, _expr(left)
+    elif riv and is_invariant(left, blocks) and riv.pointer is None:
+        # other - iv
+        return InductionVariable(op, riv.basic, mul(-1, riv.factor),
+                                 add(_expr(left), mul(-1, riv.offset)))
+    else:
+        return None
+
+    if iv.pointer is not None:
+        return None
+    if op.opcode == ops.add:
+        return InductionVariable(op, iv.basic, iv.factor, add(iv.offset, other))
+    elif op.opcode == ops.sub:
+        return InductionVariable(op, iv.basic, iv.factor,
+                                 add(iv.offset, mul(-1, other)))
+    else:
+        return InductionVariable(op, iv.basic, mul(iv.factor, other),
+                                 mul(iv.offset, other))
+
+def induction_variables(func, loops=None):
+    """
+    Find the induction variables of all loops in the function:
+
+        { Loop : { Op : InductionVariable } }
+    """
+    cfg = cfa.cfg(func)
+    loops = loops or loop_detection.find_loops(func, cfg)
+    return dict((loop, find_induction_variables(func, loop, cfg))
+                    for loop in loops)
+
+#===------------------------------------------------------------------===
+# Trip count
+#===------------------------------------------------------------------===
+
+_swapped = { ops.lt: ops.gt, ops.le: ops.ge, ops.gt: ops.lt, ops.ge: ops.le,
+             ops.eq: ops.eq, ops.ne: ops.ne }
+_negated = { ops.lt: ops.ge, ops.le: ops.gt, ops.gt: ops.le, ops.ge: ops.lt,
+             ops.eq: ops.ne, ops.ne: ops.eq }
+
+def trip_count(func, loop, ivs=None, cfg=None):
+    """
+    Return the number of times the body of a loop executes: an int if it
+    is a compile-time constant, an expression (see above) if the bounds
+    are loop-invariant and the step is constant, or None. Only loops with a
+    single exit, taken from the header or from the single latch, are
+    handled:
+
+        for (i = 0; i < n; i += 2)      -->     div(max(n + 1, 0), 2)
+    """
+    cfg = cfg or cfa.cfg(func)
+    ivs = ivs if ivs is not None else find_induction_variables(func, loop, cfg)
+    blocks = set(loop.blocks)
+
+    exiting = [b for b in loop.blocks
+                     if any(s not in blocks for s in cfg.successors(b))]
+    if len(exiting) != 1:
+        return None
+    [block] = exiting
+    if block is loop.head:
+        bottom_tested = False
+    elif loop.latches == set([block]):
+        bottom_tested = True
+    else:
+        return None
+
+    branch = block.terminator
+    if branch.opcode != ops.cbranch or not isinstance(branch.args[0], Op):
+        return None
+    test, true_block, false_block = branch.args
+    if test.opcode not in _swapped:
+        return None
+
+    # Normalize to `iv <op> bound`, continuing the loop while true
+    cmp, (left, right) = test.opcode, test.args
+    if left in ivs and is_invariant(right, blocks):
+        iv, bound = ivs[left], _expr(right)
+    elif right in ivs and is_invariant(left, blocks):
+        iv, bound, cmp = ivs[right], _expr(left), _swapped[cmp]
+    else:
+        return None
+    if true_block not in blocks:
+        cmp = _negated[cmp]
+
+    # Value of the induction variable in iteration k: start + k * step
+    init = iv.basic.init
+    if iv.pointer is not None or init is None:
+        return None
+    start = add(mul(iv.factor, init), iv.offset)
+    step = mul(iv.factor, iv.basic.step)
+    if not is_const(step):
+        return None
+    elif is_const(start) and is_const(bound):
+        count = _count(cmp, start, step, bound)
+    else:
+        count = _symbolic_count(cmp, start, step, bound)
+
+    if count is not None and bottom_tested:
+        count = add(count, 1)
+    return count
+
+def _symbolic_count(cmp, start, step, bound):
+    """
+    Number of iterations `max(0, ceil(distance / step))` of a loop with a
+    constant step and symbolic bounds, for ordered comparisons only.
+    """
+    if cmp in (ops.lt, ops.le) and step > 0:
+        distance = add(bound, mul(-1, start))
+    elif cmp in (ops.gt, ops.ge) and step < 0:
+        distance, step = add(start, mul(-1, bound)), -step
+    else:
+        return None
+    if cmp in (ops.le, ops.ge):
+        distance = add(distance, 1)
+    return div(maximum(add(distance, step - 1), 0), step)
+
+def _count(cmp, start, step, bound):
+    """Number of consecutive k >= 0 for which `cmp(start + k*step, bound)`"""
+    if cmp == ops.lt:
+        if start >= bound:
+            return 0
+        if step > 0:
+            return -((start - bound) // step)
+    elif cmp == ops.le:
+        if start > bound:
+            return 0
+        if step > 0:
+            return (bound - start) // step + 1
+    elif cmp == ops.gt:
+        if start <= bound:
+            return 0
+        if step < 0:
+            return -((bound - start) // -step)
+    elif cmp == ops.ge:
+        if start < bound:
+            return 0
+        if step < 0:
+            return (start - bound) // -step + 1
+    elif cmp == ops.ne:
+        if start == bound:
+            return 0
+        if step != 0 and (bound - start) % step == 0 and \
+                (bound - start) // step > 0:
+            return (bound - start) // step
+    elif cmp == ops.eq:
+        if start != bound:
+            return 0
+        if step != 0:
+            return 1
+    return None
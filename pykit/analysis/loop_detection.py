@@ -1,15 +1,18 @@
 # -*- coding: utf-8 -*-
 
 """
-Detect natural loops based on dominators. Recall that `a dom b` if every
-path from the root to `b` must go through `a` first.
+Loop detection.
 
-This only identifies only natural loops, i.e. where the loop head dominates
-the loop tail.
+find_natural_loops() detects natural loops based on dominators. Recall that
+`a dom b` if every path from the root to `b` must go through `a` first.
+This only identifies natural loops, i.e. where the loop head dominates
+the loop tail, and relies on the order of `func.blocks`.
 
-A better algorithm is shown in [1], which does only a single DFS and handles
-irreducible CFGs (CFGs with unstructured control flow). A CFG is reducible
-if it
+find_loops() implements the algorithm shown in [1], which does only a single
+DFS and handles irreducible CFGs (CFGs with unstructured control flow, where
+a loop can be entered through more than one block). It runs in near-linear
+time and records for every block the header of the innermost loop containing
+it and its loop depth, as well as the latches and exits of every loop.
 
 [1]: A New Algorithm for Identifying Loops in Decompilation
 """
@@ -23,11 +26,24 @@ class Loop(object):
 
         blocks: contained blocks in depth-first spanning tree order
         children: loops nested within the loop
+        parent: enclosing loop, or None for an outermost loop
+        depth: nesting depth of the loop (1 for an outermost loop)
+        latches: blocks in the loop with an edge back to the head
+        exits: blocks outside the loop that are targeted from inside the loop
+        entries: blocks in the loop with an edge coming from outside the loop
+        irreducible: whether the loop can be entered through a block other
+                     than its head
     """
 
-    def __init__(self, blocks=None, children=None):
+    def __init__(self, blocks=None, children=None, parent=None, depth=1):
         self.blocks = blocks or []
         self.children = children or []
+        self.parent = parent
+        self.depth = depth
+        self.latches = set()
+        self.exits = set()
+        self.entries = set()
+        self.irreducible = False
 
     @property
     def head(self):
@@ -37,6 +53,45 @@ class Loop(object):
     def tail(self):
         return self.blocks[-1]
 
+    def __repr__(self):
+        return "Loop(%s, depth=%d)" % (self.head.name, self.depth)
+
+
+class LoopInfo(object):
+    """
+    Loops of a function, as computed by find_loops().
+
+        loops:   loop nesting forest ([Loop])
+        loopmap: { header : Loop }
+        headers: { block : header of the innermost loop containing the block }
+        depths:  { block : number of loops containing the block }
+    """
+
+    def __init__(self, loops, loopmap, headers, depths):
+        self.loops = loops
+        self.loopmap = loopmap
+        self.headers = headers
+        self.depths = depths
+
+    def header(self, block):
+        """Header of the innermost loop containing `block`, or None"""
+        return self.headers.get(block)
+
+    def depth(self, block):
+        """Loop nesting depth of `block`, 0 outside of any loop"""
+        return self.depths.get(block, 0)
+
+    def loop(self, block):
+        """Innermost Loop containing `block`, or None"""
+        header = self.headers.get(block)
+        if header is None:
+            return None
+        return self.loopmap[header]
+
+    def __iter__(self):
+        return flatloops(self.loops)
+
+# ______________________________________________________________________
 
 def find_natural_loops(func, cfg=None):
     """Return a loop nesting forest for the given function ([Loop])"""
@@ -74,9 +129,158 @@ def find_natural_loops(func, cfg=None):
     assert not loop_stack
     return loops
 
+# ______________________________________________________________________
+
+def find_loops(func, cfg=None):
+    """
+    Find all loops in the function, including irreducible ones, and
+    return a LoopInfo. Blocks unreachable from the entry block are not part
+    of any loop.
+    """
+    cfg = cfg or cfa.cfg(func)
+    order, iloop_header, headers, irreducible = _traverse_loops(func, cfg)
+
+    # -------------------------------------------------
+    # Build the loop nesting forest. Headers precede the blocks of their
+    # loop in the DFS order, including those of nested loops.
+
+    loopmap = {} # { header : Loop }
+    forest = []
+    for block in order:
+        if block in headers:
+            parent_header = iloop_header.get(block)
+            parent = loopmap.get(parent_header)
+            depth = parent.depth + 1 if parent else 1
+            loop = Loop([block], parent=parent, depth=depth)
+            loop.irreducible = block in irreducible
+            loopmap[block] = loop
+            if parent:
+                parent.children.append(loop)
+            else:
+                forest.append(loop)
+        elif iloop_header.get(block) is not None:
+            loopmap[iloop_header[block]].blocks.append(block)
+
+    # Propagate nested loop blocks outwards, preserving DFS order
+    for loop in postorder(forest):
+        if loop.parent:
+            loop.parent.blocks.extend(loop.blocks)
+    index = dict((block, i) for i, block in enumerate(order))
+    for loop in loopmap.values():
+        loop.blocks.sort(key=index.__getitem__)
+
+    # -------------------------------------------------
+    # Block headers and depths, loop latches, exits and entries
+
+    innermost = {} # { block : header }
+    depths = {}    # { block : depth }
+    for block in order:
+        header = block if block in headers else iloop_header.get(block)
+        if header is not None:
+            innermost[block] = header
+            depths[block] = loopmap[header].depth
+
+    for loop in loopmap.values():
+        blocks = set(loop.blocks)
+        for block in loop.blocks:
+            for succ in cfg.successors(block):
+                if succ is loop.head:
+                    loop.latches.add(block)
+                elif succ not in blocks:
+                    loop.exits.add(succ)
+            for pred in cfg.predecessors(block):
+                if pred not in blocks and pred in index:
+                    loop.entries.add(block)
+        loop.irreducible = loop.irreducible or bool(
+            loop.entries - set([loop.head]))
+
+    return LoopInfo(forest, loopmap, innermost, depths)
+
+def _traverse_loops(func, cfg):
+    """
+    Single (iterative) DFS over the CFG that tags each block with the
+    header of its innermost loop (`iloop_header`).
+
+    Returns (dfs_order, iloop_header, headers, irreducible_headers).
+    """
+    iloop_header = {}     # { block : innermost loop header }
+    pos = {}              # { block : position on the current DFS path }
+    headers = set()
+    irreducible = set()
+    order = []
+
+    def tag_lhead(block, header):
+        """Weave `header` into the loop header list of `block`"""
+        if block is header or header is None:
+            return
+        cur1, cur2 = block, header
+        while iloop_header.get(cur1) is not None:
+            ih = iloop_header[cur1]
+            if ih is cur2:
+                return
+            if pos.get(ih, 0) < pos.get(cur2, 0):
+                iloop_header[cur1] = cur2
+                cur1, cur2 = cur2, ih
+            else:
+                cur1 = ih
+        iloop_header[cur1] = cur2
+
+    start = func.startblock
+    order.append(start)
+    pos[start] = 1
+    stack = [(start, iter(cfg.successors(start)))]
+
+    while stack:
+        b0, successors = stack[-1]
+        for b in successors:
+            if b not in pos:
+                # Case (a): new block, descend
+                order.append(b)
+                pos[b] = len(stack) + 1
+                stack.append((b, iter(cfg.successors(b))))
+                break
+            elif pos[b] > 0:
+                # Case (b): b is on the DFS path, so we found a loop header
+                headers.add(b)
+                tag_lhead(b0, b)
+            elif iloop_header.get(b) is None:
+                # Case (c): b is not part of a loop
+                pass
+            else:
+                h = iloop_header[b]
+                if pos[h] > 0:
+                    # Case (d): b is in a loop whose header is on the path
+                    tag_lhead(b0, h)
+                else:
+                    # Case (e): re-entry into a loop, which is irreducible
+                    irreducible.add(h)
+                    while iloop_header.get(h) is not None:
+                        h = iloop_header[h]
+                        if pos[h] > 0:
+                            tag_lhead(b0, h)
+                            break
+                        irreducible.add(h)
+        else:
+            # All successors of b0 are done, propagate its loop header
+            stack.pop()
+            pos[b0] = 0
+            if stack:
+                tag_lhead(stack[-1][0], iloop_header.get(b0))
+
+    return order, iloop_header, headers, irreducible
+
+# ______________________________________________________________________
+
 def flatloops(loop_forest):
     """Return a flat iterator of all loops in the forest"""
     for loop in loop_forest:
         yield loop
         for child in flatloops(loop.children):
-            yield child
\ No newline at end of file
+            yield child
+
+def postorder(loop_forest):
+    """Return an iterator of all loops with nested loops before their parent"""
+    for loop in loop_forest:
+        for child in postorder(loop.children):
+            yield child
+        yield loop
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const
+from pykit.analysis import dataflow
+from pykit.tests import build_loop
+
+I = types.Int32
+
+
+class TestBitsets(unittest.TestCase):
+
+    def test_bitset(self):
+        bits = dataflow.bitset([0, 3, 200])
+        self.assertEqual(bits, (1 << 0) | (1 << 3) | (1 << 200))
+        self.assertEqual(dataflow.members(bits), [0, 3, 200])
+        self.assertEqual(dataflow.bitset([]), 0)
+
+
+class TestDataFlow(unittest.TestCase):
+
+    def setUp(self):
+        self.f, self.blocks, values = build_loop()
+        self.values = (self.f.get_arg('n'),) + values
+
+    def test_liveness(self):
+        entry, cond, body, exit = self.blocks
+        n, i, s, i2, s2 = self.values
+        live = dataflow.liveness(self.f)
+
+        self.assertEqual(live.at_entry(entry), set([n]))
+        self.assertEqual(live.at_exit(cond), set([n, i, s]))
+        self.assertEqual(live.at_entry(exit), set([s]))
+        # phi operands are live-out of the predecessor only
+        self.assertEqual(live.at_exit(body), set([n, i2, s2]))
+        self.assertEqual(live.at_entry(cond), set([n]))
+
+    def test_available_expressions(self):
+        entry, cond, body, exit = self.blocks
+        avail = dataflow.available_expressions(self.f)
+
+        self.assertEqual(avail.at_entry(cond), set())
+        [(opcode, type, args)] = avail.at_entry(body)
+        self.assertEqual(opcode, 'lt')
+        self.assertEqual(len(avail.at_exit(body)), 3)
+
+    def test_available_loads_aliasing(self):
+        P = types.Pointer(I)
+        f = Function("g", ['p', 'q'], types.Function(I, [P, P]))
+        p, q = f.args
+        entry, next = f.new_block('entry'), f.new_block('next')
+        b = Builder(f)
+        with b.at_end(entry):
+            x = b.load(I, [p])
+            b.store(Const(1, I), q) # p and q may alias
+            b.jump(next)
+        with b.at_end(next):
+            b.ret(b.add(I, [x, b.load(I, [p])]))
+
+        avail = dataflow.available_expressions(f)
+        self.assertEqual(avail.at_exit(entry), set())
+
+    def test_reaching_definitions(self):
+        f = Function("g", ['x'], types.Function(I, [types.Bool]))
+        entry, then, else_, join = [f.new_block(name)
+                                       for name in ('entry', 'then', 'else', 'join')]
+        b = Builder(f)
+        with b.at_end(entry):
+            var = b.alloca(types.Pointer(I), [])
+            store1 = b.store(Const(1, I), var)
+            b.cbranch(f.get_arg('x'), then, else_)
+        with b.at_end(then):
+            store2 = b.store(Const(2, I), var)
+            b.jump(join)
+        with b.at_end(else_):
+            b.jump(join)
+        with b.at_end(join):
+            b.ret(b.load(I, [var]))
+
+        reaching = dataflow.reaching_definitions(f)
+        self.assertEqual(reaching.at_exit(entry), set([store1]))
+        self.assertEqual(reaching.at_exit(then), set([store2]))
+        self.assertEqual(reaching.at_entry(join), set([store1, store2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const
+from pykit.analysis import escape
+
+I = types.Int32
+
+def build(restype=I):
+    func = Function("foo", ['x', 'y'], types.Function(restype, [I, I]))
+    entry = func.new_block("entry")
+    b = Builder(func)
+    b.position_at_end(entry)
+    return func, b
+
+class TestEscapeAnalysis(unittest.TestCase):
+
+    def test_no_escape(self):
+        func, b = build()
+        x, y = func.args
+        t = b.new_tuple(types.Tuple([I, I]), [[x, y]])
+        b.ret(b.getindex(I, [t, [Const(0, I)]]))
+        self.assertEqual(escape.escape_analysis(func), {t: []})
+
+    def test_escape(self):
+        T = types.Tuple([I, I])
+        func, b = build(T)
+        x, y = func.args
+        t = b.new_tuple(T, [[x, y]])
+        b.print(t)
+        ret = b.ret(t)
+        self.assertEqual(len(escape.escape_analysis(func)[t]), 2)
+        self.assertIn(ret, escape.escaping_uses(func, t))
+
+    def test_stored_into_aggregate(self):
+        T = types.Tuple([I, I])
+        func, b = build()
+        x, y = func.args
+        t = b.new_tuple(T, [[x, y]])
+        s = b.new_struct(types.Struct(['t'], [T]), [[t]])
+        b.setfield(s, 't', t)
+        b.ret(x)
+        self.assertEqual(escape.non_escaping(func), [s])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const, interp
+from pykit.analysis import cfa, induction, loop_detection
+from pykit.optimizations.strength_reduction import materialize
+from pykit.tests import build_loop
+
+I = types.Int32
+
+def build_iv_loop(**kwds):
+    """
+    for (i = start; cmp(i, stop); i += step)
+        s += i * 4 + k
+    """
+    derived = []
+    def term(b, i):
+        j = b.mul(I, [i, Const(4, I)])
+        derived.extend([j, b.add(I, [j, b.func.get_arg('k')])])
+        return derived[-1]
+
+    func, _, (i, s, i2, s2) = build_loop(term, "foo", ['n', 'k'], **kwds)
+    j, j2 = derived
+    [loop] = loop_detection.find_loops(func).loops
+    return func, loop, (i, j, j2, i2)
+
+def build_gen_loop(start, step):
+    """for (i = start; i < n; i += step) {}, with Builder.gen_loop"""
+    func = Function("f", ['n'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    cond, body, exit = b.gen_loop(Const(start, I), func.args[0],
+                                  Const(step, I))
+    with b.at_end(exit):
+        ret = b.ret(Const(0, I))
+    cfa.run(func)
+    [loop] = loop_detection.find_loops(func).loops
+    return func, loop, ret
+
+class TestInductionVariables(unittest.TestCase):
+
+    def test_basic(self):
+        func, loop, (i, j, j2, i2) = build_iv_loop(step=2)
+        basic = induction.find_basic_ivs(func, loop, None)
+        self.assertEqual(list(basic), [i])
+        self.assertEqual(basic[i].step, 2)
+        self.assertEqual(basic[i].init, 0)
+        self.assertIs(basic[i].update, i2)
+
+    def test_derived(self):
+        func, loop, (i, j, j2, i2) = build_iv_loop()
+        ivs = induction.find_induction_variables(func, loop)
+        self.assertEqual(set(ivs), set([i, j, j2, i2]))
+        self.assertTrue(ivs[i].is_basic)
+        self.assertEqual((ivs[j].factor, ivs[j].offset), (4, 0))
+        self.assertEqual((ivs[j2].factor, ivs[j2].offset), (4, func.args[1]))
+        self.assertEqual((ivs[i2].factor, ivs[i2].offset), (1, 1))
+
+    def test_trip_count(self):
+        cases = [
+            (dict(stop=10), 10),
+            (dict(start=3, stop=10, step=2, cmp='le'), 4),
+            (dict(start=10, stop=0, step=-3, cmp='gt'), 4),
+            (dict(start=0, stop=12, step=4, cmp='ne'), 3),
+            (dict(start=5, stop=0), 0),
+        ]
+        for kwds, expected in cases:
+            func, loop, _ = build_iv_loop(**kwds)
+            self.assertEqual(induction.trip_count(func, loop), expected, kwds)
+
+    def test_symbolic_trip_count(self):
+        func, loop, _ = build_iv_loop(start=1, step=2, cmp='le')
+        n = func.get_arg('n')
+        self.assertEqual(induction.trip_count(func, loop),
+                         ('div', ('max', ('add', n, 1), 0), 2))
+
+        func, loop, _ = build_iv_loop(start=10, step=-3, cmp='ne')
+        self.assertIsNone(induction.trip_count(func, loop))
+
+    def test_gen_loop_trip_count(self):
+        func, loop, ret = build_gen_loop(0, 1)
+        [n] = func.args
+        self.assertEqual(induction.trip_count(func, loop), ('max', n, 0))
+
+        for start, step in [(0, 1), (2, 3), (-4, 5)]:
+            func, loop, ret = build_gen_loop(start, step)
+            count = induction.trip_count(func, loop)
+            b = Builder(func)
+            b.position_before(ret)
+            ret.set_args([materialize(b, count, I)])
+            for n in range(-6, 12):
+                self.assertEqual(interp.run(func, args=[n]),
+                                 len(range(start, n, step)), (start, step, n))
+
+
+if __name__ == '__main__':
+    unittest.main()
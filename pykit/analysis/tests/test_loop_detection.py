@@ -26,6 +26,18 @@ class Unnested(SourceTestCase):
         assert len(loops[0].blocks) >= 4
         assert len(loops[1].blocks) >= 2
 
+    def test_unnested_loop_info(self):
+        info = loop_detection.find_loops(self.f)
+        assert len(info.loops) == 2
+        for loop in info.loops:
+            assert not loop.children
+            self.eq(loop.depth, 1)
+            self.eq(len(loop.exits), 1)
+            self.eq(len(loop.latches), 1)
+            for block in loop.blocks:
+                self.eq(info.depth(block), 1)
+        self.eq(info.depth(self.f.startblock), 0)
+
 class Nested(SourceTestCase):
     source = """
     int nested(int i) {
@@ -42,4 +54,50 @@ class Nested(SourceTestCase):
         loops = loop_detection.find_natural_loops(self.f)
         for i in range(3):
             loop, = loops
-            loops = loop.children
\ No newline at end of file
+            loops = loop.children
+
+    def test_nested_loop_info(self):
+        info = loop_detection.find_loops(self.f)
+        loops = info.loops
+        for depth in range(1, 4):
+            loop, = loops
+            self.eq(loop.depth, depth)
+            self.eq(info.depth(loop.head), depth)
+            self.eq(info.header(loop.head), loop.head)
+            assert loop.latches
+            assert not loop.irreducible
+            loops = loop.children
+
+class Irreducible(unittest.TestCase):
+
+    def test_irreducible(self):
+        """
+        entry -> a, b
+        a     -> b
+        b     -> a, exit
+        """
+        f = Function("irreducible", ['x'],
+                     types.Function(types.Void, [types.Bool]))
+        entry, a, b, exit = [f.new_block(name)
+                                 for name in ('entry', 'a', 'b', 'exit')]
+        builder = Builder(f)
+        x = f.get_arg('x')
+        with builder.at_end(entry):
+            builder.cbranch(x, a, b)
+        with builder.at_end(a):
+            builder.jump(b)
+        with builder.at_end(b):
+            builder.cbranch(x, a, exit)
+        with builder.at_end(exit):
+            builder.ret(None)
+
+        info = loop_detection.find_loops(f)
+        loop, = info.loops
+        assert loop.irreducible
+        self.assertEqual(set(loop.blocks), set([a, b]))
+        self.assertEqual(loop.entries, set([a, b]))
+        self.assertEqual(loop.exits, set([exit]))
+        self.assertEqual(info.depth(a), 1)
+        self.assertEqual(info.depth(b), 1)
+        self.assertEqual(info.depth(entry), 0)
+        self.assertEqual(info.loop(exit), None)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+Batched calls of compiled functions. Calling a small compiled function
+from Python through ctypes costs far more than the function itself, so
+instead of calling it once per element we generate a native loop over
+argument arrays that calls it for each element:
+
+    Void f_batched(Int64 n, T0 *a0, T1 *a1, ..., R *out)
+        for i in range(n):
+            out[i] = f(a0[i], a1[i], ...)
+
+The loop is compiled with the same code generator, in the same environment,
+as `f`, so `f` can be inlined. Arguments are passed as NumPy arrays:
+
+    f_batched = batched(f, env, codegen)
+    out = f_batched(np.arange(10.0), np.ones(10))
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+
+import numpy as np
+
+from pykit import pipeline, types
+from pykit.ir import Function, Builder, Const
+from pykit.types import Pointer, Int64, Void
+from pykit.codegen.ufuncs import dtype
+
+def batched_function(func):
+    """Build the loop calling scalar function `func` over argument arrays"""
+    argtypes, restype = func.type.argtypes, func.type.restype
+    if restype.is_void:
+        raise TypeError("Cannot batch function %s returning void" % func.name)
+    if not argtypes:
+        # The arrays give the number of calls
+        raise TypeError("Cannot batch function %s without arguments" %
+                        func.name)
+
+    names = ['a%d' % i for i in range(len(argtypes))]
+    type = types.Function(Void, [Int64] + [Pointer(t) for t in argtypes]
+                                        + [Pointer(restype)])
+    loop_func = Function(func.name + '_batched', ['n'] + names + ['out'], type)
+    entry, cond, loop, exit = [loop_func.new_block(label) for label in
+                                   ('entry', 'cond', 'loop', 'exit')]
+    n, arrays, out = loop_func.args[0], loop_func.args[1:-1], loop_func.args[-1]
+    b = Builder(loop_func)
+
+    with b.at_end(entry):
+        b.jump(cond)
+    with b.at_end(cond):
+        i = b.phi(Int64, [[], []])
+        b.cbranch(b.lt(types.Bool, [i, n]), loop, exit)
+    with b.at_end(loop):
+        args = [b.ptrload(t, [b.ptradd(Pointer(t), [array, i])])
+                    for t, array in zip(argtypes, arrays)]
+        result = b.call(restype, [func, args])
+        b.ptrstore(Void, [b.ptradd(Pointer(restype), [out, i]), result])
+        i2 = b.add(Int64, [i, Const(1, Int64)])
+        b.jump(cond)
+    with b.at_end(exit):
+        b.ret(None)
+
+    i.set_args([[entry, loop], [Const(0, Int64), i2]])
+    return loop_func
+
+
+class Batched(object):
+    """
+    Python callable for the compiled batched loop of a function. Arrays are
+    passed as raw addresses, so a call costs one ctypes call in total.
+    """
+
+    def __init__(self, func, loop, cfunc, env):
+        self.func = func
+        self.loop = loop
+        self.env = env # keep the execution engine or libraries alive
+        self.argtypes = [dtype(t) for t in func.type.argtypes]
+        self.restype = dtype(func.type.restype)
+
+        nargs = len(self.argtypes) + 1
+        functype = ctypes.CFUNCTYPE(None, ctypes.c_int64,
+                                    *[ctypes.c_void_p] * nargs)
+        self.cfunc = cfunc # keep alive
+        self.call = functype(ctypes.cast(cfunc, ctypes.c_void_p).value)
+
+    def __call__(self, *args, **kwds):
+        assert len(args) == len(self.argtypes), args
+        arrays = [np.ascontiguousarray(arg, dtype)
+                      for arg, dtype in zip(args, self.argtypes)]
+        n = len(arrays[0])
+        assert all(len(array) == n for array in arrays)
+
+        out = kwds.get('out')
+        if out is None:
+            out = np.empty(n, self.restype)
+        assert out.dtype == self.restype and out.flags.c_contiguous
+        assert len(out) == n
+
+        pointers = [array.ctypes.data for array in arrays]
+        self.call(n, *pointers + [out.ctypes.data])
+        return out
+
+def batched(func, env, codegen):
+    """
+    Compile the batched loop of `func` with `codegen`, installed in `env`.
+    Returns a Batched callable.
+    """
+    loop = batched_function(func)
+    lfunc, env = pipeline.codegen(loop, env)
+    return Batched(func, loop, codegen.wrapper(lfunc, env), env)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+C99 code generator. Functions are translated to a C source module, which
+is compiled with the system C compiler to a shared library when the code
+is first needed (optimize(), get_ctypes() or execute()). Libraries are
+cached on disk by content hash (see c_utils), so unchanged code is not
+recompiled across processes.
+
+    env["codegen.c.cc"]         C compiler (default $CC or cc)
+    env["codegen.c.flags"]      compiler flags (default -O3 -std=c99 ...)
+    env["codegen.c.cachedir"]   library cache ($PYKIT_CACHE_DIR or
+                                ~/.cache/pykit/c)
+"""
+
+from __future__ import print_function, division, absolute_import
+from pykit.utils import make_temper
+from . import c_codegen, c_types, c_utils
+from .c_codegen import CModule
+from .. import codegen
+
+name = "c"
+
+def install(env, opt=3, cc=None, flags=None, cachedir=None,
+            temper=make_temper()):
+    """Install C code generator in environment"""
+    if flags is None:
+        flags = ['-O%d' % opt] + c_utils.default_flags[1:]
+
+    # -------------------------------------------------
+    # Codegen passes
+
+    env["pipeline.codegen"].extend([
+        "passes.c.ctypes",
+    ])
+
+    env["passes.codegen"] = codegen
+    env["passes.c.ctypes"] = get_ctypes
+
+    env["codegen.impl"] = c_codegen
+
+    # -------------------------------------------------
+    # Codegen state
+
+    env["codegen.c.cc"] = cc or c_utils.default_cc()
+    env["codegen.c.flags"] = flags
+    env["codegen.c.cachedir"] = cachedir or c_utils.default_cachedir()
+    env["codegen.c.temper"] = temper
+    env["codegen.c.module"] = CModule(temper("temp_module"))
+    env["codegen.c.libraries"] = [] # keep loaded libraries alive
+
+    # ctypes wrappers of compiled functions: { function name : cfunc }
+    env["codegen.c.wrappers"] = {}
+
+def finalize(env):
+    """
+    Compile the functions translated since the last call and start a new
+    module.
+    """
+    module = env["codegen.c.module"]
+    if not module.defined:
+        return
+
+    path = c_utils.compile_source(module.source(),
+                                  cachedir=env["codegen.c.cachedir"],
+                                  cc=env["codegen.c.cc"],
+                                  flags=env["codegen.c.flags"])
+    env["codegen.c.libraries"].append(c_utils.load_library(path))
+    env["codegen.c.module"] = CModule(env["codegen.c.temper"]("temp_module"))
+
+def source(env):
+    """C source of the functions translated since the last compilation"""
+    return env["codegen.c.module"].source()
+
+def verify(func, env):
+    pass # verified by the C compiler
+
+def optimize(func, env):
+    """Compile the C functions translated so far"""
+    finalize(env)
+
+def pointer_to_func(env, cfunc):
+    """Get a ctypes function for a compiled CFunction"""
+    functype = c_types.ctype(cfunc.type)
+    for lib in reversed(env["codegen.c.libraries"]):
+        if hasattr(lib, cfunc.name):
+            return functype((cfunc.name, lib))
+    raise LookupError("Function %s was not compiled" % (cfunc.name,))
+
+def wrapper(func, env):
+    """Get the ctypes wrapper of a C function, compiling it if needed"""
+    wrappers = env["codegen.c.wrappers"]
+    cfunc = wrappers.get(func.name)
+    if cfunc is None:
+        finalize(env)
+        cfunc = pointer_to_func(env, func)
+        wrappers[func.name] = cfunc
+    return cfunc
+
+def get_ctypes(func, env):
+    env["codegen.c.ctypes"] = wrapper(func, env)
+
+def execute(func, env, *args):
+    """Execute C function with the given arguments"""
+    assert len(func.type.argtypes) == len(args)
+    return wrapper(func, env)(*args)
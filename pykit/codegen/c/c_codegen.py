@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+
+"""
+Translate low-level pykit IR to C99.
+
+Every Op with a result is assigned to a local variable declared at the
+top of the function. Blocks become labels and branches gotos. Phis are
+assigned through a second variable in the predecessors (`v_phi_in`),
+which is copied into the phi at the start of the block, so that all phis
+of a block take their values simultaneously.
+"""
+
+from __future__ import print_function, division, absolute_import
+import re
+
+from pykit import types
+from pykit.ir import vvisit, ArgLoader, verify_lowlevel, ops
+from pykit.ir import defs, opgrouper, Function, Op
+from pykit.types import Pointer
+from pykit.utils import make_temper
+from pykit.codegen.c.c_types import CTypes
+from pykit.codegen import lazy
+
+#===------------------------------------------------------------------===
+# Definitions
+#===------------------------------------------------------------------===
+
+# Exception models this code generator can translate (lower_errcheck)
+exception_models = ('costful',)
+
+# pykit math function name -> C99 math.h name
+libm_names = {
+    'Abs': 'fabs',
+}
+
+header = """\
+#include <math.h>
+#include <stddef.h>
+"""
+
+#===------------------------------------------------------------------===
+# Utils
+#===------------------------------------------------------------------===
+
+def ident(name):
+    """Make a valid C identifier out of an IR name"""
+    return re.sub(r'\W', '_', str(name))
+
+def var(value):
+    return 'v_' + ident(value.result)
+
+def label(block):
+    return 'L_' + ident(block.name)
+
+def constant(value, type, ctypes):
+    type = types.resolve_typedef(type)
+    if type.is_pointer:
+        return '((%s)(size_t)%dUL)' % (ctypes(type), value or 0)
+    elif type.is_bool:
+        return '1' if value else '0'
+    elif type.is_int:
+        suffix = 'LL' if type.bits == 64 else ''
+        if type.unsigned:
+            suffix = 'U' + suffix
+        if value == -2 ** (type.bits - 1):
+            return '((%s)(%d%s - 1))' % (ctypes(type), value + 1, suffix)
+        return '((%s)%d%s)' % (ctypes(type), value, suffix)
+    elif type.is_real:
+        if value != value:
+            return '((%s)(0.0 / 0.0))' % ctypes(type)
+        elif value in (float('inf'), float('-inf')):
+            return '((%s)%sHUGE_VAL)' % (ctypes(type), '-' if value < 0 else '')
+        return '((%s)%r)' % (ctypes(type), float(value))
+    elif type.is_struct:
+        # Only valid as an initializer
+        fields = ', '.join(constant(c.const, c.type, ctypes)
+                               for c in value.values)
+        return '{ %s }' % (fields,)
+    raise NotImplementedError("Constants for %s" % (type,))
+
+#===------------------------------------------------------------------===
+# Module
+#===------------------------------------------------------------------===
+
+class CFunction(object):
+    """A C function, the body is set when translated"""
+
+    def __init__(self, name, type, module):
+        self.name = name
+        self.type = type
+        self.module = module
+        self.body = None
+
+    def prototype(self, argnames=None):
+        ctypes = self.module.ctypes
+        if argnames is None:
+            args = [ctypes(t) for t in self.type.argtypes]
+        else:
+            args = ['%s %s' % (ctypes(t), name)
+                        for t, name in zip(self.type.argtypes, argnames)]
+        return '%s %s(%s)' % (ctypes(self.type.restype), self.name,
+                              ', '.join(args) or 'void')
+
+
+class CModule(object):
+    """C translation unit"""
+
+    def __init__(self, name):
+        self.name = name
+        self.ctypes = CTypes()
+        self.prototypes = {} # { name : prototype }
+        self.functions = []  # [CFunction]
+
+    def declare(self, cfunc):
+        """Declare a function, possibly defined in another module"""
+        if cfunc.name not in self.prototypes:
+            self.prototypes[cfunc.name] = cfunc.prototype() + ';'
+
+    def add_function(self, name, type):
+        cfunc = CFunction(name, type, self)
+        self.functions.append(cfunc)
+        self.declare(cfunc)
+        return cfunc
+
+    @property
+    def defined(self):
+        return [f for f in self.functions if f.body is not None]
+
+    def source(self):
+        parts = [header]
+        parts.extend(self.ctypes.typedefs)
+        parts.extend(sorted(self.prototypes.values()))
+        parts.extend(f.body for f in self.defined)
+        return '\n'.join(parts) + '\n'
+
+#===------------------------------------------------------------------===
+# Translator
+#===------------------------------------------------------------------===
+
+class Translator(object):
+    """
+    Translate a function in low-level form to the body of a C function.
+    Handlers emit statements and return the C expression for the result.
+    """
+
+    def __init__(self, func, env, cfunc, module):
+        self.func = func
+        self.env = env
+        self.cfunc = cfunc
+        self.module = module
+        self.ctypes = module.ctypes
+        self.decls = [] # [declaration]
+        self.lines = [] # [statement or label]
+        self.current = None # current block
+
+    def emit(self, line):
+        self.lines.append('    ' + line)
+
+    def declare(self, name, type, init=''):
+        self.decls.append('    %s %s%s;' % (self.ctypes(type), name, init))
+
+    def assign(self, op, expr):
+        """Assign an expression to the variable of `op`"""
+        name = var(op)
+        self.declare(name, op.type)
+        self.emit('%s = %s;' % (name, expr))
+        return name
+
+    def blockswitch(self, block):
+        self.current = block
+        self.lines.append('%s: ;' % label(block))
+        for phi in block.leaders:
+            if phi.opcode == ops.phi:
+                self.emit('%s = %s_in;' % (var(phi), var(phi)))
+
+    def edge(self, target):
+        """Assign the incoming values of the phis in `target`"""
+        block = self.current
+        for phi in target.leaders:
+            if phi.opcode == ops.phi:
+                preds, values = phi.args
+                [value] = [v for p, v in zip(preds, values) if p is block]
+                self.emit('%s_in = %s;' % (var(phi), self.load(value)))
+        return 'goto %s;' % label(target)
+
+    # __________________________________________________________________
+
+    def op_arg(self, arg):
+        return var(arg)
+
+    # __________________________________________________________________
+
+    def op_unary(self, op, arg):
+        unop = defs.unary_opcodes[op.opcode]
+        return self.assign(op, '(%s)(%s%s)' % (self.ctypes(op.type), unop, arg))
+
+    def op_binary(self, op, left, right):
+        binop = defs.binary_opcodes[op.opcode]
+        if binop == '//':
+            binop = '/'
+        if binop == '%' and op.type.is_real:
+            expr = 'fmod(%s, %s)' % (left, right)
+        else:
+            expr = '%s %s %s' % (left, binop, right)
+        return self.assign(op, '(%s)(%s)' % (self.ctypes(op.type), expr))
+
+    def op_compare(self, op, left, right):
+        cmpop = defs.compare_opcodes[op.opcode]
+        return self.assign(op, '(%s %s %s)' % (left, cmpop, right))
+
+    # __________________________________________________________________
+
+    def op_convert(self, op, arg):
+        return self.assign(op, '(%s)%s' % (self.ctypes(op.type), arg))
+
+    # __________________________________________________________________
+
+    def op_call(self, op, function, args):
+        if isinstance(function, Function) and self.env["codegen.lazy"]:
+            # Call through the function pointer slot
+            slot = lazy.slot(function, self.env)
+            fptr = self.ctypes(Pointer(function.type))
+            function = '(**(%s *)(size_t)%dUL)' % (fptr, slot.address)
+        elif isinstance(function, Function):
+            # Get the callee from the cache. This is put there by
+            # pykit.codegen.codegen
+            cfunc = self.env["codegen.cache"][function]
+            self.module.declare(cfunc)
+            function = cfunc.name
+        else:
+            function = '(*%s)' % (function,)
+        expr = '%s(%s)' % (function, ', '.join(args))
+        if op.type.is_void:
+            self.emit(expr + ';')
+        else:
+            return self.assign(op, expr)
+
+    def op_call_math(self, op, name, args):
+        # Some of these (e.g. log1p, round) are only in the C99 libm
+        fname = libm_names.get(name, name.lower())
+        args = ['(double)%s' % (arg,) for arg in args]
+        return self.assign(op, '(%s)%s(%s)' % (self.ctypes(op.type), fname,
+                                               ', '.join(args)))
+
+    # __________________________________________________________________
+
+    def op_getfield(self, op, struct, attr):
+        index = op.args[0].type.names.index(attr)
+        return self.assign(op, '%s.f%d' % (struct, index))
+
+    def op_setfield(self, op, struct, attr, value):
+        index = op.args[0].type.names.index(attr)
+        result = self.assign(op, struct)
+        self.emit('%s.f%d = %s;' % (result, index, value))
+        return result
+
+    # __________________________________________________________________
+
+    def op_getindex(self, op, array, indices):
+        [index] = indices
+        return self.assign(op, '&%s[%s]' % (array, index))
+
+    def op_setindex(self, op, array, indices, value):
+        [index] = indices
+        self.emit('%s[%s] = %s;' % (array, index, value))
+
+    # __________________________________________________________________
+
+    def op_alloca(self, op):
+        storage = var(op) + '_storage'
+        self.declare(storage, op.type.base)
+        return self.assign(op, '&' + storage)
+
+    def op_load(self, op, stackvar):
+        return self.assign(op, '*' + stackvar)
+
+    def op_store(self, op, value, stackvar):
+        self.emit('*%s = %s;' % (stackvar, value))
+
+    # __________________________________________________________________
+
+    def op_jump(self, op, block):
+        self.emit(self.edge(op.args[0]))
+
+    def op_cbranch(self, op, test, true_block, false_block):
+        self.emit('if (%s) {' % (test,))
+        self.emit('    ' + self.edge(op.args[1]))
+        self.emit('} else {')
+        self.emit('    ' + self.edge(op.args[2]))
+        self.emit('}')
+
+    def op_phi(self, op):
+        name = var(op)
+        self.declare(name, op.type)
+        self.declare(name + '_in', op.type)
+        return name
+
+    def op_ret(self, op, value):
+        if value is None:
+            self.emit('return;')
+        else:
+            self.emit('return %s;' % (value,))
+
+    # __________________________________________________________________
+
+    def op_sizeof(self, op, expr):
+        type = self.ctypes(op.args[0].type)
+        return self.assign(op, '(%s)sizeof(%s)' % (self.ctypes(op.type), type))
+
+    def op_addressof(self, op, func):
+        assert func.address
+        return self.assign(op, constant(func.address, Pointer(func.type),
+                                        self.ctypes))
+
+    # __________________________________________________________________
+
+    def op_ptradd(self, op, ptr, val):
+        return self.assign(op, '%s + %s' % (ptr, val))
+
+    def op_ptrload(self, op, ptr):
+        return self.assign(op, '*' + ptr)
+
+    def op_ptrstore(self, op, ptr, val):
+        self.emit('*%s = %s;' % (ptr, val))
+
+    def op_ptrcast(self, op, val):
+        return self.assign(op, '(%s)%s' % (self.ctypes(op.type), val))
+
+    def op_ptr_isnull(self, op, val):
+        return self.assign(op, '(%s == 0)' % (val,))
+
+    def op_ptrfield(self, op, ptr, attr):
+        index = op.args[0].type.base.names.index(attr)
+        return self.assign(op, '&%s->f%d' % (ptr, index))
+
+    # __________________________________________________________________
+
+    def body(self):
+        argnames = [var(arg) for arg in self.func.args]
+        lines = [self.cfunc.prototype(argnames), '{']
+        lines.extend(self.decls)
+        lines.extend(self.lines)
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+#===------------------------------------------------------------------===
+# Argument loading
+#===------------------------------------------------------------------===
+
+class CArgLoader(ArgLoader):
+    """
+    Load Operation arguments as C expressions.
+    """
+
+    def __init__(self, translator):
+        super(CArgLoader, self).__init__()
+        self.translator = translator
+        self.module = translator.module
+
+    def load_GlobalValue(self, arg):
+        ctypes = self.module.ctypes
+        if arg.address:
+            return constant(arg.address, Pointer(arg.type), ctypes)
+        elif arg.external:
+            cfunc = CFunction(ident(arg.name), arg.type, self.module)
+            self.module.declare(cfunc)
+            return '&' + cfunc.name
+        else:
+            assert arg.value
+            return self.load_Constant(arg.value)
+
+    def load_Constant(self, arg):
+        value = constant(arg.const, arg.type, self.module.ctypes)
+        if arg.type.is_struct:
+            name = 'c_%d' % len(self.translator.decls)
+            self.translator.declare(name, arg.type, ' = ' + value)
+            return name
+        return value
+
+    def load_Undef(self, arg):
+        name = 'u_%d' % len(self.translator.decls)
+        self.translator.declare(name, arg.type)
+        return name
+
+    def load_Operation(self, arg):
+        return var(arg)
+
+    load_FuncArg = load_Operation
+
+#===------------------------------------------------------------------===
+# Entry points
+#===------------------------------------------------------------------===
+
+mangle = make_temper()
+
+def initialize(func, env):
+    verify_lowlevel(func)
+    module = env["codegen.c.module"]
+    return module.add_function(ident(mangle(func.name)), func.type)
+
+def translate(func, env, cfunc):
+    if cfunc.body is not None:
+        return cfunc # translated by an earlier compilation
+
+    translator = Translator(func, env, cfunc, env["codegen.c.module"])
+    argloader = CArgLoader(translator)
+    translator.load = argloader.load_op
+    vvisit(opgrouper(translator), func, argloader)
+    cfunc.body = translator.body()
+    return cfunc
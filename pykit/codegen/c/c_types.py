@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+Map pykit types to C99 type names and ctypes types.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+
+from pykit.types import resolve_typedef
+
+int_names = {
+    (8, False): 'signed char',  (8, True): 'unsigned char',
+    (16, False): 'short',       (16, True): 'unsigned short',
+    (32, False): 'int',         (32, True): 'unsigned int',
+    (64, False): 'long long',   (64, True): 'unsigned long long',
+}
+
+class CTypes(object):
+    """
+    Name C types, emitting typedefs for structs and function pointers:
+
+        ctypes = CTypes()
+        ctypes(Pointer(Struct(['a'], [Int32])))   # 'pykit_struct_0 *'
+        ctypes.typedefs                           # ['typedef struct ...']
+    """
+
+    def __init__(self):
+        self.names = {}    # { Type : C type name }
+        self.typedefs = [] # [typedef source]
+
+    def __call__(self, type):
+        type = resolve_typedef(type)
+        if type.is_bool:
+            return 'unsigned char'
+        elif type.is_int:
+            return int_names[type.bits, type.unsigned]
+        elif type.is_real:
+            return 'float' if type.bits == 32 else 'double'
+        elif type.is_void:
+            return 'void'
+        elif type.is_pointer and type.base.is_function:
+            return self.typedef(type, self.function_pointer)
+        elif type.is_pointer:
+            return self(type.base) + ' *'
+        elif type.is_struct:
+            return self.typedef(type, self.struct)
+        raise TypeError("Cannot convert type %s" % (type,))
+
+    def typedef(self, type, make):
+        if type not in self.names:
+            name = 'pykit_%s_%d' % (make.__name__, len(self.names))
+            self.names[type] = name
+            self.typedefs.append(make(type, name)) # after nested typedefs
+        return self.names[type]
+
+    def struct(self, type, name):
+        fields = ''.join(' %s f%d;' % (self(t), i)
+                             for i, t in enumerate(type.types))
+        return 'typedef struct {%s } %s;' % (fields, name)
+
+    def function_pointer(self, type, name):
+        restype, argtypes = type.base.restype, type.base.argtypes
+        args = ', '.join(map(self, argtypes)) or 'void'
+        return 'typedef %s (*%s)(%s);' % (self(restype), name, args)
+
+# ______________________________________________________________________
+
+_ctypes_ints = {
+    (8, False): ctypes.c_int8,   (8, True): ctypes.c_uint8,
+    (16, False): ctypes.c_int16, (16, True): ctypes.c_uint16,
+    (32, False): ctypes.c_int32, (32, True): ctypes.c_uint32,
+    (64, False): ctypes.c_int64, (64, True): ctypes.c_uint64,
+}
+
+_ctypes_structs = {} # { Struct : ctypes.Structure }
+
+def ctype(type):
+    """Get the ctypes type for a pykit type"""
+    type = resolve_typedef(type)
+    if type.is_bool:
+        return ctypes.c_bool
+    elif type.is_int:
+        return _ctypes_ints[type.bits, type.unsigned]
+    elif type.is_real:
+        return ctypes.c_float if type.bits == 32 else ctypes.c_double
+    elif type.is_void:
+        return None
+    elif type.is_pointer and (type.base.is_void or type.base.is_function):
+        return ctypes.c_void_p
+    elif type.is_pointer:
+        return ctypes.POINTER(ctype(type.base))
+    elif type.is_struct:
+        if type not in _ctypes_structs:
+            fields = [('f%d' % i, ctype(t)) for i, t in enumerate(type.types)]
+            _ctypes_structs[type] = _make_struct(fields)
+        return _ctypes_structs[type]
+    elif type.is_function:
+        return ctypes.CFUNCTYPE(ctype(type.restype),
+                                *[ctype(t) for t in type.argtypes])
+    raise TypeError("Cannot convert type %s" % (type,))
+
+def _make_struct(fields):
+    return type(str('Struct'), (ctypes.Structure,), {'_fields_': fields})
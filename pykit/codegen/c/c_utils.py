@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compile C sources to shared libraries with the system C compiler. The
+libraries are cached on disk by a hash of the source, compiler and flags.
+"""
+
+from __future__ import print_function, division, absolute_import
+import os
+import sys
+import ctypes
+import hashlib
+import tempfile
+import subprocess
+from os.path import join, exists, expanduser
+
+default_flags = ['-O3', '-std=c99', '-fPIC', '-fwrapv', '-shared']
+default_libraries = ['m']
+
+def default_cc():
+    return os.environ.get('CC', 'cc')
+
+def default_cachedir():
+    return os.environ.get('PYKIT_CACHE_DIR',
+                          join(expanduser('~'), '.cache', 'pykit', 'c'))
+
+def library_suffix():
+    if sys.platform == 'darwin':
+        return '.dylib'
+    elif sys.platform == 'win32':
+        return '.dll'
+    return '.so'
+
+def source_hash(source, cc, flags):
+    h = hashlib.sha1()
+    for part in [source, cc] + list(flags):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def compile_source(source, cachedir=None, cc=None, flags=None,
+                   libraries=None):
+    """
+    Compile C source to a shared library and return its path. Libraries
+    already in the cache are not recompiled.
+    """
+    cachedir = cachedir or default_cachedir()
+    cc = cc or default_cc()
+    flags = default_flags if flags is None else flags
+    libraries = default_libraries if libraries is None else libraries
+
+    key = source_hash(source, cc, list(flags) + ['-l' + l for l in libraries])
+    path = join(cachedir, 'pykit_%s%s' % (key, library_suffix()))
+    if exists(path):
+        return path
+
+    if not exists(cachedir):
+        try:
+            os.makedirs(cachedir)
+        except OSError:
+            pass # created concurrently
+
+    # Compile to temporary files and rename, for concurrent compilation
+    fd, csource = tempfile.mkstemp(suffix='.c', dir=cachedir)
+    with os.fdopen(fd, 'w') as f:
+        f.write(source)
+    tmp = csource[:-2] + library_suffix()
+    try:
+        cmd = [cc] + list(flags) + ['-o', tmp, csource]
+        cmd.extend('-l' + lib for lib in libraries)
+        subprocess.check_call(cmd)
+        os.rename(tmp, path)
+        os.rename(csource, path[:-len(library_suffix())] + '.c')
+    finally:
+        for name in (csource, tmp):
+            if exists(name):
+                os.remove(name)
+
+    return path
+
+def load_library(path):
+    """Load a library with its symbols global, for calls across libraries"""
+    return ctypes.CDLL(path, mode=ctypes.RTLD_GLOBAL)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import os
+import math
+import shutil
+import tempfile
+import unittest
+
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen import c as codegen
+from pykit.tests import build_loop, build_caller, square
+
+I = types.Int32
+
+def make_swap():
+    """Swap two phis n times: the phis must be assigned in parallel"""
+    func = Function("swap", ['n'], types.Function(I, [I]))
+    entry, cond, body, exit = [func.new_block(name) for name in
+                                   ('entry', 'cond', 'body', 'exit')]
+    n, = func.args
+    b = Builder(func)
+    with b.at_end(entry):
+        b.jump(cond)
+    with b.at_end(cond):
+        i = b.phi(I, [[], []])
+        x = b.phi(I, [[], []])
+        y = b.phi(I, [[], []])
+        b.cbranch(b.lt(types.Bool, [i, n]), body, exit)
+    with b.at_end(body):
+        i2 = b.add(I, [i, Const(1, I)])
+        b.jump(cond)
+    with b.at_end(exit):
+        b.ret(b.sub(I, [x, y]))
+    i.set_args([[entry, body], [Const(0, I), i2]])
+    x.set_args([[entry, body], [Const(1, I), y]])
+    y.set_args([[entry, body], [Const(2, I), x]])
+    return func
+
+@unittest.skipIf(not which(os.environ.get('CC', 'cc')), "no C compiler")
+class TestCCodegen(unittest.TestCase):
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.env = environment.fresh_env()
+        self.env["codegen.cache"] = {}
+        codegen.install(self.env, cachedir=self.cachedir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def compile(self, func):
+        cfunc, env = pipeline.codegen(func, self.env)
+        codegen.optimize(cfunc, env)
+        return cfunc
+
+    def test_loop(self):
+        func, _, _ = build_loop(square, name="sum")
+        cfunc = self.compile(func)
+        self.assertEqual(codegen.execute(cfunc, self.env, 10), 285)
+        self.assertEqual(self.env["codegen.c.ctypes"](4), 14)
+
+    def test_parallel_phis(self):
+        cfunc = self.compile(make_swap())
+        self.assertEqual(codegen.execute(cfunc, self.env, 0), -1)
+        self.assertEqual(codegen.execute(cfunc, self.env, 1), 1)
+
+    def test_call_across_libraries(self):
+        callee, _, _ = build_loop(square, name="sum")
+        self.compile(callee)
+        cfunc = self.compile(build_caller(callee))
+        self.assertAlmostEqual(codegen.execute(cfunc, self.env, 10.0),
+                               285 + math.sin(10.0))
+
+    def test_cache(self):
+        source = "int f(void) { return 1; }\n"
+        path = codegen.c_utils.compile_source(source, self.cachedir)
+        mtime = os.path.getmtime(path)
+        self.assertEqual(codegen.c_utils.compile_source(source, self.cachedir),
+                         path)
+        self.assertEqual(os.path.getmtime(path), mtime)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,15 +15,19 @@ def code_generation(func, env, codegen=None):
     codegen = codegen or env["codegen.impl"]
     cache = env["codegen.cache"]
 
-    graph = callgraph.callgraph(func)
+    if env["codegen.lazy"]:
+        # Callees are compiled on their first call, see pykit.codegen.lazy
+        functions = [func]
+    else:
+        functions = callgraph.callgraph(func).node
 
-    for callee in graph.node:
+    for callee in functions:
         if callee not in cache:
             cache[callee] = codegen.initialize(callee, env)
 
     # TODO: Different environments for each function?
     results = {}
-    for callee in graph.node:
+    for callee in functions:
         results[callee] = codegen.translate(callee, env, cache[callee])
 
     return results[func], env
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lazy compilation. Instead of compiling the entire call graph up front,
+only the function itself is compiled, and calls go through function
+pointer slots. Each slot initially points to a stub, which compiles the
+callee on the first call and patches the slot with the address of the
+compiled code, so later calls go directly to the callee:
+
+    codegen.install(env)
+    lazy.install(env, codegen)
+    cfunc = lazy.slot(func, env)    # nothing is compiled yet
+    cfunc(10)                       # compiles func, calls it
+
+Stubs are ctypes callbacks, so functions passing structs by value are not
+supported. Exceptions cannot propagate through native code: if compiling
+a callee fails, its stub returns zero to the native caller, and the error
+is raised once control returns to the Slot called from Python.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+
+from pykit import pipeline
+from pykit.codegen.c.c_types import ctype
+
+def install(env, codegen):
+    """Compile lazily with the given (installed) code generator"""
+    env["codegen.lazy"] = codegen
+    env["codegen.lazy.slots"] = {}
+    env["codegen.lazy.errors"] = [] # raised in stubs, see Slot.__call__
+
+class Slot(object):
+    """
+    Function pointer to a function, initially pointing to a stub that
+    compiles the function.
+    """
+
+    def __init__(self, func, env):
+        self.func = func
+        self.env = env
+        self.functype = ctype(func.type)
+        self.stub = self.functype(self.trampoline)
+        self.cell = ctypes.c_void_p(ctypes.cast(self.stub, ctypes.c_void_p).value)
+        self.cfunc = None
+
+    @property
+    def address(self):
+        """Address of the function pointer"""
+        return ctypes.addressof(self.cell)
+
+    def compile(self):
+        """Compile the function and patch the slot, return a ctypes function"""
+        if self.cfunc is None:
+            codegen = self.env["codegen.lazy"]
+            lfunc, env = pipeline.codegen(self.func, self.env)
+            self.cfunc = env["codegen.%s.ctypes" % codegen.name]
+            self.cell.value = ctypes.cast(self.cfunc, ctypes.c_void_p).value
+        return self.cfunc
+
+    def trampoline(self, *args):
+        """Called from native code, which exceptions cannot unwind"""
+        try:
+            return self.compile()(*args)
+        except Exception as e:
+            self.env["codegen.lazy.errors"].append(e)
+            restype = self.functype._restype_
+            return restype().value if restype else None
+
+    def __call__(self, *args):
+        errors = self.env["codegen.lazy.errors"]
+        del errors[:]
+        result = self.compile()(*args)
+        if errors:
+            error = errors[0]
+            del errors[:]
+            raise error
+        return result
+
+def slot(func, env):
+    """Get the Slot for `func`"""
+    slots = env["codegen.lazy.slots"]
+    if func not in slots:
+        slots[func] = Slot(func, env)
+    return slots[func]
@@ -5,34 +5,45 @@ LLVM codegen utilities.
 """
 
 from __future__ import print_function, division, absolute_import
+from contextlib import contextmanager
 
 from pykit.utils import make_temper
 from . import llvm_postpasses
 from . import llvm_codegen
 from .llvm_utils import module, target_machine, link_module, execution_engine
 from . import llvm_utils
-from .. import codegen
+from .. import codegen, target
+from .. import perf as perf_
 
 name = "llvm"
 
-def install(env, opt=3, llvm_engine=None, llvm_module=None,
-            llvm_target_machine=None, temper=make_temper()):
-    """Install llvm code generator in environment"""
-    llvm_target_machine = llvm_target_machine or target_machine(opt)
-    llvm_module = llvm_module or module(temper("temp_module"))
-    llvm_engine = llvm_engine or execution_engine(llvm_module,
+def install(env, opt=3, llvm_engine=None, llvm_target_machine=None,
+            temper=make_temper(), cpu=None, features=None, perf=False,
+            jitdump=False):
+    """
+    Install llvm code generator in environment. The target cpu and
+    features default to those of the host (see pykit.codegen.target).
+    With `perf` or `jitdump`, compiled functions are written to the perf
+    map or a jitdump file for native profilers (see pykit.codegen.perf).
+
+    Functions are translated into a new module for every link (see
+    `link`), there is no `llvm_module` argument anymore: a given
+    `llvm_engine` only receives the modules of compiled functions.
+    """
+    cpu, features = target.resolve(cpu, features)
+    llvm_target_machine = llvm_target_machine or target_machine(opt, cpu,
+                                                                features)
+    llvm_engine = llvm_engine or execution_engine(module(temper("engine")),
                                                   llvm_target_machine)
 
     # -------------------------------------------------
     # Codegen passes
 
     env["pipeline.codegen"].extend([
-        "passes.llvm.postpasses",
         "passes.llvm.ctypes",
     ])
 
     env["passes.codegen"] = codegen
-    env["passes.llvm.postpasses"] = llvm_postpasses
     env["passes.llvm.ctypes"] = get_ctypes
 
     env["codegen.impl"] = llvm_codegen
@@ -41,27 +52,147 @@ def install(env, opt=3, llvm_engine=None, llvm_module=None,
     # Codegen state
 
     env["codegen.llvm.opt"] = opt
+    env["codegen.llvm.cpu"] = cpu
+    env["codegen.llvm.features"] = features
     env["codegen.llvm.engine"] = llvm_engine
-    env["codegen.llvm.module"] = llvm_module
     env["codegen.llvm.machine"] = llvm_target_machine
+    env["codegen.llvm.temper"] = temper
+
+    # New functions are translated into a module of their own, which is
+    # added to the engine once they are needed (see `link`)
+    env["codegen.llvm.module"] = new_module(env)
+
+    # Incremental optimization: functions translated since the last
+    # optimize(), functions awaiting module passes and the batch depth
+    env["codegen.llvm.passmanagers"] = None
+    env["codegen.llvm.unoptimized"] = []
+    env["codegen.llvm.pending"] = []
+    env["codegen.llvm.batch"] = 0
+
+    # Functions of earlier modules called from the current module
+    env["codegen.llvm.externals"] = {} # { name : llvm function }
+
+    # Math functions declared since they were last linked (llvm_postpasses)
+    env["codegen.llvm.math"] = []
+
+    # ctypes wrappers of compiled functions: { function name : cfunc }
+    env["codegen.llvm.wrappers"] = {}
+    env["codegen.llvm.perf"] = perf_.profiler(perf, jitdump)
+
+def new_module(env):
+    return module(env["codegen.llvm.temper"]("temp_module"))
 
 def verify(func, env):
     """Verify LLVM function and module"""
     llvm_utils.verify(func)
     llvm_utils.verify(env["codegen.llvm.module"])
 
+def passmanagers(env):
+    """Get the (pm, fpm) pass managers for the module, built on first use"""
+    if env["codegen.llvm.passmanagers"] is None:
+        env["codegen.llvm.passmanagers"] = llvm_utils.pass_managers(
+            env["codegen.llvm.module"],
+            env["codegen.llvm.machine"],
+            env["codegen.llvm.opt"])
+    return env["codegen.llvm.passmanagers"]
+
 def optimize(func, env):
-    """Optimize llvm module"""
-    llvm_utils.optimize(env["codegen.llvm.module"],
-                        env["codegen.llvm.machine"],
-                        env["codegen.llvm.opt"])
+    """
+    Optimize the llvm functions translated since the last call with the
+    function passes. Module passes run once the new functions are linked
+    (see `link`).
+    """
+    lfuncs = env["codegen.llvm.unoptimized"]
+    if lfuncs:
+        llvm_utils.optimize_functions(passmanagers(env).fpm, lfuncs)
+        env["codegen.llvm.pending"].extend(lfuncs)
+        env["codegen.llvm.unoptimized"] = []
+
+def flush(env):
+    """Optimize and link the functions translated since the last flush"""
+    link(env)
+
+def link(env):
+    """
+    Run the module passes over the module of the functions translated
+    since the last link, add it to the execution engine and start a new
+    module. Functions compiled before are not optimized again.
+
+    Calls to functions of earlier modules are calls to declarations (see
+    llvm_codegen.declare), so these callees are no longer inlined: compile
+    callers and callees in one `batch` to inline across functions.
+    """
+    llvm_module = env["codegen.llvm.module"]
+    if not any(not f.is_declaration for f in llvm_module.functions):
+        return
+
+    optimize(None, env)
+    llvm_postpasses.link_math(env)
+    if env["codegen.llvm.pending"]:
+        passmanagers(env).pm.run(llvm_module)
+
+    engine = env["codegen.llvm.engine"]
+    engine.add_module(llvm_module)
+    for name, lfunc in env["codegen.llvm.externals"].items():
+        decl = llvm_module.get_function_named(name)
+        engine.add_global_mapping(decl, engine.get_pointer_to_function(lfunc))
+    if env["codegen.llvm.perf"]:
+        register_functions(env, llvm_module)
+
+    env["codegen.llvm.module"] = new_module(env)
+    env["codegen.llvm.externals"] = {}
+    env["codegen.llvm.passmanagers"] = None
+    env["codegen.llvm.unoptimized"] = []
+    env["codegen.llvm.pending"] = []
+
+def register_functions(env, llvm_module):
+    """Register the functions of a linked module with the profiler"""
+    engine = env["codegen.llvm.engine"]
+    for lfunc in llvm_module.functions:
+        if not lfunc.is_declaration:
+            # The old JIT does not report code sizes
+            address = engine.get_pointer_to_function(lfunc)
+            env["codegen.llvm.perf"].register(address, perf_.default_size,
+                                              lfunc.name)
+
+@contextmanager
+def batch(env):
+    """
+    Compile a batch of functions into one module, linked once at the end.
+    Within a batch, ctypes wrappers are only created on demand (see
+    `wrapper`), after the batch:
+
+        with batch(env):
+            for func in funcs:
+                lfunc, env = pipeline.codegen(func, env)
+                optimize(lfunc, env)
+    """
+    env["codegen.llvm.batch"] += 1
+    try:
+        yield env
+    finally:
+        env["codegen.llvm.batch"] -= 1
+        if not env["codegen.llvm.batch"]:
+            flush(env)
+
+def wrapper(func, env):
+    """Get the ctypes wrapper of a compiled llvm function, built only once"""
+    wrappers = env["codegen.llvm.wrappers"]
+    cfunc = wrappers.get(func.name)
+    if cfunc is None:
+        if func.module.id == env["codegen.llvm.module"].id:
+            link(env)
+        cfunc = llvm_utils.pointer_to_func(env["codegen.llvm.engine"], func)
+        wrappers[func.name] = cfunc
+    return cfunc
 
 def get_ctypes(func, env):
-    cfunc = llvm_utils.pointer_to_func(env["codegen.llvm.engine"], func)
-    env["codegen.llvm.ctypes"] = cfunc
+    if env["codegen.llvm.batch"]:
+        env["codegen.llvm.ctypes"] = None # linked at the end of the batch
+    else:
+        env["codegen.llvm.ctypes"] = wrapper(func, env)
 
 def execute(func, env, *args):
     """Execute llvm function with the given arguments"""
-    cfunc = llvm_utils.pointer_to_func(env["codegen.llvm.engine"], func)
     assert len(func.args) == len(args)
-    return cfunc(*args)
\ No newline at end of file
+    return wrapper(func, env)(*args)
\ No newline at end of file
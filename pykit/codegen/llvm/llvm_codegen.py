@@ -4,6 +4,7 @@ from pykit.ir import vvisit, ArgLoader, verify_lowlevel
 from pykit.ir import defs, opgrouper
 from pykit.types import Boolean, Integral, Real, Pointer, Function, Int64, Struct
 from pykit.codegen.llvm.llvm_types import llvm_type
+from pykit.codegen import mathlib
 from pykit.utils import make_temper
 
 import llvm.core as lc
@@ -13,6 +14,9 @@ from llvm.core import Type, Constant
 # Definitions
 #===------------------------------------------------------------------===
 
+# Exception models this code generator can translate (lower_errcheck)
+exception_models = ('costful',)
+
 compare_float = {
     '>':  lc.FCMP_OGT,
     '<':  lc.FCMP_OLT,
@@ -123,6 +127,10 @@ def sizeof(builder, ty, intp):
     offset = builder.gep(null, [Constant.int(Type.int(), 1)])
     return builder.ptrtoint(offset, intp)
 
+def intrinsic_id(intrinsic):
+    """llvmpy id of an intrinsic: 'llvm.sqrt' -> INTR_SQRT"""
+    return getattr(lc, 'INTR_' + intrinsic[len('llvm.'):].upper())
+
 #===------------------------------------------------------------------===
 # Translator
 #===------------------------------------------------------------------===
@@ -198,15 +206,23 @@ class Translator(object):
         # Get the callee LLVM function from the cache. This is put there by
         # pykit.codegen.codegen
         cache = self.env["codegen.cache"]
-        lfunc = cache[function]
+        lfunc = declare(self.lmod, cache[function], self.env)
         return self.builder.call(lfunc, args)
 
     def op_call_math(self, op, name, args):
-        # Math is resolved by an LLVM postpass
-        argtypes = [arg.type for arg in args]
-        lfunc_type = self.llvm_type(Function(op.type, argtypes))
-        lfunc = self.lmod.get_or_insert_function(
-            lfunc_type, 'pykit.math.%s.%s' % (map(str, argtypes), name.lower()))
+        argtypes = [arg.type for arg in op.args[1]]
+        intrinsic = mathlib.intrinsic(name, op.type)
+        if intrinsic is not None:
+            lfunc = lc.Function.intrinsic(self.lmod, intrinsic_id(intrinsic),
+                                          [self.llvm_type(op.type)])
+        else:
+            # Resolved once per module by llvm_postpasses.link_math
+            lfunc_type = self.llvm_type(Function(op.type, argtypes))
+            fname = mathlib.mangle(name, argtypes)
+            lfunc = self.lmod.get_or_insert_function(lfunc_type, fname)
+            declared = self.env["codegen.llvm.math"]
+            if lfunc.is_declaration and fname not in declared:
+                declared.append(fname)
         return self.builder.call(lfunc, args, op.result)
 
     # __________________________________________________________________
@@ -296,9 +312,25 @@ class Translator(object):
         intval = self.builder.ptrtoint(val, self.llvm_type(Int64))
         return self.builder.icmp(lc.ICMP_EQ, intval, zero(intval.type), op.result)
 
+    def op_ptrfield(self, op, ptr, attr):
+        index = op.args[0].type.base.names.index(attr)
+        return self.builder.gep(ptr, [const_i32(0), const_i32(index)],
+                                op.result)
+
     # __________________________________________________________________
 
 
+def declare(llvm_module, lfunc, env):
+    """
+    Get `lfunc` or a declaration of it in `llvm_module`. Declarations of
+    functions in other modules are resolved when the module is added to
+    the execution engine (see pykit.codegen.llvm.link).
+    """
+    if lfunc.module.id == llvm_module.id:
+        return lfunc
+    env["codegen.llvm.externals"][lfunc.name] = lfunc
+    return llvm_module.get_or_insert_function(lfunc.type.pointee, lfunc.name)
+
 def allocate_blocks(llvm_func, pykit_func):
     """Return a dict mapping pykit blocks to llvm blocks"""
     blocks = {}
@@ -393,7 +425,11 @@ mangle = make_temper()
 def initialize(func, env):
     verify_lowlevel(func)
     llvm_module = env["codegen.llvm.module"]
-    return llvm_module.add_function(llvm_type(func.type), mangle(func.name))
+    lfunc = llvm_module.add_function(llvm_type(func.type), mangle(func.name))
+    env["codegen.llvm.unoptimized"].append(lfunc)
+    if env["codegen.llvm.perf"]:
+        env["codegen.llvm.perf"].add_name(lfunc.name, func.name)
+    return lfunc
 
 def translate(func, env, lfunc):
     engine, llvm_module = env["codegen.llvm.engine"], env["codegen.llvm.module"]
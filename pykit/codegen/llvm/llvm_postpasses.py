@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 
 """
-Postpasses over the LLVM IR.
-The signature of each postpass is postpass(env, ee, lmod, lfunc) -> lfunc
+Postpasses over the LLVM module.
+
+Math functions without an LLVM intrinsic are declared as
+pykit.math.<name>.<types> (see pykit.codegen.mathlib) and resolved against
+llvmmath once per module, before the module passes run, instead of
+after translating each function.
+
+llvmmath ships its math library as bitcode. It is loaded once per process
+and linked as is; pykit keeps no optimized copy of it on disk, the module
+passes optimize the linked functions together with their callers.
 """
 
 from __future__ import print_function, division, absolute_import
@@ -10,25 +18,29 @@ from __future__ import print_function, division, absolute_import
 import llvmmath
 from llvmmath import linking
 
-# ______________________________________________________________________
+from pykit.codegen import mathlib
+
+_math_library = None
 
-def postpass_link_math(ee, lmod, lfunc):
-    "pykit.math.* -> llvmmath.*"
-    replacements = {}
-    for lf in lmod.functions:
-        if lf.name.startswith('pykit.math.'):
-            _, _, name = lf.name.partition('.')
-            replacements[lf.name] = name
-    del lf # this is dead after linking below
-
-    default_math_lib = llvmmath.get_default_math_lib()
-    linker = linking.get_linker(default_math_lib)
-    linking.link_llvm_math_intrinsics(ee, lmod, default_math_lib,
-                                      linker, replacements)
-    return lfunc
+def math_library():
+    """The llvmmath library and its linker, loaded once per process"""
+    global _math_library
+    if _math_library is None:
+        library = llvmmath.get_default_math_lib()
+        _math_library = library, linking.get_linker(library)
+    return _math_library
 
 # ______________________________________________________________________
 
-def run(lfunc, env):
-    postpass_link_math(env["codegen.llvm.engine"], env["codegen.llvm.module"],
-                       lfunc)
\ No newline at end of file
+def link_math(env):
+    "pykit.math.* -> llvmmath.*, for the math functions declared so far"
+    declared = env["codegen.llvm.math"]
+    if not declared:
+        return
+
+    replacements = dict((name, mathlib.demangle(name)) for name in declared)
+    library, linker = math_library()
+    linking.link_llvm_math_intrinsics(env["codegen.llvm.engine"],
+                                      env["codegen.llvm.module"],
+                                      library, linker, replacements)
+    env["codegen.llvm.math"] = []
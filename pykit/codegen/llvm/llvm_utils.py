@@ -13,10 +13,9 @@ import llvm.core
 def verify(mod_or_func):
     mod_or_func.verify()
 
-def target_machine(opt=3):
-    features = '-avx'
+def target_machine(opt=3, cpu='', features=''):
     return llvm.ee.TargetMachine.new(
-        opt=opt, cm=llvm.ee.CM_JITDEFAULT, features=features)
+        cpu=cpu, features=features, opt=opt, cm=llvm.ee.CM_JITDEFAULT)
 
 def module(name):
     return llvm.core.Module.new(name)
@@ -24,13 +23,32 @@ def module(name):
 def execution_engine(llvm_module, target_machine):
     return llvm.ee.EngineBuilder.new(llvm_module).create(target_machine)
 
+def pass_managers(llvm_module, target_machine, opt=3, inline=1000):
+    """
+    Build the module pass manager and a function pass manager for functions
+    in `llvm_module`. Returns a (pm, fpm) named tuple.
+    """
+    has_loop_vectorizer = llvm.version >= (3, 2)
+    return llvm.passes.build_pass_managers(
+        target_machine, opt=opt, inline_threshold=inline,
+        loop_vectorize=has_loop_vectorizer, fpm=True, mod=llvm_module)
+
 def optimize(llvm_module, target_machine, opt=3, inline=1000):
+    """Run the module and function passes over the entire module"""
     has_loop_vectorizer = llvm.version >= (3, 2)
     passmanagers = llvm.passes.build_pass_managers(
         target_machine, opt=opt, inline_threshold=inline,
         loop_vectorize=has_loop_vectorizer, fpm=False)
     passmanagers.pm.run(llvm_module)
 
+def optimize_functions(fpm, lfuncs):
+    """Run the function passes over the given LLVM functions only"""
+    fpm.initialize()
+    for lfunc in lfuncs:
+        if not lfunc.is_declaration:
+            fpm.run(lfunc)
+    fpm.finalize()
+
 def pointer_to_func(engine, lfunc):
     addr = engine.get_pointer_to_function(lfunc)
     return ctypes.cast(addr, ctype(lfunc.type.pointee))
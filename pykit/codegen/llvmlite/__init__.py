@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+LLVM code generator on llvmlite and MCJIT.
+
+Functions are translated into an llvmlite IR module. The module is
+compiled when the code is first needed (optimize(), get_ctypes() or
+execute()): it is parsed, optimized with the new pass manager and added to
+the MCJIT engine, after which translation continues in a fresh module.
+Each module is therefore optimized only once, and functions from earlier
+modules are called through declarations resolved by the engine.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit.utils import make_temper
+from . import llvmlite_codegen
+from .llvmlite_utils import module, target_machine, execution_engine
+from . import llvmlite_utils
+from .. import codegen, target
+from .. import perf as perf_
+
+import llvmlite.binding as llvm
+
+name = "llvmlite"
+
+def install(env, opt=3, llvm_engine=None, llvm_target_machine=None,
+            temper=make_temper(), cpu=None, features=None, perf=False,
+            jitdump=False):
+    """
+    Install llvmlite code generator in environment. The target cpu and
+    features default to those of the host (see pykit.codegen.target).
+    With `perf` or `jitdump`, compiled functions are written to the perf
+    map or a jitdump file for native profilers (see pykit.codegen.perf).
+    """
+    cpu, features = target.resolve(cpu, features)
+    llvm_target_machine = llvm_target_machine or target_machine(opt, cpu,
+                                                                features)
+    llvm_engine = llvm_engine or execution_engine(llvm_target_machine)
+
+    # -------------------------------------------------
+    # Codegen passes
+
+    env["pipeline.codegen"].extend([
+        "passes.llvmlite.ctypes",
+    ])
+
+    env["passes.codegen"] = codegen
+    env["passes.llvmlite.ctypes"] = get_ctypes
+
+    env["codegen.impl"] = llvmlite_codegen
+
+    # -------------------------------------------------
+    # Codegen state
+
+    env["codegen.llvmlite.opt"] = opt
+    env["codegen.llvmlite.cpu"] = cpu
+    env["codegen.llvmlite.features"] = features
+    env["codegen.llvmlite.engine"] = llvm_engine
+    env["codegen.llvmlite.machine"] = llvm_target_machine
+    env["codegen.llvmlite.temper"] = temper
+    env["codegen.llvmlite.module"] = new_module(env)
+
+    # ctypes wrappers of compiled functions: { function name : cfunc }
+    env["codegen.llvmlite.wrappers"] = {}
+
+    # Entry points catching zero-cost exceptions: { function name : entry }
+    env["codegen.llvmlite.entries"] = {}
+
+    # Profiling, with the objects emitted by the engine for code sizes
+    env["codegen.llvmlite.perf"] = perf_.profiler(perf, jitdump)
+    env["codegen.llvmlite.objects"] = []
+    if env["codegen.llvmlite.perf"]:
+        llvm_engine.set_object_cache(
+            lambda module, buf: env["codegen.llvmlite.objects"].append(buf))
+
+def new_module(env):
+    temper = env["codegen.llvmlite.temper"]
+    return module(temper("temp_module"), env["codegen.llvmlite.machine"])
+
+def finalize(env):
+    """
+    Optimize and compile the functions translated since the last call,
+    and start a new module.
+    """
+    llvm_module = env["codegen.llvmlite.module"]
+    if not any(not f.is_declaration for f in llvm_module.functions):
+        return
+
+    module_ref = llvmlite_utils.parse(llvm_module)
+    module_ref.verify()
+    llvmlite_utils.optimize(module_ref,
+                            env["codegen.llvmlite.machine"],
+                            env["codegen.llvmlite.opt"])
+    llvmlite_utils.add_module(env["codegen.llvmlite.engine"], module_ref)
+    env["codegen.llvmlite.module"] = new_module(env)
+    if env["codegen.llvmlite.perf"]:
+        register_functions(env, module_ref)
+
+def register_functions(env, module_ref):
+    """Register the functions of a compiled module with the profiler"""
+    engine = env["codegen.llvmlite.engine"]
+    addresses = dict((engine.get_function_address(f.name), f.name)
+                         for f in module_ref.functions if not f.is_declaration)
+    if not addresses:
+        return
+
+    # Functions are laid out in the text section of the module's object
+    end = None
+    objects = env["codegen.llvmlite.objects"]
+    if objects:
+        text = sum(section.size() for section in
+                       llvm.ObjectFileRef.from_data(objects.pop()).sections()
+                           if section.is_text())
+        end = min(addresses) + text
+        del objects[:]
+
+    sizes = perf_.code_sizes(addresses, end)
+    for address, name in sorted(addresses.items()):
+        env["codegen.llvmlite.perf"].register(address, sizes[address], name)
+
+def verify(func, env):
+    """Verify LLVM module"""
+    llvmlite_utils.verify(env["codegen.llvmlite.module"])
+
+def optimize(func, env):
+    """Optimize and compile the llvm functions translated so far"""
+    finalize(env)
+
+def wrapper(func, env):
+    """Get the ctypes wrapper of an llvm function, compiling it if needed"""
+    wrappers = env["codegen.llvmlite.wrappers"]
+    cfunc = wrappers.get(func.name)
+    if cfunc is None:
+        finalize(env)
+        entry = env["codegen.llvmlite.entries"].get(func.name, func.name)
+        cfunc = llvmlite_utils.pointer_to_func(env["codegen.llvmlite.engine"],
+                                               func, entry)
+        wrappers[func.name] = cfunc
+    return cfunc
+
+def get_ctypes(func, env):
+    env["codegen.llvmlite.ctypes"] = wrapper(func, env)
+
+def execute(func, env, *args):
+    """Execute llvm function with the given arguments"""
+    assert len(func.args) == len(args)
+    return wrapper(func, env)(*args)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ahead-of-time compilation to object files and shared libraries.
+
+    aot.compile([f, g], "build/libfoo.so")
+
+writes build/libfoo.so, a manifest build/libfoo.json describing the
+exported functions and, optionally, a copy of `aotloader.py`. The loader
+binds the functions with ctypes without importing pykit or llvmlite:
+
+    import aotloader
+    lib = aotloader.load("build/libfoo.json")
+    lib.f(1, 2)
+
+aot.compile(..., jobs=4) compiles the functions in four worker processes
+(see pykit.codegen.llvmlite.parallel) and links the objects together.
+"""
+
+from __future__ import print_function, division, absolute_import
+import os
+import json
+import shutil
+import subprocess
+from os.path import splitext, basename, dirname, join, abspath
+
+from pykit import environment, pipeline, types
+from pykit.codegen import target
+from . import llvmlite_utils, parallel
+from .. import codegen as codegen_pass
+
+#===------------------------------------------------------------------===
+# Manifest
+#===------------------------------------------------------------------===
+
+manifest_version = 1
+
+def type_code(type):
+    """
+    Encode a pykit type for the manifest:
+
+        'int32', 'uint8', 'float64', 'bool', 'void', '*int32', '*void',
+        {'struct': [[name, code], ...]}
+    """
+    type = types.resolve_typedef(type)
+    if type.is_int:
+        return '%sint%d' % ('u' if type.unsigned else '', type.bits)
+    elif type.is_real:
+        return 'float%d' % type.bits
+    elif type.is_bool:
+        return 'bool'
+    elif type.is_void:
+        return 'void'
+    elif type.is_pointer:
+        base = types.resolve_typedef(type.base)
+        if base.is_struct or base.is_function:
+            return '*void'
+        return '*' + type_code(base)
+    elif type.is_struct:
+        return {'struct': [[name, type_code(t)]
+                               for name, t in zip(type.names, type.types)]}
+    raise TypeError("Cannot export values of type %s" % (type,))
+
+def signature(func, symbol):
+    return {
+        'symbol': symbol,
+        'restype': type_code(func.type.restype),
+        'argtypes': [type_code(t) for t in func.type.argtypes],
+        'argnames': [arg.result for arg in func.args],
+    }
+
+def write_manifest(path, library, functions, cpu, features, triple):
+    manifest = {
+        'version': manifest_version,
+        'library': library,
+        'triple': triple,
+        'cpu': cpu,
+        'features': features,
+        'functions': functions,
+    }
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+#===------------------------------------------------------------------===
+# Compilation
+#===------------------------------------------------------------------===
+
+def translate(funcs, env):
+    """Translate the functions into the llvmlite module of `env`"""
+    symbols = {}
+    for func in funcs:
+        func, env = pipeline.run(func, env, env["pipeline.codegen"])
+        lfunc, env = codegen_pass.run(func, env)
+        symbols[func.name] = (func, lfunc.name)
+    return symbols
+
+def emit_object(funcs, env):
+    """Compile the functions, return (object code, symbols)"""
+    symbols = translate(funcs, env)
+    module_ref = llvmlite_utils.parse(env["codegen.llvmlite.module"])
+    module_ref.verify()
+    llvmlite_utils.optimize(module_ref,
+                            env["codegen.llvmlite.machine"],
+                            env["codegen.llvmlite.opt"])
+    return env["codegen.llvmlite.machine"].emit_object(module_ref), symbols
+
+def link_shared(objfiles, output, cc=None, libraries=('m',)):
+    """Link object files into a shared library with the system compiler"""
+    cc = cc or os.environ.get('CC', 'cc')
+    cmd = [cc, '-shared', '-o', output] + as_list(objfiles)
+    cmd.extend('-l' + lib for lib in libraries)
+    subprocess.check_call(cmd)
+
+def link_relocatable(objfiles, output, cc=None):
+    """Combine object files into one object file"""
+    cc = cc or os.environ.get('CC', 'cc')
+    subprocess.check_call([cc, '-r', '-nostdlib', '-o', output] +
+                          as_list(objfiles))
+
+def as_list(objfiles):
+    if isinstance(objfiles, (list, tuple)):
+        return list(objfiles)
+    return [objfiles]
+
+def write_objects(objects, output, cc=None):
+    """Write objects to `output`, an object file or shared library"""
+    root, ext = splitext(output)
+    if ext == '.o' and len(objects) == 1:
+        objfiles = [output]
+    else:
+        objfiles = ['%s.%d.o' % (root, i) for i in range(len(objects))]
+    for obj, objfile in zip(objects, objfiles):
+        with open(objfile, 'wb') as f:
+            f.write(obj)
+
+    if ext == '.o' and len(objects) > 1:
+        link_relocatable(objfiles, output, cc)
+    elif ext != '.o':
+        link_shared(objfiles, output, cc)
+    if objfiles != [output]:
+        for objfile in objfiles:
+            os.remove(objfile)
+
+def compile(funcs, output, opt=3, cpu=None, features=None, cc=None,
+            write_loader=False, jobs=1):
+    """
+    Compile pykit functions (in low-level form) to `output`, an object
+    file ('.o') or a shared library (any other extension). Also writes
+    a manifest next to it with the same base name and a '.json' extension,
+    and returns its path.
+
+    Functions with a constant cpu/features are portable to other machines;
+    by default code is generated for the host.
+
+    With `jobs` other than 1, the functions are compiled in parallel by
+    that many worker processes (None for one per CPU), see
+    pykit.codegen.llvmlite.parallel.
+    """
+    from pykit.codegen import llvmlite as codegen
+
+    cpu, features = target.resolve(cpu, features)
+    machine = llvmlite_utils.target_machine(opt, cpu, features, jit=False)
+
+    env = environment.fresh_env()
+    env["codegen.cache"] = {}
+    codegen.install(env, opt=opt, llvm_target_machine=machine)
+    env["pipeline.codegen"] = [p for p in env["pipeline.codegen"]
+                                   if p not in ("passes.codegen",
+                                                "passes.llvmlite.ctypes")]
+
+    if jobs == 1:
+        obj, symbols = emit_object(funcs, env)
+        objects = [obj]
+    else:
+        objects, symbols = parallel.emit_objects(funcs, env, jobs)
+        symbols = dict((func.name, (func, symbols[func])) for func in funcs)
+    write_objects(objects, output, cc)
+
+    manifest = splitext(output)[0] + '.json'
+    functions = dict((name, signature(func, symbol))
+                         for name, (func, symbol) in symbols.items())
+    write_manifest(manifest, basename(output), functions, cpu, features,
+                   machine.triple)
+
+    if write_loader:
+        shutil.copy(join(dirname(abspath(__file__)), 'aotloader.py'),
+                    join(dirname(abspath(output)), 'aotloader.py'))
+
+    return manifest
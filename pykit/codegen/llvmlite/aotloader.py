@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""
+Load libraries compiled ahead-of-time by pykit.codegen.llvmlite.aot.
+
+This module only depends on the standard library. It can be copied next
+to the compiled libraries and used without pykit or LLVM:
+
+    lib = load("libfoo.json")
+    lib.foo(1, 2)
+"""
+
+from __future__ import print_function, division, absolute_import
+import json
+import ctypes
+from os.path import dirname, join, abspath
+
+scalars = {
+    'bool':    ctypes.c_bool,
+    'int8':    ctypes.c_int8,  'uint8':  ctypes.c_uint8,
+    'int16':   ctypes.c_int16, 'uint16': ctypes.c_uint16,
+    'int32':   ctypes.c_int32, 'uint32': ctypes.c_uint32,
+    'int64':   ctypes.c_int64, 'uint64': ctypes.c_uint64,
+    'float32': ctypes.c_float,
+    'float64': ctypes.c_double,
+    'void':    None,
+}
+
+def ctype(code):
+    """Decode a type from the manifest into a ctypes type"""
+    if isinstance(code, dict):
+        fields = [(str(name), ctype(c)) for name, c in code['struct']]
+        return type(str('Struct'), (ctypes.Structure,), {'_fields_': fields})
+    elif code == '*void':
+        return ctypes.c_void_p
+    elif code.startswith('*'):
+        return ctypes.POINTER(ctype(code[1:]))
+    return scalars[code]
+
+class Library(object):
+    """Functions of a compiled library, available as attributes"""
+
+    def __init__(self, manifest, dll):
+        self.manifest = manifest
+        self.dll = dll
+        self.functions = {}
+        for name, sig in manifest['functions'].items():
+            cfunc = getattr(dll, sig['symbol'])
+            cfunc.restype = ctype(sig['restype'])
+            cfunc.argtypes = [ctype(t) for t in sig['argtypes']]
+            self.functions[name] = cfunc
+
+    def __getattr__(self, attr):
+        try:
+            return self.functions[attr]
+        except KeyError:
+            raise AttributeError(attr)
+
+    def __dir__(self):
+        return list(self.functions)
+
+def load(manifest_path):
+    """Load the library described by the given manifest"""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    path = join(dirname(abspath(manifest_path)), manifest['library'])
+    return Library(manifest, ctypes.CDLL(path))
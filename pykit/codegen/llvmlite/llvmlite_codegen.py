@@ -0,0 +1,605 @@
+# -*- coding: utf-8 -*-
+
+"""
+Translate low-level pykit IR to llvmlite IR.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit.ir import vvisit, ArgLoader, verify_lowlevel
+from pykit.ir import defs, opgrouper
+from pykit.types import (Boolean, Integral, Real, Pointer, Function, Int64, Struct,
+                         Float32)
+from pykit.codegen.llvmlite.llvmlite_types import llvm_type
+from pykit.codegen.llvmlite.llvmlite_utils import load_cxx_runtime
+from pykit.codegen import lazy, mathlib
+from pykit.utils import make_temper
+
+from llvmlite import ir
+import llvmlite.binding as llvm
+
+#===------------------------------------------------------------------===
+# Definitions
+#===------------------------------------------------------------------===
+
+# Exception models this code generator can translate (lower_errcheck)
+exception_models = ('costful', 'zerocost')
+
+def integer_invert(builder, val):
+    return builder.xor(val, ir.Constant(val.type, -1))
+
+def integer_usub(builder, val):
+    return builder.sub(ir.Constant(val.type, 0), val)
+
+def integer_not(builder, value):
+    return builder.icmp_unsigned('==', value, ir.Constant(value.type, 0))
+
+def float_usub(builder, val):
+    return builder.fsub(ir.Constant(val.type, 0), val)
+
+def float_not(builder, val):
+    return builder.fcmp_ordered('==', val, ir.Constant(val.type, 0))
+
+
+binop_int  = {
+     '+': (ir.IRBuilder.add, ir.IRBuilder.add),
+     '-': (ir.IRBuilder.sub, ir.IRBuilder.sub),
+     '*': (ir.IRBuilder.mul, ir.IRBuilder.mul),
+     '/': (ir.IRBuilder.sdiv, ir.IRBuilder.udiv),
+    '//': (ir.IRBuilder.sdiv, ir.IRBuilder.udiv),
+     '%': (ir.IRBuilder.srem, ir.IRBuilder.urem),
+     '&': (ir.IRBuilder.and_, ir.IRBuilder.and_),
+     '|': (ir.IRBuilder.or_, ir.IRBuilder.or_),
+     '^': (ir.IRBuilder.xor, ir.IRBuilder.xor),
+     '<<': (ir.IRBuilder.shl, ir.IRBuilder.shl),
+     '>>': (ir.IRBuilder.ashr, ir.IRBuilder.lshr),
+}
+
+binop_float = {
+     '+': ir.IRBuilder.fadd,
+     '-': ir.IRBuilder.fsub,
+     '*': ir.IRBuilder.fmul,
+     '/': ir.IRBuilder.fdiv,
+    '//': ir.IRBuilder.fdiv,
+     '%': ir.IRBuilder.frem,
+}
+
+unary_bool = {
+    '!': integer_not,
+}
+
+unary_int = {
+    '~': integer_invert,
+    '!': integer_not,
+    "+": lambda builder, arg: arg,
+    "-": integer_usub,
+}
+
+unary_float = {
+    '!': float_not,
+    "+": lambda builder, arg: arg,
+    "-": float_usub,
+}
+
+# pykit math function name -> libm name (of the double version)
+libm_names = {
+    'Abs': 'fabs',
+}
+
+#===------------------------------------------------------------------===
+# Utils
+#===------------------------------------------------------------------===
+
+i1, i8, i32, i64 = map(ir.IntType, [1, 8, 32, 64])
+
+def sizeof(builder, ty, intp):
+    null = ir.Constant(ty.as_pointer(), None)
+    offset = builder.gep(null, [ir.Constant(i32, 1)])
+    return builder.ptrtoint(offset, intp)
+
+def cast(builder, value, src, dst, name=''):
+    """Cast `value` from pykit type `src` to pykit type `dst`"""
+    lty = llvm_type(dst)
+    if src == dst:
+        return value
+    elif (src.is_int or src.is_bool) and (dst.is_int or dst.is_bool):
+        srcbits = 1 if src.is_bool else src.bits
+        dstbits = 1 if dst.is_bool else dst.bits
+        if dstbits < srcbits:
+            return builder.trunc(value, lty, name)
+        elif dstbits == srcbits:
+            return value
+        elif src.is_bool or src.unsigned:
+            return builder.zext(value, lty, name)
+        return builder.sext(value, lty, name)
+    elif (src.is_int or src.is_bool) and dst.is_real:
+        if src.is_bool or src.unsigned:
+            return builder.uitofp(value, lty, name)
+        return builder.sitofp(value, lty, name)
+    elif src.is_real and dst.is_int:
+        if dst.unsigned:
+            return builder.fptoui(value, lty, name)
+        return builder.fptosi(value, lty, name)
+    elif src.is_real and dst.is_real:
+        if dst.bits < src.bits:
+            return builder.fptrunc(value, lty, name)
+        return builder.fpext(value, lty, name)
+    elif src.is_pointer and dst.is_pointer:
+        return builder.bitcast(value, lty, name)
+    elif src.is_pointer and dst.is_int:
+        return builder.ptrtoint(value, lty, name)
+    elif src.is_int and dst.is_pointer:
+        return builder.inttoptr(value, lty, name)
+    raise TypeError("Cannot convert %s to %s" % (src, dst))
+
+#===------------------------------------------------------------------===
+# Zero-cost exceptions
+#===------------------------------------------------------------------===
+
+# Exceptions unwind with the Itanium C++ ABI: exc_unwind throws a void*
+# which landing pads catch regardless of its type. Which pykit exception is
+# raised is not part of the unwinding (see pykit.lower.lower_errcheck).
+
+void_p = i8.as_pointer()
+landingpad_type = ir.LiteralStructType([void_p, i32])
+
+def runtime_function(llvm_module, name, restype, argtypes, var_arg=False):
+    """Declare a C++ runtime function in `llvm_module`, once"""
+    lfunc = llvm_module.globals.get(name)
+    if lfunc is None:
+        lfunc_type = ir.FunctionType(restype, argtypes, var_arg=var_arg)
+        lfunc = ir.Function(llvm_module, lfunc_type, name)
+    return lfunc
+
+def set_personality(lfunc):
+    """Set the personality for the landing pads of `lfunc`"""
+    lfunc.attributes.personality = runtime_function(
+        lfunc.module, '__gxx_personality_v0', i32, [], var_arg=True)
+    # llvmlite drops the personality of functions without attributes
+    lfunc.attributes.add('uwtable')
+
+def unwinder(llvm_module):
+    """Cold function throwing an exception, defined once per module"""
+    lfunc = llvm_module.globals.get('pykit.unwind')
+    if lfunc is not None:
+        return lfunc
+
+    lfunc = ir.Function(llvm_module, ir.FunctionType(ir.VoidType(), []),
+                        'pykit.unwind')
+    lfunc.linkage = 'internal'
+    for attr in ('cold', 'noinline', 'noreturn'):
+        lfunc.attributes.add(attr)
+
+    allocate = runtime_function(llvm_module, '__cxa_allocate_exception',
+                                void_p, [i64])
+    throw = runtime_function(llvm_module, '__cxa_throw', ir.VoidType(),
+                             [void_p, void_p, void_p])
+    typeinfo = llvm_module.globals.get('_ZTIPv')
+    if typeinfo is None:
+        typeinfo = ir.GlobalVariable(llvm_module, void_p, '_ZTIPv')
+        typeinfo.global_constant = True
+
+    builder = ir.IRBuilder(lfunc.append_basic_block('entry'))
+    exc = builder.call(allocate, [ir.Constant(i64, 8)])
+    builder.store(ir.Constant(void_p, None),
+                  builder.bitcast(exc, void_p.as_pointer()))
+    builder.call(throw, [exc, builder.bitcast(typeinfo, void_p),
+                         ir.Constant(void_p, None)])
+    builder.unreachable()
+    return lfunc
+
+def catch_all(builder, llvm_module):
+    """Emit a landing pad catching any exception"""
+    lp = builder.landingpad(landingpad_type)
+    lp.add_clause(ir.CatchClause(ir.Constant(void_p, None)))
+    begin = runtime_function(llvm_module, '__cxa_begin_catch', void_p, [void_p])
+    end = runtime_function(llvm_module, '__cxa_end_catch', ir.VoidType(), [])
+    builder.call(begin, [builder.extract_value(lp, 0)])
+    builder.call(end, [])
+
+def entry_point(llvm_module, lfunc):
+    """
+    Define `<name>.entry`, calling `lfunc` and stopping any exception
+    unwinding out of it. The result is zero if an exception was raised,
+    like the undefined result of the error return convention.
+    """
+    entry = ir.Function(llvm_module, lfunc.function_type, lfunc.name + '.entry')
+    set_personality(entry)
+    builder = ir.IRBuilder(entry.append_basic_block('entry'))
+    normal = entry.append_basic_block('normal')
+    unwind = entry.append_basic_block('unwind')
+    result = builder.invoke(lfunc, entry.args, normal, unwind)
+
+    restype = lfunc.function_type.return_type
+    def ret(value):
+        if isinstance(restype, ir.VoidType):
+            builder.ret_void()
+        else:
+            builder.ret(value)
+
+    builder.position_at_end(normal)
+    ret(result)
+    builder.position_at_end(unwind)
+    catch_all(builder, llvm_module)
+    ret(ir.Constant(restype, None))
+    return entry
+
+#===------------------------------------------------------------------===
+# Translator
+#===------------------------------------------------------------------===
+
+class Translator(object):
+    """
+    Translate a function in low-level form.
+    This means it can only use values of type Bool, Int, Float, Struct or
+    Pointer. Values of type Function may be called.
+    """
+
+    def __init__(self, func, env, lfunc, llvm_typer, llvm_module,
+                 blockmap=None):
+        self.func = func
+        self.env = env
+        self.lfunc = lfunc
+        self.llvm_type = llvm_typer
+        self.lmod = llvm_module
+        self.builder = None
+        self.phis = [] # [pykit_phi]
+        self.blockmap = blockmap
+        self.landingpads = set(blockmap[block]
+                                   for block in landingpads(func))
+        self.exits = {} # { pykit block : llvm block ending it }
+
+    def blockswitch(self, newblock):
+        if not self.builder:
+            self.builder = ir.IRBuilder(newblock)
+        self.builder.position_at_end(newblock)
+        if newblock in self.landingpads:
+            catch_all(self.builder, self.lmod)
+
+    # __________________________________________________________________
+
+    def op_arg(self, arg):
+        return self.lfunc.args[self.func.args.index(arg)]
+
+    # __________________________________________________________________
+
+    def op_unary(self, op, arg):
+        opmap = { Boolean: unary_bool,
+                  Integral: unary_int,
+                  Real: unary_float }[type(op.type)]
+        unop = defs.unary_opcodes[op.opcode]
+        return opmap[unop](self.builder, arg)
+
+    def op_binary(self, op, left, right):
+        binop = defs.binary_opcodes[op.opcode]
+        if op.type.is_int:
+            genop = binop_int[binop][op.type.unsigned]
+        else:
+            genop = binop_float[binop]
+        return genop(self.builder, left, right, op.result)
+
+    def op_compare(self, op, left, right):
+        cmpop = defs.compare_opcodes[op.opcode]
+        type = op.args[0].type
+        if type.is_int and type.unsigned:
+            cmp = self.builder.icmp_unsigned
+        elif type.is_int or type.is_bool:
+            cmp = self.builder.icmp_signed
+        else:
+            cmp = self.builder.fcmp_ordered
+
+        return cmp(cmpop, left, right, op.result)
+
+    # __________________________________________________________________
+
+    def op_convert(self, op, arg):
+        return cast(self.builder, arg, op.args[0].type, op.type, op.result)
+
+    # __________________________________________________________________
+
+    def op_call(self, op, function, args):
+        if isinstance(function, ir.Value):
+            # External functions (see load_GlobalValue) and pointers
+            return self.call(op, function, args)
+        elif self.env["codegen.lazy"]:
+            return self.lazy_call(op, function, args)
+
+        # Get the callee LLVM function from the cache. This is put there by
+        # pykit.codegen.codegen. Callees compiled in an earlier module are
+        # declared in this one and resolved by the engine.
+        cache = self.env["codegen.cache"]
+        lfunc = declare(self.lmod, cache[function])
+        return self.call(op, lfunc, args)
+
+    def lazy_call(self, op, function, args):
+        """Call through the function pointer slot of `function`"""
+        slot = lazy.slot(function, self.env)
+        fptr_type = self.llvm_type(Pointer(function.type))
+        cell = self.builder.inttoptr(ir.Constant(i64, slot.address),
+                                     fptr_type.as_pointer())
+        return self.call(op, self.builder.load(cell), args)
+
+    def call(self, op, callee, args):
+        """Call `callee`, or invoke it if it may unwind to a landing pad"""
+        landingpad = op.metadata and op.metadata.get('exc.landingpad')
+        if not landingpad:
+            return self.builder.call(callee, args)
+
+        normal = self.lfunc.append_basic_block('invoke.cont')
+        result = self.builder.invoke(callee, args, normal,
+                                     self.blockmap[landingpad])
+        self.builder.position_at_end(normal)
+        self.exits[op.block] = normal
+        return result
+
+    def op_call_math(self, op, name, args):
+        # LLVM intrinsics where they exist, libm resolved by the engine
+        # otherwise. Declared once per module.
+        if name == 'Abs' and op.type.is_int:
+            return self.int_abs(op, *args)
+
+        argtypes = [arg.type for arg in op.args[1]]
+        lfunc_type = self.llvm_type(Function(op.type, argtypes))
+        intrinsic = mathlib.intrinsic(name, op.type)
+        if intrinsic is not None:
+            fname = '%s.%s' % (intrinsic, mathlib.type_suffix(op.type))
+        else:
+            fname = libm_names.get(name, name.lower())
+            if op.type == Float32:
+                fname += 'f'
+        lfunc = self.lmod.globals.get(fname)
+        if lfunc is None:
+            lfunc = ir.Function(self.lmod, lfunc_type, fname)
+        return self.builder.call(lfunc, args, op.result)
+
+    def int_abs(self, op, x):
+        """Integer absolute value, select(x < 0, -x, x)"""
+        if op.type.unsigned:
+            return x
+        negative = self.builder.icmp_signed('<', x, ir.Constant(x.type, 0))
+        return self.builder.select(negative, self.builder.neg(x), x, op.result)
+
+    # __________________________________________________________________
+
+    def op_getfield(self, op, struct, attr):
+        struct_type = op.args[0].type
+        index = struct_type.names.index(attr)
+        return self.builder.extract_value(struct, index, op.result)
+
+    def op_setfield(self, op, struct, attr, value):
+        struct_type = op.args[0].type
+        index = struct_type.names.index(attr)
+        return self.builder.insert_value(struct, value, index, op.result)
+
+    # __________________________________________________________________
+
+    def op_getindex(self, op, array, indices):
+        return self.builder.gep(array, indices, name=op.result)
+
+    def op_setindex(self, op, array, indices, value):
+        ptr = self.builder.gep(array, indices)
+        self.builder.store(value, ptr)
+
+    # __________________________________________________________________
+
+    def op_alloca(self, op):
+        return self.builder.alloca(self.llvm_type(op.type.base),
+                                   name=op.result)
+
+    def op_load(self, op, stackvar):
+        return self.builder.load(stackvar, op.result)
+
+    def op_store(self, op, value, stackvar):
+        self.builder.store(value, stackvar)
+
+    # __________________________________________________________________
+
+    def op_jump(self, op, block):
+        self.builder.branch(block)
+
+    def op_cbranch(self, op, test, true_block, false_block):
+        branch = self.builder.cbranch(test, true_block, false_block)
+        if op.metadata and op.metadata.get('exc.cold'):
+            branch.set_weights([1, 2000])
+
+    def op_phi(self, op):
+        phi = self.builder.phi(self.llvm_type(op.type), op.result)
+        self.phis.append(op)
+        return phi
+
+    def op_ret(self, op, value):
+        if value is None:
+            assert self.func.type.restype.is_void
+            self.builder.ret_void()
+        else:
+            self.builder.ret(value)
+
+    # __________________________________________________________________
+
+    def op_sizeof(self, op, expr):
+        int_type = self.llvm_type(op.type)
+        return sizeof(self.builder, expr.type, int_type)
+
+    def op_addressof(self, op, func):
+        assert func.address
+        addr = ir.Constant(i64, func.address)
+        return self.builder.inttoptr(addr, self.llvm_type(Pointer(func.type)))
+
+    # __________________________________________________________________
+
+    def op_ptradd(self, op, ptr, val):
+        return self.builder.gep(ptr, [val], name=op.result)
+
+    def op_ptrload(self, op, ptr):
+        return self.builder.load(ptr, op.result)
+
+    def op_ptrstore(self, op, ptr, val):
+        return self.builder.store(val, ptr)
+
+    def op_ptrcast(self, op, val):
+        return self.builder.bitcast(val, self.llvm_type(op.type), op.result)
+
+    def op_ptr_isnull(self, op, val):
+        intval = self.builder.ptrtoint(val, self.llvm_type(Int64))
+        return self.builder.icmp_unsigned('==', intval,
+                                          ir.Constant(intval.type, 0),
+                                          op.result)
+
+    def op_ptrfield(self, op, ptr, attr):
+        index = op.args[0].type.base.names.index(attr)
+        return self.builder.gep(ptr, [ir.Constant(i32, 0),
+                                      ir.Constant(i32, index)],
+                                inbounds=True, name=op.result)
+
+    # __________________________________________________________________
+
+    def op_exc_setup(self, op, handlers):
+        pass # handlers are reached through invoke, see call()
+
+    def op_exc_catch(self, op, types):
+        pass
+
+    def op_exc_unwind(self, op):
+        self.builder.call(unwinder(self.lmod), [])
+        self.builder.unreachable()
+
+    # __________________________________________________________________
+
+
+def declare(llvm_module, lfunc):
+    """Get `lfunc` or a declaration of it in `llvm_module`"""
+    if lfunc.module is llvm_module:
+        return lfunc
+    decl = llvm_module.globals.get(lfunc.name)
+    if decl is None:
+        decl = ir.Function(llvm_module, lfunc.function_type, lfunc.name)
+    return decl
+
+def landingpads(func):
+    """The landing pads of the invokes in `func` (see Translator.call)"""
+    return [op.metadata['exc.landingpad'] for op in func.ops
+                if op.metadata and 'exc.landingpad' in op.metadata]
+
+def allocate_blocks(llvm_func, pykit_func):
+    """Return a dict mapping pykit blocks to llvm blocks"""
+    blocks = {}
+    for block in pykit_func.blocks:
+        blocks[block] = llvm_func.append_basic_block(block.name)
+
+    return blocks
+
+def update_phis(phis, valuemap, argloader, exits={}):
+    """
+    Update LLVM phi values given a list of pykit phi values and block and
+    value dicts mapping pykit values to LLVM values. `exits` maps pykit
+    blocks split during translation to the LLVM block ending them.
+    """
+    for phi in phis:
+        llvm_phi = valuemap[phi.result]
+        llvm_blocks = [exits.get(block) or argloader.load_op(block)
+                           for block in phi.args[0]]
+        llvm_values = map(argloader.load_op, phi.args[1])
+        for llvm_block, llvm_value in zip(llvm_blocks, llvm_values):
+            llvm_phi.add_incoming(llvm_value, llvm_block)
+
+
+#===------------------------------------------------------------------===
+# Argument loading
+#===------------------------------------------------------------------===
+
+class LLVMArgLoader(ArgLoader):
+    """
+    Load Operation arguments as LLVM values passed and extra *args to the
+    Translator.
+    """
+
+    def __init__(self, store, llvm_module, lfunc, blockmap):
+        super(LLVMArgLoader, self).__init__(store)
+        self.llvm_module = llvm_module
+        self.lfunc = lfunc
+        self.blockmap = blockmap
+
+    def load_GlobalValue(self, arg):
+        if arg.external:
+            value = self.llvm_module.globals.get(arg.name)
+            if value is None:
+                value = ir.Function(self.llvm_module, llvm_type(arg.type),
+                                    arg.name)
+            if arg.address:
+                llvm.add_symbol(arg.name, arg.address)
+        else:
+            assert arg.value
+            value = arg.value.const
+
+        return value
+
+    def load_Block(self, arg):
+        return self.blockmap[arg]
+
+    def load_Constant(self, arg):
+        return make_constant(arg.const, arg.type)
+
+    def load_Undef(self, arg):
+        return ir.Constant(llvm_type(arg.type), ir.Undefined)
+
+
+def make_constant(value, ty):
+    lty = llvm_type(ty)
+
+    if type(ty) == Pointer:
+        if value == 0:
+            return ir.Constant(lty, None)
+        elif isinstance(value, int):
+            return ir.Constant(i64, value).inttoptr(lty)
+        else:
+            raise ValueError(
+                "Cannot create constant pointer to value '%s'" % (value,))
+    elif type(ty) in (Integral, Real, Boolean):
+        return ir.Constant(lty, value)
+    elif type(ty) == Struct:
+        return ir.Constant(lty, [make_constant(c.const, c.type)
+                                     for c in value.values])
+    else:
+        raise NotImplementedError("Constants for", type(ty))
+
+#===------------------------------------------------------------------===
+# Entry points
+#===------------------------------------------------------------------===
+
+mangle = make_temper()
+
+def initialize(func, env):
+    verify_lowlevel(func)
+    llvm_module = env["codegen.llvmlite.module"]
+    lfunc = ir.Function(llvm_module, llvm_type(func.type), mangle(func.name))
+    if env["codegen.llvmlite.perf"]:
+        env["codegen.llvmlite.perf"].add_name(lfunc.name, func.name)
+    return lfunc
+
+def translate(func, env, lfunc):
+    if lfunc.blocks:
+        return lfunc # translated by an earlier compilation
+
+    llvm_module = env["codegen.llvmlite.module"]
+    blockmap = allocate_blocks(lfunc, func)
+    if landingpads(func):
+        set_personality(lfunc)
+        load_cxx_runtime()
+
+    ### Create visitor ###
+    translator = Translator(func, env, lfunc, llvm_type, llvm_module,
+                            blockmap)
+    visitor = opgrouper(translator)
+
+    ### Codegen ###
+    argloader = LLVMArgLoader(None, llvm_module, lfunc, blockmap)
+    valuemap = vvisit(visitor, func, argloader)
+    update_phis(translator.phis, valuemap, argloader, translator.exits)
+
+    # Exceptions must not unwind into callers from Python
+    if env["lower.exceptions"] == "zerocost":
+        load_cxx_runtime()
+        entries = env["codegen.llvmlite.entries"]
+        entries[lfunc.name] = entry_point(llvm_module, lfunc).name
+
+    return lfunc
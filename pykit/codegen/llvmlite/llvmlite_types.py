@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+Map pykit types to llvmlite IR types and ctypes types.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+
+from pykit.types import (Boolean, Integral, Float32, Float64, Struct, Pointer,
+                         Function, VoidT)
+
+from llvmlite import ir
+
+def llvm_type(type):
+    ty = type.__class__
+    if ty == Boolean:
+        return ir.IntType(1)
+    elif ty == Integral:
+        return ir.IntType(type.bits)
+    elif type == Float32:
+        return ir.FloatType()
+    elif type == Float64:
+        return ir.DoubleType()
+    elif ty == Struct:
+        return ir.LiteralStructType([llvm_type(ftype) for ftype in type.types])
+    elif ty == Pointer:
+        if type.base.is_void:
+            return ir.IntType(8).as_pointer()
+        return llvm_type(type.base).as_pointer()
+    elif ty == Function:
+        return ir.FunctionType(llvm_type(type.restype),
+                               [llvm_type(argtype) for argtype in type.argtypes])
+    elif ty == VoidT:
+        return ir.VoidType()
+    else:
+        raise TypeError("Cannot convert type %s" % (type,))
+
+# ______________________________________________________________________
+
+_ctypes_ints = {
+    8: ctypes.c_int8, 16: ctypes.c_int16, 32: ctypes.c_int32, 64: ctypes.c_int64,
+}
+
+_ctypes_structs = {} # { LiteralStructType : ctypes.Structure }
+
+def ctype(llvm_type):
+    """Get the ctypes type for an llvmlite IR type"""
+    if isinstance(llvm_type, ir.IntType):
+        if llvm_type.width == 1:
+            return ctypes.c_bool
+        return _ctypes_ints[llvm_type.width]
+    elif isinstance(llvm_type, ir.FloatType):
+        return ctypes.c_float
+    elif isinstance(llvm_type, ir.DoubleType):
+        return ctypes.c_double
+    elif isinstance(llvm_type, ir.LiteralStructType):
+        if llvm_type not in _ctypes_structs:
+            fields = [('f%d' % i, ctype(t))
+                          for i, t in enumerate(llvm_type.elements)]
+            _ctypes_structs[llvm_type] = type(str('Struct'), (ctypes.Structure,),
+                                              {'_fields_': fields})
+        return _ctypes_structs[llvm_type]
+    elif isinstance(llvm_type, ir.PointerType):
+        pointee = llvm_type.pointee
+        if isinstance(pointee, ir.FunctionType) or pointee == ir.IntType(8):
+            return ctypes.c_void_p
+        return ctypes.POINTER(ctype(pointee))
+    elif isinstance(llvm_type, ir.FunctionType):
+        return ctypes.CFUNCTYPE(ctype(llvm_type.return_type),
+                                *map(ctype, llvm_type.args))
+    elif isinstance(llvm_type, ir.VoidType):
+        return None
+    else:
+        raise TypeError("Cannot convert type %s" % (llvm_type,))
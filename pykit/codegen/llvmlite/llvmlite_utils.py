@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""
+llvmlite utilities: target machines, MCJIT engines and the new pass manager.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+import ctypes.util
+
+from .llvmlite_types import ctype
+
+from llvmlite import ir
+import llvmlite.binding as llvm
+
+# ______________________________________________________________________
+
+_initialized = []
+
+def initialize():
+    """Initialize the native target, once"""
+    if not _initialized:
+        llvm.initialize_native_target()
+        llvm.initialize_native_asmprinter()
+        _initialized.append(True)
+
+def target_machine(opt=3, cpu='', features='', jit=True):
+    """
+    Target machine for the host triple. Machines for ahead-of-time
+    compilation (jit=False) generate position independent code.
+    """
+    initialize()
+    target = llvm.Target.from_default_triple()
+    if jit:
+        return target.create_target_machine(cpu=cpu, features=features,
+                                            opt=opt, jit=True)
+    return target.create_target_machine(cpu=cpu, features=features, opt=opt,
+                                        reloc='pic', codemodel='default')
+
+def module(name, target_machine):
+    """Create a new llvmlite IR module for the target machine"""
+    llvm_module = ir.Module(name=name)
+    llvm_module.triple = target_machine.triple
+    llvm_module.data_layout = str(target_machine.target_data)
+    return llvm_module
+
+def execution_engine(target_machine):
+    """Create an MCJIT engine. Modules are added with `add_module`."""
+    initialize()
+    return llvm.create_mcjit_compiler(llvm.parse_assembly(""), target_machine)
+
+def parse(llvm_module):
+    """Parse an llvmlite IR module into an LLVM module"""
+    return llvm.parse_assembly(str(llvm_module))
+
+def verify(llvm_module):
+    parse(llvm_module).verify()
+
+def optimize(module_ref, target_machine, opt=3, inline=1000):
+    """Optimize a parsed module with the new pass manager"""
+    pto = llvm.create_pipeline_tuning_options(speed_level=opt)
+    pto.inlining_threshold = inline
+    pto.loop_vectorization = opt >= 2
+    pto.slp_vectorization = opt >= 2
+    pb = llvm.create_pass_builder(target_machine, pto)
+    pm = pb.getModulePassManager()
+    pm.run(module_ref, pb)
+
+def add_module(engine, module_ref):
+    """Compile a parsed module to machine code"""
+    engine.add_module(module_ref)
+    engine.finalize_object()
+    engine.run_static_constructors()
+
+def load_cxx_runtime():
+    """Make the C++ runtime (for unwinding) available to engines, once"""
+    if not _cxx_runtime:
+        llvm.load_library_permanently(ctypes.util.find_library('stdc++'))
+        _cxx_runtime.append(True)
+
+_cxx_runtime = []
+
+def pointer_to_func(engine, lfunc, name=None):
+    """ctypes function of `lfunc`, or of function `name` of the same type"""
+    addr = engine.get_function_address(name or lfunc.name)
+    return ctypes.cast(addr, ctype(lfunc.function_type))
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parallel compilation. The functions to compile (and everything they call)
+are partitioned along the clusters of the call graph, and every partition
+is translated, optimized and emitted to an object in a separate worker
+process:
+
+    objects, symbols = parallel.emit_objects([f, g, h], env, jobs=4)
+
+Mutually recursive functions are kept in the same partition, and so are
+callees with a single caller, up to a size bound, so they can still be
+inlined. Callees shared by several callers (e.g. a small helper) are not
+merged with any of them: they are compiled once, and the other partitions
+only declare them. Clusters are distributed over the partitions by their
+number of operations. The objects are linked into a shared library by
+aot.compile(..., jobs=4), or into the execution engine of `env` by
+load_objects().
+
+All functions are declared in the module of `env` before the workers are
+forked, so every worker uses the same symbol names and calls between
+partitions are resolved by the linker. Without fork(), or when there is
+only one cluster, everything is emitted into one object in-process.
+"""
+
+from __future__ import print_function, division, absolute_import
+import os
+import multiprocessing
+
+from pykit import pipeline
+from pykit.analysis import callgraph
+from . import llvmlite_codegen, llvmlite_utils
+
+import networkx as nx
+import llvmlite.binding as llvm
+
+#===------------------------------------------------------------------===
+# Partitioning
+#===------------------------------------------------------------------===
+
+def call_graph(funcs):
+    """Call graph of `funcs` and their (transitive) callees"""
+    graph, seen = nx.DiGraph(), set()
+    for func in funcs:
+        callgraph.callgraph(func, graph, seen)
+    return graph
+
+# Clusters smaller than this (in operations) are not worth splitting
+min_size = 200
+
+def weight(cluster):
+    return sum(len(list(func.ops)) for func in cluster)
+
+def clusters(graph, size):
+    """
+    Group the strongly connected components of the call graph into
+    clusters ([Function]) of at most `size` operations. A component is
+    merged with its caller only if it has a single caller.
+    """
+    components = list(nx.strongly_connected_components(graph))
+    component = dict((func, i) for i, funcs in enumerate(components)
+                                   for func in funcs)
+    dag = nx.DiGraph()
+    dag.add_nodes_from(range(len(components)))
+    dag.add_edges_from((component[caller], component[callee])
+                           for caller, callee in graph.edges()
+                               if component[caller] != component[callee])
+
+    members = dict((i, set(funcs)) for i, funcs in enumerate(components))
+    sizes = dict((i, weight(funcs)) for i, funcs in enumerate(components))
+    leader = dict((i, i) for i in dag)
+
+    def find(node):
+        while leader[node] != node:
+            node = leader[node]
+        return node
+
+    # Callees first, so that chains are merged bottom-up
+    for node in reversed(list(nx.topological_sort(dag))):
+        callers = list(dag.predecessors(node))
+        if len(callers) != 1:
+            continue
+        caller, callee = find(callers[0]), find(node)
+        if sizes[caller] + sizes[callee] <= size:
+            members[caller] |= members.pop(callee)
+            sizes[caller] += sizes.pop(callee)
+            leader[callee] = caller
+
+    return [sorted(cluster, key=lambda func: func.name)
+                for cluster in members.values()]
+
+def partition(graph, jobs, size=None):
+    """
+    Distribute the functions of the call graph over at most `jobs`
+    partitions ([[Function]]). Clusters (see `clusters`) are bounded by
+    `size` operations, by default an even share of the work (but at least
+    `min_size`).
+    """
+    if size is None:
+        size = max(weight(graph) // jobs, min_size)
+    groups = clusters(graph, size)
+    groups.sort(key=lambda cluster: (-weight(cluster), cluster[0].name))
+
+    partitions = [[] for i in range(min(jobs, len(groups)))]
+    loads = [0] * len(partitions)
+    for cluster in groups:
+        i = loads.index(min(loads))
+        partitions[i].extend(cluster)
+        loads[i] += weight(cluster)
+    return partitions
+
+#===------------------------------------------------------------------===
+# Compilation
+#===------------------------------------------------------------------===
+
+_work = None # (env, partitions), inherited by the forked workers
+
+def prepare(graph, env):
+    """
+    Run the codegen pipeline up to code generation and declare all
+    functions in the module of `env`. Returns { Function : symbol }.
+    """
+    cache = env["codegen.cache"]
+    passes = [p for p in env["pipeline.codegen"]
+                  if p not in ("passes.codegen", "passes.llvmlite.ctypes")]
+    zerocost = env["lower.exceptions"] == "zerocost"
+
+    symbols = {}
+    for func in graph:
+        pipeline.run(func, env, passes)
+        if func not in cache:
+            cache[func] = llvmlite_codegen.initialize(func, env)
+        lfunc = cache[func]
+        symbols[func] = lfunc.name
+
+        # Done by translate() in the workers, so repeat it here
+        if zerocost and not lfunc.blocks:
+            env["codegen.llvmlite.entries"][lfunc.name] = lfunc.name + '.entry'
+        if zerocost or llvmlite_codegen.landingpads(func):
+            llvmlite_utils.load_cxx_runtime()
+
+    return symbols
+
+def emit_partition(funcs, env):
+    """Translate `funcs` into the module of `env`, return the object code"""
+    cache = env["codegen.cache"]
+    for func in funcs:
+        llvmlite_codegen.translate(func, env, cache[func])
+
+    machine = env["codegen.llvmlite.machine"]
+    module_ref = llvmlite_utils.parse(env["codegen.llvmlite.module"])
+    module_ref.verify()
+    llvmlite_utils.optimize(module_ref, machine, env["codegen.llvmlite.opt"])
+    return machine.emit_object(module_ref)
+
+def _emit(i):
+    env, partitions = _work
+    return emit_partition(partitions[i], env)
+
+def fork_pool(processes):
+    """A pool of forked worker processes, or None if fork() is unavailable"""
+    if not hasattr(os, 'fork'):
+        return None
+    try:
+        context = multiprocessing.get_context('fork')
+    except AttributeError:
+        context = multiprocessing # Python 2 always forks on posix
+    return context.Pool(processes)
+
+def emit_objects(funcs, env, jobs=None):
+    """
+    Compile `funcs` and their callees in low-level form to objects in
+    `jobs` worker processes (the number of CPUs by default). Returns
+    ([object code], { Function : symbol }).
+    """
+    global _work
+    from pykit.codegen import llvmlite as codegen
+
+    graph = call_graph(funcs)
+    symbols = prepare(graph, env)
+    partitions = partition(graph, jobs or multiprocessing.cpu_count())
+
+    _work = (env, partitions) # set before the workers are forked
+    try:
+        pool = fork_pool(len(partitions)) if len(partitions) > 1 else None
+        if pool is None:
+            objects = [emit_partition(list(graph), env)]
+        else:
+            try:
+                objects = pool.map(_emit, range(len(partitions)))
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        _work = None
+
+    # The functions are defined in the objects, start over with a new module
+    env["codegen.llvmlite.module"] = codegen.new_module(env)
+    return objects, symbols
+
+def load_objects(objects, env):
+    """Add compiled objects to the execution engine of `env`"""
+    engine = env["codegen.llvmlite.engine"]
+    for obj in objects:
+        engine.add_object_file(llvm.ObjectFileRef.from_data(obj))
+    engine.finalize_object()
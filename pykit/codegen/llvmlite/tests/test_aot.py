@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+
+from pykit import types
+from pykit.ir import Function, Builder
+
+try:
+    from pykit.codegen.llvmlite import aot
+except ImportError:
+    aot = None
+
+I = types.Int32
+
+def make_add():
+    func = Function("add", ['x', 'y'], types.Function(I, [I, I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    b.ret(b.add(I, func.args))
+    return func
+
+@unittest.skipIf(aot is None, "llvmlite is not installed")
+class TestAOT(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_object(self):
+        manifest = aot.compile([make_add()], os.path.join(self.dir, 'add.o'))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, 'add.o')))
+        with open(manifest) as f:
+            sig = json.load(f)['functions']['add']
+        self.assertEqual(sig['argtypes'], ['int32', 'int32'])
+        self.assertEqual(sig['restype'], 'int32')
+
+    @unittest.skipIf(not which('cc'), "no C compiler")
+    def test_shared_library(self):
+        output = os.path.join(self.dir, 'libadd.so')
+        aot.compile([make_add()], output, write_loader=True)
+
+        # Load in a fresh process, without pykit
+        script = ("import sys, aotloader\n"
+                  "lib = aotloader.load('libadd.json')\n"
+                  "assert 'pykit' not in sys.modules\n"
+                  "print(lib.add(2, 3))\n")
+        out = subprocess.check_output([sys.executable, '-c', script],
+                                      cwd=self.dir)
+        self.assertEqual(out.strip(), b'5')
+
+    @unittest.skipIf(not which('cc'), "no C compiler")
+    def test_parallel(self):
+        add2 = make_add()
+        add2.name = "add2"
+        output = os.path.join(self.dir, 'libops.so')
+        aot.compile([make_add(), add2], output, write_loader=True, jobs=2)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['aotloader.py', 'libops.json', 'libops.so'])
+
+        script = ("import aotloader\n"
+                  "lib = aotloader.load('libops.json')\n"
+                  "print(lib.add(2, 3) + lib.add2(4, 5))\n")
+        out = subprocess.check_output([sys.executable, '-c', script],
+                                      cwd=self.dir)
+        self.assertEqual(out.strip(), b'14')
+
+
+if __name__ == '__main__':
+    unittest.main()
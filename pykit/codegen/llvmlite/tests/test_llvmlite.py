@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import math
+import unittest
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const, opcodes
+from pykit.tests import build_loop, build_caller, build_math, square
+
+try:
+    from pykit.codegen import llvmlite as codegen
+except ImportError:
+    codegen = None
+
+I = types.Int32
+
+def make_abs(type):
+    """abs(x)"""
+    func = Function("abs", ['x'], types.Function(type, [type]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    b.ret(b.call_math(type, ['Abs', func.args]))
+    return func
+
+def make_raising():
+    """g(x) raises when x == 7, f(x) = g(x) * 2"""
+    g = Function("g", ['x'], types.Function(I, [I]))
+    b = Builder(g)
+    b.position_at_end(g.new_block("entry"))
+    x, = g.args
+    b.check_error(x, Const(7, I))
+    b.ret(b.add(I, [x, Const(1, I)]))
+
+    f = Function("f", ['x'], types.Function(I, [I]))
+    b = Builder(f)
+    b.position_at_end(f.new_block("entry"))
+    result = b.call(I, [g, f.args])
+    b.check_error(result, Const(-1, I))
+    b.ret(b.mul(I, [result, Const(2, I)]))
+    return f, g
+
+def make_invoke(callee):
+    """callee(x), or -1 if it raised (a lowered try/except)"""
+    func = Function("invoker", ['x'], types.Function(I, [I]))
+    entry, landingpad, exit = [func.new_block(name) for name in
+                                   ('entry', 'landingpad', 'exit')]
+    b = Builder(func)
+    with b.at_end(entry):
+        result = b.call(I, [callee, func.args])
+        result.add_metadata({'exc.landingpad': landingpad})
+        b.jump(exit)
+    with b.at_end(landingpad):
+        b.jump(exit)
+    with b.at_end(exit):
+        b.ret(b.phi(I, [[entry, landingpad], [result, Const(-1, I)]]))
+    return func
+
+def make_fields():
+    """s.a = x; s.b = s.a * 2; return s.b"""
+    S = types.Struct(['a', 'b'], [I, I])
+    func = Function("fields", ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    s = b.alloca(types.Pointer(S), [])
+    b.setfield(s, 'a', func.args[0])
+    b.setfield(s, 'b', b.mul(I, [b.getfield(I, [s, 'a']), Const(2, I)]))
+    b.ret(b.getfield(I, [s, 'b']))
+    return func
+
+@unittest.skipIf(codegen is None, "llvmlite is not installed")
+class TestLLVMLiteCodegen(unittest.TestCase):
+
+    def setUp(self):
+        self.env = environment.fresh_env()
+        self.env["codegen.cache"] = {}
+        codegen.install(self.env)
+
+    def compile(self, func):
+        lfunc, env = pipeline.codegen(func, self.env)
+        codegen.verify(lfunc, env)
+        codegen.optimize(lfunc, env)
+        return lfunc
+
+    def test_loop(self):
+        func, _, _ = build_loop(square, name="sum")
+        lfunc = self.compile(func)
+        self.assertEqual(codegen.execute(lfunc, self.env, 10), 285)
+        self.assertEqual(self.env["codegen.llvmlite.ctypes"](4), 14)
+
+    def test_call_across_modules(self):
+        callee, _, _ = build_loop(square, name="sum")
+        self.compile(callee)
+        lfunc = self.compile(build_caller(callee))
+        self.assertAlmostEqual(codegen.execute(lfunc, self.env, 10.0),
+                               285 + math.sin(10.0))
+
+    def test_math(self):
+        from pykit.codegen import codegen as codegen_pass
+        func = build_math()
+        codegen_pass.run(func, self.env)
+        ir = str(self.env["codegen.llvmlite.module"])
+        self.assertIn('declare double @"llvm.sqrt.f64"(double', ir)
+        self.assertIn('declare double @"llvm.pow.f64"(double', ir)
+        self.assertIn('declare double @"atan"(double', ir)
+
+        lfunc = self.compile(func)
+        self.assertAlmostEqual(codegen.execute(lfunc, self.env, 2.0),
+                               math.sqrt(2.0) + math.atan(2.0) + 4.0)
+
+    def test_int_abs(self):
+        lfunc = self.compile(make_abs(I))
+        self.assertNotIn('fabs', str(self.env["codegen.llvmlite.module"]))
+        for x in (-5, 0, 7):
+            self.assertEqual(codegen.execute(lfunc, self.env, x), abs(x))
+
+    def test_fields(self):
+        func = make_fields()
+        pipeline.lower(func, self.env)
+        self.assertNotIn('load', opcodes(func))
+        lfunc, env = pipeline.codegen(func, self.env)
+        self.assertIn('getelementptr inbounds', str(lfunc))
+        codegen.verify(lfunc, env)
+        codegen.optimize(lfunc, env)
+        self.assertEqual(codegen.execute(lfunc, self.env, 4), 8)
+
+    def test_zerocost_exceptions(self):
+        self.env["lower.exceptions"] = "zerocost"
+        f, g = make_raising()
+        pipeline.lower(g, self.env)
+        pipeline.lower(f, self.env)
+        self.assertEqual(opcodes(f), ['call', 'mul', 'ret'])
+        lfunc = self.compile(f)
+        self.assertEqual(codegen.execute(lfunc, self.env, 3), 8)
+        # Unwinding stops at the entry point called from Python
+        self.assertEqual(codegen.execute(lfunc, self.env, 7), 0)
+
+        lfunc = self.compile(make_invoke(f))
+        self.assertEqual(codegen.execute(lfunc, self.env, 3), 8)
+        self.assertEqual(codegen.execute(lfunc, self.env, 7), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
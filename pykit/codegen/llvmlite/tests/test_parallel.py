@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import environment, types
+from pykit.ir import Function, Builder, Const
+
+try:
+    from pykit.codegen import llvmlite as codegen
+    from pykit.codegen.llvmlite import parallel
+except ImportError:
+    codegen = None
+
+I = types.Int32
+
+def make_function(name, k, callee=None):
+    """f(x) = x * k [+ callee(x)]"""
+    func = Function(name, ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    x, = func.args
+    result = b.mul(I, [x, Const(k, I)])
+    if callee is not None:
+        result = b.add(I, [result, b.call(I, [callee, [x]])])
+    b.ret(result)
+    return func
+
+def make_functions():
+    h = make_function("h", 3)
+    g = make_function("g", 2, h)
+    return [make_function("f%d" % i, i) for i in range(4)] + [g]
+
+@unittest.skipIf(codegen is None, "llvmlite is not installed")
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.env = environment.fresh_env()
+        self.env["codegen.cache"] = {}
+        codegen.install(self.env)
+
+    def test_partition(self):
+        funcs = make_functions()
+        graph = parallel.call_graph(funcs)
+        self.assertEqual(len(graph), 6)
+
+        partitions = parallel.partition(graph, 3)
+        self.assertEqual(len(partitions), 3)
+        self.assertEqual(sorted(len(p) for p in partitions), [2, 2, 2])
+        g, h = funcs[-1], graph.successors(funcs[-1])
+        self.assertTrue(any(g in p and list(h)[0] in p for p in partitions))
+
+        self.assertEqual(len(parallel.partition(graph, 16)), 5)
+
+    def test_partition_shared_callee(self):
+        # A helper called by all functions does not join them together
+        h = make_function("h", 3)
+        funcs = [make_function("g%d" % i, i, h) for i in range(4)]
+        graph = parallel.call_graph(funcs)
+        partitions = parallel.partition(graph, 4)
+        self.assertEqual(len(partitions), 4)
+        for g in funcs:
+            [p] = [p for p in partitions if g in p]
+            self.assertFalse(set(funcs) - set([g]) & set(p))
+
+        # Calls to the helper from the other partitions are linked
+        objects, symbols = parallel.emit_objects(funcs, self.env, jobs=4)
+        self.assertEqual(len(objects), 4)
+        parallel.load_objects(objects, self.env)
+        cache = self.env["codegen.cache"]
+        for i, g in enumerate(funcs):
+            self.assertEqual(codegen.execute(cache[g], self.env, 5), 5*i + 15)
+
+    def test_partition_size(self):
+        # Single-caller chains are split beyond the size bound
+        h = make_function("h", 3)
+        g = make_function("g", 2, h)
+        f = make_function("f", 1, g)
+        graph = parallel.call_graph([f])
+        self.assertEqual(len(parallel.partition(graph, 3)), 1)
+        self.assertEqual(len(parallel.partition(graph, 3, size=4)), 3)
+        self.assertEqual(len(parallel.partition(graph, 3, size=6)), 2)
+
+    def test_jit(self):
+        funcs = make_functions()
+        objects, symbols = parallel.emit_objects(funcs, self.env, jobs=2)
+        self.assertEqual(len(objects), 2)
+        self.assertEqual(len(symbols), 6)
+
+        parallel.load_objects(objects, self.env)
+        cache = self.env["codegen.cache"]
+        self.assertEqual(codegen.execute(cache[funcs[-1]], self.env, 5), 25)
+        self.assertEqual(codegen.execute(cache[funcs[3]], self.env, 5), 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+Naming of math functions (call_math) shared by the LLVM code generators.
+
+Math functions with an LLVM intrinsic are emitted as the intrinsic
+(llvm.sqrt.f64, ...), which LLVM can constant fold and vectorize. The
+others are declared with a stable mangled name, pykit.math.<name>.<types>,
+and resolved once per module.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit.ir import ops
+from pykit import types
+
+# Math functions with an LLVM intrinsic for floating point types
+intrinsics = {
+    ops.Sqrt    : 'llvm.sqrt',
+    ops.Sin     : 'llvm.sin',
+    ops.Cos     : 'llvm.cos',
+    ops.Exp     : 'llvm.exp',
+    ops.Exp2    : 'llvm.exp2',
+    ops.Log     : 'llvm.log',
+    ops.Log2    : 'llvm.log2',
+    ops.Log10   : 'llvm.log10',
+    ops.Pow     : 'llvm.pow',
+    ops.Abs     : 'llvm.fabs',
+    ops.Floor   : 'llvm.floor',
+    ops.Ceil    : 'llvm.ceil',
+    ops.Rint    : 'llvm.rint',
+}
+
+def type_suffix(type):
+    """Suffix of overloaded LLVM names: Float64 -> 'f64', Int32 -> 'i32'"""
+    type = types.resolve_typedef(type)
+    if type.is_real:
+        return 'f%d' % type.bits
+    elif type.is_int:
+        return 'i%d' % type.bits
+    elif type.is_bool:
+        return 'i1'
+    raise TypeError("No math functions for type %s" % (type,))
+
+def intrinsic(name, type):
+    """LLVM intrinsic name for math function `name` on `type`, or None"""
+    type = types.resolve_typedef(type)
+    if name in intrinsics and type.is_real:
+        return intrinsics[name]
+
+def mangle(name, argtypes):
+    """Stable name of math function `name` on arguments of `argtypes`"""
+    return 'pykit.math.%s.%s' % (name.lower(),
+                                 '.'.join(map(type_suffix, argtypes)))
+
+def demangle(mangled):
+    """'pykit.math.sin.f64' -> 'sin'"""
+    return mangled.split('.')[2]
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+Register JIT-compiled functions with native profilers.
+
+    PerfMap     /tmp/perf-<pid>.map, read by `perf report` to symbolize
+                addresses in anonymous executable memory
+    JitDump     jit-<pid>.dump records including the machine code, for
+                `perf record -k mono` followed by `perf inject --jit`
+
+Symbols are named after the pykit function and the mangled name of the
+generated function: "sum [sum0]". Code generators install a Profiler in
+the environment (see the `perf` and `jitdump` options of their install())
+and register each function once it has an address.
+"""
+
+from __future__ import print_function, division, absolute_import
+import os
+import mmap
+import time
+import atexit
+import ctypes
+import ctypes.util
+import struct
+import platform
+import threading
+
+default_size = 256 # code size for functions of unknown size
+
+def symbol(name, mangled):
+    """Symbol name for pykit function `name` compiled as `mangled`"""
+    if name == mangled:
+        return name
+    return "%s [%s]" % (name, mangled)
+
+def code_sizes(addresses, end=None):
+    """
+    Estimate the code sizes of functions laid out consecutively, from the
+    distance to the next function. The last function extends to `end`.
+    Returns { address : size }.
+    """
+    addresses = sorted(set(addresses))
+    sizes = {}
+    for addr, next in zip(addresses, addresses[1:] + [end]):
+        sizes[addr] = next - addr if next and next > addr else default_size
+    return sizes
+
+CLOCK_MONOTONIC = getattr(time, 'CLOCK_MONOTONIC', 1) # 1 on Linux
+
+class timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+_clock_gettime = []
+
+def clock_gettime():
+    """clock_gettime() of the C library (librt for old glibc versions)"""
+    if not _clock_gettime:
+        for library in [None, ctypes.util.find_library('rt')]:
+            try:
+                func = ctypes.CDLL(library, use_errno=True).clock_gettime
+            except (OSError, AttributeError):
+                continue
+            func.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+            func.restype = ctypes.c_int
+            _clock_gettime.append(func)
+            break
+        else:
+            raise OSError("clock_gettime() is not available")
+    return _clock_gettime[0]
+
+def timestamp():
+    """CLOCK_MONOTONIC in nanoseconds, the clock of `perf record -k mono`"""
+    if hasattr(time, 'clock_gettime_ns'):
+        return time.clock_gettime_ns(CLOCK_MONOTONIC)
+
+    ts = timespec()
+    if clock_gettime()(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return ts.tv_sec * 10**9 + ts.tv_nsec
+
+#===------------------------------------------------------------------===
+# perf map
+#===------------------------------------------------------------------===
+
+class PerfMap(object):
+    """Append "START SIZE symbol" lines to /tmp/perf-<pid>.map"""
+
+    def __init__(self, path=None):
+        self.path = path or '/tmp/perf-%d.map' % os.getpid()
+        self.file = open(self.path, 'a')
+
+    def register(self, address, size, name):
+        self.file.write('%x %x %s\n' % (address, size, name))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+#===------------------------------------------------------------------===
+# jitdump
+#===------------------------------------------------------------------===
+
+JITDUMP_MAGIC = 0x4A695444
+JITDUMP_VERSION = 1
+JIT_CODE_LOAD = 0
+JIT_CODE_CLOSE = 3
+
+elf_machines = {
+    'x86_64': 62, 'AMD64': 62, 'i386': 3, 'i686': 3,
+    'aarch64': 183, 'arm64': 183, 'ppc64le': 21, 'ppc64': 21,
+}
+
+class JitDump(object):
+    """
+    Write JIT_CODE_LOAD records to <directory>/jit-<pid>.dump. The file is
+    mapped executable, which is how perf record finds it.
+    """
+
+    header = struct.Struct('=IIIIIIQQ')
+    record = struct.Struct('=IIQ')
+    code_load = struct.Struct('=IIQQQQ')
+
+    def __init__(self, directory=None):
+        directory = directory or os.environ.get('JITDUMPDIR', '/tmp')
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, 'jit-%d.dump' % self.pid)
+        self.file = open(self.path, 'w+b')
+        self.index = 0
+
+        machine = elf_machines.get(platform.machine(), 0)
+        self.file.write(self.header.pack(
+            JITDUMP_MAGIC, JITDUMP_VERSION, self.header.size, machine, 0,
+            self.pid, timestamp(), 0))
+        self.file.flush()
+
+        self.marker = None
+        if hasattr(mmap, 'PROT_EXEC'):
+            self.marker = mmap.mmap(self.file.fileno(), self.header.size,
+                                    mmap.MAP_PRIVATE,
+                                    mmap.PROT_READ | mmap.PROT_EXEC)
+
+    def register(self, address, size, name):
+        name = name.encode('utf-8') + b'\0'
+        code = ctypes.string_at(address, size)
+        size_ = (self.record.size + self.code_load.size + len(name) +
+                 len(code))
+        tid = getattr(threading, 'get_native_id', os.getpid)()
+        self.file.write(self.record.pack(JIT_CODE_LOAD, size_, timestamp()))
+        self.file.write(self.code_load.pack(self.pid, tid, address, address,
+                                            size, self.index))
+        self.file.write(name)
+        self.file.write(code)
+        self.file.flush()
+        self.index += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.write(self.record.pack(JIT_CODE_CLOSE, self.record.size,
+                                         timestamp()))
+        if self.marker is not None:
+            self.marker.close()
+        self.file.close()
+
+#===------------------------------------------------------------------===
+# Profiler
+#===------------------------------------------------------------------===
+
+class Profiler(object):
+    """Register compiled functions with the perf map and/or jitdump"""
+
+    def __init__(self, perfmap=True, jitdump=False, path=None, directory=None):
+        self.writers = []
+        if perfmap:
+            self.writers.append(PerfMap(path))
+        if jitdump:
+            self.writers.append(JitDump(directory))
+        self.names = {} # { mangled name : pykit function name }
+
+    def add_name(self, mangled, name):
+        self.names[mangled] = name
+
+    def register(self, address, size, mangled):
+        name = symbol(self.names.get(mangled, mangled), mangled)
+        for writer in self.writers:
+            writer.register(address, size, name)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+def profiler(perf=False, jitdump=False):
+    """
+    Profiler for the perf and jitdump options of code generators, or None.
+    Each option is a bool or the perf map path or jitdump directory. The
+    profiler is closed at exit, which ends the jitdump with JIT_CODE_CLOSE.
+    """
+    if perf or jitdump:
+        path = perf if isinstance(perf, str) else None
+        directory = jitdump if isinstance(jitdump, str) else None
+        result = Profiler(bool(perf), bool(jitdump), path, directory)
+        atexit.register(result.close)
+        return result
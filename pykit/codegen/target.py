@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+Target CPU and feature selection for the LLVM code generators.
+
+The host CPU name and features are detected through llvmlite (or llvmpy,
+when it provides them). Feature strings use the LLVM syntax:
+
+    "+avx2,+fma,-avx512f"
+
+Functions can be compiled for several feature levels with a Dispatcher,
+which picks the best variant the running machine supports.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit import environment, pipeline
+
+# ______________________________________________________________________
+# Host detection
+
+_host = {}
+
+def host_cpu():
+    """Name of the host CPU, e.g. 'haswell', or '' if unknown"""
+    if 'cpu' not in _host:
+        _host['cpu'], _host['features'] = _detect()
+    return _host['cpu']
+
+def host_features():
+    """LLVM feature string of the host CPU, or '' if unknown"""
+    host_cpu()
+    return _host['features']
+
+def _detect():
+    try:
+        import llvmlite.binding as llvm
+    except ImportError:
+        pass
+    else:
+        llvm.initialize_native_target()
+        try:
+            return llvm.get_host_cpu_name(), llvm.get_host_cpu_features().flatten()
+        except RuntimeError:
+            return llvm.get_host_cpu_name(), ''
+
+    try:
+        import llvm.ee
+        return llvm.ee.get_host_cpu_name(), ''
+    except (ImportError, AttributeError):
+        return '', ''
+
+def parse_features(features):
+    """Parse a feature string into (enabled, disabled) sets"""
+    enabled, disabled = set(), set()
+    for feature in filter(None, features.split(',')):
+        if feature.startswith('-'):
+            disabled.add(feature[1:])
+        else:
+            enabled.add(feature.lstrip('+'))
+    return enabled, disabled
+
+def supports(features, host=None):
+    """Whether the host supports all features enabled in `features`"""
+    host = host_features() if host is None else host
+    enabled, _ = parse_features(features)
+    return enabled <= parse_features(host)[0]
+
+def resolve(cpu=None, features=None):
+    """Default to the host for the cpu and features which are None"""
+    if cpu is None:
+        cpu = host_cpu()
+    if features is None:
+        features = host_features()
+    return cpu, features
+
+# ______________________________________________________________________
+# Multi-variant dispatch
+
+# (name, cpu, features), from best to worst
+x86_variants = [
+    ('avx512', 'skylake-avx512', '+avx512f,+avx512bw,+avx512dq,+avx512vl,'
+                                 '+avx2,+fma,+avx'),
+    ('avx2',   'haswell',        '+avx2,+fma,+avx'),
+    ('sse4.2', 'nehalem',        '+sse4.2'),
+    ('generic', '',              ''),
+]
+
+class Dispatcher(object):
+    """
+    Compile a function for several target feature levels and call the best
+    variant supported by the machine at runtime. Variants are compiled on
+    demand:
+
+        d = Dispatcher(func, codegen)
+        d(1, 2)         # compiles and calls the best supported variant
+        d.compile_all() # compile all supported variants
+    """
+
+    def __init__(self, func, codegen, variants=x86_variants, opt=3,
+                 host=None):
+        self.func = func
+        self.codegen = codegen
+        self.variants = list(variants)
+        self.opt = opt
+        self.host = host
+        self.compiled = {} # { variant name : ctypes function }
+        self.envs = {}     # { variant name : env }, this keeps engines alive
+        self.selected = None
+
+    def supported(self):
+        """The variants supported by the host, best first"""
+        return [v for v in self.variants if supports(v[2], self.host)]
+
+    def select(self):
+        """Name of the best supported variant"""
+        if self.selected is None:
+            supported = self.supported()
+            if not supported:
+                raise ValueError("No variant of %s supported by the host"
+                                 % (self.func.name,))
+            self.selected = supported[0][0]
+        return self.selected
+
+    def compile(self, name):
+        """Compile the variant with the given name, return a ctypes function"""
+        if name not in self.compiled:
+            [(_, cpu, features)] = [v for v in self.variants if v[0] == name]
+            env = environment.fresh_env()
+            env["codegen.cache"] = {}
+            self.codegen.install(env, opt=self.opt, cpu=cpu, features=features)
+            lfunc, env = pipeline.codegen(self.func, env)
+            self.codegen.optimize(lfunc, env)
+            self.envs[name] = env
+            self.compiled[name] = env["codegen.%s.ctypes" % self.codegen.name]
+        return self.compiled[name]
+
+    def compile_all(self):
+        for name, cpu, features in self.supported():
+            self.compile(name)
+
+    def __call__(self, *args):
+        return self.compile(self.select())(*args)
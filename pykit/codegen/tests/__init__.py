@@ -7,11 +7,23 @@ except ImportError:
 else:
     from pykit.codegen import llvm as llvm_codegen
 
+try:
+    import llvmlite
+except ImportError:
+    llvmlite_codegen = None
+else:
+    from pykit.codegen import llvmlite as llvmlite_codegen
+
+from pykit.codegen import c as c_codegen
+
 # ______________________________________________________________________
 
 codegens = []
 
 if llvm_codegen:
     codegens.append(llvm_codegen)
+if llvmlite_codegen:
+    codegens.append(llvmlite_codegen)
+codegens.append(c_codegen)
 
 codegen_args = [(codegen,) for codegen in codegens]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+import numpy as np
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder
+from pykit.codegen import batched
+from pykit.codegen.tests import llvmlite_codegen, c_codegen
+
+F = types.Float64
+I = types.Int32
+
+def make_axpy():
+    func = Function("axpy", ['a', 'x'], types.Function(F, [F, I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    a, x = func.args
+    x = b.convert(F, [x])
+    b.ret(b.add(F, [b.mul(F, [a, x]), x]))
+    return func
+
+codegens = [codegen for codegen in (llvmlite_codegen, c_codegen) if codegen]
+
+class TestCalls(unittest.TestCase):
+
+    def compile(self, codegen, func):
+        env = environment.fresh_env()
+        env["codegen.cache"] = {}
+        codegen.install(env)
+        lfunc, env = pipeline.codegen(func, env)
+        return lfunc, env
+
+    def test_cached_wrapper(self):
+        for codegen in codegens:
+            lfunc, env = self.compile(codegen, make_axpy())
+            cfunc = codegen.wrapper(lfunc, env)
+            self.assertIs(codegen.wrapper(lfunc, env), cfunc)
+            self.assertIs(env["codegen.%s.ctypes" % codegen.name], cfunc)
+            self.assertEqual(codegen.execute(lfunc, env, 2.0, 3), 9.0)
+
+    def test_batched(self):
+        for codegen in codegens:
+            func = make_axpy()
+            lfunc, env = self.compile(codegen, func)
+            axpy = batched.batched(func, env, codegen)
+            a, x = np.arange(10.0), np.arange(10)
+            self.assertTrue(np.array_equal(axpy(a, x), a * x + x))
+
+            out = np.zeros(3)
+            self.assertIs(axpy([1, 2, 3], [1, 1, 1], out=out), out)
+            self.assertEqual(list(out), [2.0, 3.0, 4.0])
+
+    def test_void(self):
+        func = Function("f", [], types.Function(types.Void, []))
+        self.assertRaises(TypeError, batched.batched_function, func)
+
+    def test_no_arguments(self):
+        func = Function("f", [], types.Function(F, []))
+        self.assertRaises(TypeError, batched.batched_function, func)
+
+
+if __name__ == '__main__':
+    unittest.main()
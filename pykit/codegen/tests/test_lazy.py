@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import environment, types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen import lazy
+from pykit.codegen.tests import llvmlite_codegen
+
+I = types.Int32
+
+def make_add(n):
+    func = Function("add%d" % n, ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    b.ret(b.add(I, [func.args[0], Const(n, I)]))
+    return func
+
+def make_fact():
+    func = Function("fact", ['n'], types.Function(I, [I]))
+    entry, rec, base = [func.new_block(name) for name in
+                            ('entry', 'rec', 'base')]
+    b = Builder(func)
+    n, = func.args
+    with b.at_end(entry):
+        b.cbranch(b.le(types.Bool, [n, Const(1, I)]), base, rec)
+    with b.at_end(base):
+        b.ret(Const(1, I))
+    with b.at_end(rec):
+        result = b.call(I, [func, [b.sub(I, [n, Const(1, I)])]])
+        b.ret(b.mul(I, [n, result]))
+    return func
+
+def make_caller(callees):
+    func = Function("caller", ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    result, = func.args
+    for callee in callees:
+        result = b.call(I, [callee, [result]])
+    b.ret(result)
+    return func
+
+def make_broken():
+    """A function whose block has no terminator"""
+    func = Function("broken", ['x'], types.Function(I, [I]))
+    func.new_block("entry")
+    return func
+
+@unittest.skipIf(llvmlite_codegen is None, "llvmlite is not installed")
+class TestLazyCompilation(unittest.TestCase):
+
+    def setUp(self):
+        self.env = environment.fresh_env()
+        self.env["codegen.cache"] = {}
+        llvmlite_codegen.install(self.env)
+        lazy.install(self.env, llvmlite_codegen)
+
+    def test_compile_on_first_call(self):
+        add1, add2 = make_add(1), make_add(2)
+        caller = lazy.slot(make_caller([add1, add2]), self.env)
+        self.assertEqual(len(self.env["codegen.cache"]), 0)
+
+        self.assertEqual(caller(3), 6)
+        self.assertEqual(len(self.env["codegen.cache"]), 3)
+        self.assertIsNotNone(lazy.slot(add1, self.env).cfunc)
+
+        # Slots are patched, nothing is compiled again
+        self.assertEqual(caller(4), 7)
+        self.assertEqual(len(self.env["codegen.cache"]), 3)
+
+    def test_recursion(self):
+        fact = lazy.slot(make_fact(), self.env)
+        self.assertEqual(fact(5), 120)
+
+    def test_uncalled(self):
+        add1 = make_add(1)
+        lazy.slot(add1, self.env)
+        caller = lazy.slot(make_caller([]), self.env)
+        self.assertEqual(caller(3), 3)
+        self.assertNotIn(add1, self.env["codegen.cache"])
+
+    def test_compile_error(self):
+        caller = lazy.slot(make_caller([make_add(1), make_broken()]), self.env)
+        self.assertRaises(RuntimeError, caller, 3)
+        self.assertEqual(self.env["codegen.lazy.errors"], [])
+
+        # The caller was compiled, the error is raised again on each call
+        self.assertIsNotNone(caller.cfunc)
+        self.assertRaises(RuntimeError, caller, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen.tests import llvm_codegen as codegen
+from pykit.tests import build_loop, square
+
+I = types.Int32
+
+def make_twice(callee):
+    """twice(n) = callee(n) * 2"""
+    func = Function("twice", ['n'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    result = b.call(I, [callee, func.args])
+    b.ret(b.mul(I, [result, Const(2, I)]))
+    return func
+
+class RecordingPassManager(object):
+    """Record the modules the module passes run over"""
+
+    def __init__(self, pm):
+        self.pm = pm
+        self.modules = []
+
+    def run(self, llvm_module):
+        self.modules.append(llvm_module)
+        return self.pm.run(llvm_module)
+
+@unittest.skipIf(codegen is None, "llvmpy is not installed")
+class TestLink(unittest.TestCase):
+
+    def setUp(self):
+        self.env = environment.fresh_env()
+        self.env["codegen.cache"] = {}
+        codegen.install(self.env)
+
+    def record(self):
+        pms = codegen.passmanagers(self.env)
+        recorder = RecordingPassManager(pms.pm)
+        self.env["codegen.llvm.passmanagers"] = pms._replace(pm=recorder)
+        return recorder
+
+    def compile(self, func):
+        lfunc, env = pipeline.codegen(func, self.env)
+        codegen.optimize(lfunc, env)
+        return lfunc
+
+    def test_link(self):
+        recorder = self.record()
+        module = self.env["codegen.llvm.module"]
+        lfunc = self.compile(build_loop(square, name="sum")[0])
+
+        # Outside of a batch, the module passes run when linking
+        self.assertEqual([m.id for m in recorder.modules], [module.id])
+        self.assertEqual(lfunc.module.id, module.id)
+        self.assertNotEqual(self.env["codegen.llvm.module"].id, module.id)
+        self.assertEqual(self.env["codegen.llvm.pending"], [])
+        self.assertEqual(self.env["codegen.llvm.ctypes"](10), 285)
+
+    def test_batch(self):
+        callee = build_loop(square, name="sum")[0]
+        with codegen.batch(self.env):
+            recorder = self.record()
+            self.compile(callee)
+            lfunc = self.compile(make_twice(callee))
+            self.assertIsNone(self.env["codegen.llvm.ctypes"])
+            self.assertEqual(recorder.modules, [])
+
+        # Linked once, with the callee inlined
+        self.assertEqual([m.id for m in recorder.modules], [lfunc.module.id])
+        self.assertNotIn('call ', str(lfunc))
+        self.assertEqual(codegen.execute(lfunc, self.env, 10), 570)
+
+    def test_call_earlier_module(self):
+        callee = build_loop(square, name="sum")[0]
+        lcallee = self.compile(callee)
+        lfunc = self.compile(make_twice(callee))
+
+        # The callee is declared in the module of the caller, not inlined
+        self.assertNotEqual(lfunc.module.id, lcallee.module.id)
+        decl = lfunc.module.get_function_named(lcallee.name)
+        self.assertTrue(decl.is_declaration)
+        self.assertIn('call ', str(lfunc))
+        self.assertEqual(codegen.execute(lfunc, self.env, 10), 570)
+
+    def test_flush_empty(self):
+        module = self.env["codegen.llvm.module"]
+        codegen.flush(self.env)
+        self.assertEqual(self.env["codegen.llvm.module"].id, module.id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import math
+import unittest
+
+from pykit import environment, pipeline, types
+from pykit.codegen import mathlib
+from pykit.codegen.tests import llvm_codegen
+from pykit.tests import build_math
+
+class TestMathNames(unittest.TestCase):
+
+    def test_intrinsic(self):
+        self.assertEqual(mathlib.intrinsic('Sqrt', types.Float64), 'llvm.sqrt')
+        self.assertEqual(mathlib.intrinsic('Abs', types.Float32), 'llvm.fabs')
+        self.assertIsNone(mathlib.intrinsic('Atan', types.Float64))
+        self.assertIsNone(mathlib.intrinsic('Abs', types.Int32))
+
+    def test_mangle(self):
+        name = mathlib.mangle('Atan2', [types.Float32, types.Float32])
+        self.assertEqual(name, 'pykit.math.atan2.f32.f32')
+        self.assertEqual(mathlib.demangle(name), 'atan2')
+
+@unittest.skipIf(llvm_codegen is None, "llvmpy is not installed")
+class TestLLVMMath(unittest.TestCase):
+
+    def test_intrinsic_ids(self):
+        from pykit.codegen.llvm.llvm_codegen import intrinsic_id
+        for intrinsic in mathlib.intrinsics.values():
+            self.assertIsNotNone(intrinsic_id(intrinsic))
+
+    def test_math(self):
+        env = environment.fresh_env()
+        env["codegen.cache"] = {}
+        llvm_codegen.install(env)
+        with llvm_codegen.batch(env):
+            lfunc, env = pipeline.codegen(build_math(), env)
+            ir = str(env["codegen.llvm.module"])
+            self.assertIn('@llvm.sqrt.f64', ir)
+            self.assertIn('@llvm.pow.f64', ir)
+            self.assertEqual(env["codegen.llvm.math"], ['pykit.math.atan.f64'])
+            llvm_codegen.optimize(lfunc, env)
+
+        self.assertAlmostEqual(llvm_codegen.execute(lfunc, env, 2.0),
+                               math.sqrt(2.0) + math.atan(2.0) + 4.0)
+        self.assertEqual(env["codegen.llvm.math"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
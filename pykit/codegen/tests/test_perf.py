@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import os
+import ctypes
+import shutil
+import struct
+import tempfile
+import unittest
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen import perf
+from pykit.codegen.tests import llvm_codegen, llvmlite_codegen
+
+I = types.Int32
+
+def make_add(n):
+    func = Function("add%d" % n, ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    b.ret(b.add(I, [func.args[0], Const(n, I)]))
+    return func
+
+def make_call(callee):
+    func = Function("call", ['x'], types.Function(I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    b.ret(b.call(I, [callee, func.args]))
+    return func
+
+class TestPerf(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'perf.map')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_code_sizes(self):
+        self.assertEqual(perf.code_sizes([0x20, 0x0, 0x10], 0x28),
+                         {0x0: 0x10, 0x10: 0x10, 0x20: 0x8})
+        self.assertEqual(perf.code_sizes([0x10]), {0x10: perf.default_size})
+
+    def test_symbol(self):
+        self.assertEqual(perf.symbol("sum", "sum3"), "sum [sum3]")
+        self.assertEqual(perf.symbol("sum", "sum"), "sum")
+
+    def test_timestamp(self):
+        # The C library clock, used without time.clock_gettime_ns
+        ts = perf.timespec()
+        before = perf.timestamp()
+        perf.clock_gettime()(perf.CLOCK_MONOTONIC, ctypes.byref(ts))
+        after = perf.timestamp()
+        self.assertTrue(before <= ts.tv_sec * 10**9 + ts.tv_nsec <= after)
+
+    def test_jitdump_close(self):
+        jitdump = perf.JitDump(self.dir)
+        jitdump.close()
+        jitdump.close() # again at exit
+        with open(jitdump.path, 'rb') as f:
+            f.seek(perf.JitDump.header.size)
+            id, size, _ = perf.JitDump.record.unpack(f.read())
+        self.assertEqual(id, perf.JIT_CODE_CLOSE)
+
+    @unittest.skipIf(llvmlite_codegen is None, "llvmlite is not installed")
+    def test_llvmlite(self):
+        env = environment.fresh_env()
+        env["codegen.cache"] = {}
+        llvmlite_codegen.install(env, perf=self.path, jitdump=self.dir)
+        lfunc, env = pipeline.codegen(make_add(1), env)
+        self.assertEqual(llvmlite_codegen.execute(lfunc, env, 1), 2)
+
+        profiler = env["codegen.llvmlite.perf"]
+        profiler.close()
+        [line] = open(self.path).read().splitlines()
+        start, size, name = line.split(' ', 2)
+        self.assertEqual(int(start, 16), env["codegen.llvmlite.engine"].
+                                         get_function_address(lfunc.name))
+        self.assertGreater(int(size, 16), 0)
+        self.assertEqual(name, perf.symbol("add1", lfunc.name))
+
+        dump = os.path.join(self.dir, 'jit-%d.dump' % os.getpid())
+        with open(dump, 'rb') as f:
+            header = f.read(perf.JitDump.header.size)
+            id, total_size, _ = perf.JitDump.record.unpack(
+                f.read(perf.JitDump.record.size))
+        magic, version, size = struct.unpack('=III', header[:12])
+        self.assertEqual((magic, version, size),
+                         (perf.JITDUMP_MAGIC, 1, perf.JitDump.header.size))
+        self.assertEqual(id, perf.JIT_CODE_LOAD)
+
+    @unittest.skipIf(llvm_codegen is None, "llvmpy is not installed")
+    def test_llvm(self):
+        env = environment.fresh_env()
+        env["codegen.cache"] = {}
+        llvm_codegen.install(env, perf=self.path)
+        callee = make_add(1)
+        with llvm_codegen.batch(env):
+            lcallee, env = pipeline.codegen(callee, env)
+            lfunc, env = pipeline.codegen(make_call(callee), env)
+        self.assertEqual(llvm_codegen.execute(lfunc, env, 1), 2)
+
+        # Every function of the module is registered, not only the wrapped
+        env["codegen.llvm.perf"].close()
+        names = [line.split(' ', 2)[2]
+                     for line in open(self.path).read().splitlines()]
+        self.assertEqual(sorted(names),
+                         sorted([perf.symbol("add1", lcallee.name),
+                                 perf.symbol("call", lfunc.name)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
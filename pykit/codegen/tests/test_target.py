@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder
+from pykit.codegen import target
+from pykit.codegen.tests import llvmlite_codegen
+
+I = types.Int32
+
+class TestFeatures(unittest.TestCase):
+
+    def test_parse(self):
+        enabled, disabled = target.parse_features("+avx2,+fma,-avx512f")
+        self.assertEqual(enabled, set(['avx2', 'fma']))
+        self.assertEqual(disabled, set(['avx512f']))
+
+    def test_supports(self):
+        host = "+sse4.2,+avx,+avx2,-avx512f"
+        self.assertTrue(target.supports("+avx2,+avx", host))
+        self.assertTrue(target.supports("", host))
+        self.assertFalse(target.supports("+avx512f", host))
+
+    def test_resolve(self):
+        self.assertEqual(target.resolve('nehalem', ''), ('nehalem', ''))
+        self.assertEqual(target.resolve(None, None),
+                         (target.host_cpu(), target.host_features()))
+
+
+@unittest.skipIf(llvmlite_codegen is None, "llvmlite is not installed")
+class TestDispatcher(unittest.TestCase):
+
+    def make_func(self):
+        func = Function("add", ['x', 'y'], types.Function(I, [I, I]))
+        b = Builder(func)
+        b.position_at_end(func.new_block("entry"))
+        b.ret(b.add(I, func.args))
+        return func
+
+    def test_select(self):
+        host = "+sse4.2,+avx,+avx2,+fma"
+        d = target.Dispatcher(self.make_func(), llvmlite_codegen, host=host)
+        self.assertEqual(d.select(), 'avx2')
+
+    def test_dispatch(self):
+        d = target.Dispatcher(self.make_func(), llvmlite_codegen,
+                              variants=[('generic', '', '')])
+        self.assertEqual(d(2, 3), 5)
+        self.assertEqual(list(d.compiled), ['generic'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+import numpy as np
+
+from pykit import types
+from pykit.ir import Function, Builder, Const
+from pykit.codegen import ufuncs
+from pykit.codegen.tests import llvmlite_codegen, c_codegen
+
+F = types.Float64
+I = types.Int64
+P = types.Pointer(F)
+
+def make_add():
+    func = Function("add", ['x', 'y'], types.Function(F, [F, F]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    b.ret(b.add(F, func.args))
+    return func
+
+def make_dot():
+    """Void dot(Float64 *a, Float64 *b, Float64 *out, n, a_stride, b_stride)"""
+    func = Function("dot", ['a', 'b', 'out', 'n', 'sa', 'sb'],
+                    types.Function(types.Void, [P, P, P, I, I, I]))
+    entry, cond, body, exit = [func.new_block(name) for name in
+                                   ('entry', 'cond', 'body', 'exit')]
+    a, b_, out, n, sa, sb = func.args
+    b = Builder(func)
+    with b.at_end(entry):
+        b.jump(cond)
+    with b.at_end(cond):
+        i = b.phi(I, [[], []])
+        acc = b.phi(F, [[], []])
+        b.cbranch(b.lt(types.Bool, [i, n]), body, exit)
+    with b.at_end(body):
+        x = b.ptrload(F, [b.ptradd(P, [a, b.mul(I, [i, sa])])])
+        y = b.ptrload(F, [b.ptradd(P, [b_, b.mul(I, [i, sb])])])
+        acc2 = b.add(F, [acc, b.mul(F, [x, y])])
+        i2 = b.add(I, [i, Const(1, I)])
+        b.jump(cond)
+    with b.at_end(exit):
+        b.ptrstore(types.Void, [out, acc])
+        b.ret(None)
+
+    i.set_args([[entry, body], [Const(0, I), i2]])
+    acc.set_args([[entry, body], [Const(0.0, F), acc2]])
+    return func
+
+codegens = [codegen for codegen in (llvmlite_codegen, c_codegen) if codegen]
+
+class TestUfuncs(unittest.TestCase):
+
+    def test_parse_signature(self):
+        self.assertEqual(ufuncs.parse_signature("(m, n),(n)->(m)"),
+                         ([['m', 'n'], ['n']], [['m']]))
+        self.assertEqual(ufuncs.parse_signature("(),()->()"),
+                         ([[], []], [[]]))
+
+    def test_ufunc(self):
+        for codegen in codegens:
+            add = ufuncs.ufunc(make_add(), codegen)
+            self.assertEqual((add.nin, add.nout), (2, 1))
+            x = np.arange(12.0).reshape(3, 4)
+            y = np.arange(4.0)
+            self.assertTrue(np.array_equal(add(x, y), x + y))
+            self.assertTrue(np.array_equal(add(x[:, ::2], 1.5),
+                                           x[:, ::2] + 1.5))
+
+    def test_gufunc(self):
+        for codegen in codegens:
+            dot = ufuncs.gufunc(make_dot(), "(n),(n)->()", codegen)
+            a = np.random.rand(5, 8)
+            b = np.random.rand(8)
+            self.assertTrue(np.allclose(dot(a, b), np.dot(a, b)))
+            self.assertTrue(np.allclose(dot(a[:, ::2], b[::2]),
+                                        np.dot(a[:, ::2], b[::2])))
+
+
+if __name__ == '__main__':
+    unittest.main()
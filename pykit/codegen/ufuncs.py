@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generate NumPy ufuncs and gufuncs from pykit Functions.
+
+The inner loop over the strided buffers is generated in pykit IR, calls
+the kernel (which the code generator can inline), and is registered with
+PyUFunc_FromFuncAndDataAndSignature through the ufunc C-API capsule:
+
+    add = ufunc(func)                      # Float64 add(Float64, Float64)
+    add(np.arange(10.0), 2.0)
+
+For gufuncs, the kernel takes its operands as pointers (inputs with core
+dimensions and all outputs) or values (scalar inputs), followed by the
+core dimension sizes and the core strides, in elements, of each operand
+with core dimensions, as Int64:
+
+    # Void dot(Float64 *a, Float64 *b, Float64 *out,
+    #          Int64 n, Int64 a_stride, Int64 b_stride)
+    dot = gufunc(func, "(n),(n)->()")
+"""
+
+from __future__ import print_function, division, absolute_import
+import re
+import ctypes
+
+import numpy as np
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const
+from pykit.types import Pointer, Int8, Int64, Void
+
+#===------------------------------------------------------------------===
+# NumPy ufunc C-API
+#===------------------------------------------------------------------===
+
+PyUFunc_None = -1
+_FromFuncAndDataAndSignature = 31 # index in the ufunc API table
+
+_keepalive = [] # loops, data and type arrays must live as long as the ufunc
+
+def _ufunc_api():
+    for modname in ('numpy._core._multiarray_umath',
+                    'numpy.core._multiarray_umath', 'numpy.core.umath'):
+        try:
+            module = __import__(modname, fromlist=['_UFUNC_API'])
+        except ImportError:
+            continue
+        capsule = module._UFUNC_API
+        getpointer = ctypes.pythonapi.PyCapsule_GetPointer
+        getpointer.restype = ctypes.c_void_p
+        getpointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
+        return ctypes.cast(getpointer(capsule, None),
+                           ctypes.POINTER(ctypes.c_void_p))
+    raise ImportError("Cannot find the NumPy ufunc C-API")
+
+def register(loop_address, typenums, nin, nout, name, doc='', signature=None):
+    """Create a ufunc from a compiled inner loop"""
+    functype = ctypes.PYFUNCTYPE(
+        ctypes.py_object,
+        ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int,
+        ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_char_p,
+        ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p)
+    fromfunc = functype(_ufunc_api()[_FromFuncAndDataAndSignature])
+
+    loops = (ctypes.c_void_p * 1)(loop_address)
+    data = (ctypes.c_void_p * 1)(None)
+    typechars = (ctypes.c_char * len(typenums))(*typenums)
+    name, doc = name.encode('ascii'), doc.encode('ascii')
+    if signature is not None:
+        signature = signature.encode('ascii')
+    _keepalive.append((loops, data, typechars, name, doc, signature))
+
+    return fromfunc(ctypes.cast(loops, ctypes.c_void_p),
+                    ctypes.cast(data, ctypes.c_void_p),
+                    ctypes.cast(typechars, ctypes.c_char_p), 1, nin, nout,
+                    PyUFunc_None, name, doc, 0, signature)
+
+def dtype(type):
+    """NumPy dtype for a scalar pykit type"""
+    type = types.resolve_typedef(type)
+    if type.is_bool:
+        return np.dtype(np.bool_)
+    elif type.is_int:
+        return np.dtype('%sint%d' % ('u' if type.unsigned else '', type.bits))
+    elif type.is_real:
+        return np.dtype('float%d' % type.bits)
+    raise TypeError("No NumPy type for %s" % (type,))
+
+def typenum(type):
+    """NumPy type number for a scalar pykit type"""
+    return dtype(type).num
+
+def parse_signature(signature):
+    """'(m,n),(n)->(m)' -> ([['m', 'n'], ['n']], [['m']])"""
+    def operands(s):
+        return [[dim.strip() for dim in dims.split(',') if dim.strip()]
+                    for dims in re.findall(r'\(([^)]*)\)', s)]
+    inputs, outputs = signature.replace(' ', '').split('->')
+    return operands(inputs), operands(outputs)
+
+#===------------------------------------------------------------------===
+# Inner loops
+#===------------------------------------------------------------------===
+
+# void loop(char **args, npy_intp *dimensions, npy_intp *steps, void *data)
+loop_type = types.Function(Void, [Pointer(Pointer(Int8)), Pointer(Int64),
+                                  Pointer(Int64), Pointer(Int8)])
+
+def build_loop(name, nargs, body):
+    """
+    Build an inner loop over `nargs` operands, calling body(b, ptrs) for
+    each element, where `ptrs` point to the elements of the operands.
+    The loop Function is available as `b.func`.
+    """
+    func = Function(name, ['args', 'dimensions', 'steps', 'data'], loop_type)
+    args, dimensions, steps, data = func.args
+    b = Builder(func)
+
+    b.position_at_end(func.new_block('entry'))
+    n = b.ptrload(Int64, [dimensions])
+    starts, strides = [], []
+    for i in range(nargs):
+        index = Const(i, Int64)
+        starts.append(b.ptrload(Pointer(Int8), [b.ptradd(
+            Pointer(Pointer(Int8)), [args, index])]))
+        strides.append(b.ptrload(Int64, [b.ptradd(Pointer(Int64),
+                                                  [steps, index])]))
+
+    def step(b, i, ptrs):
+        body(b, ptrs)
+        return [b.ptradd(Pointer(Int8), [p, s]) for p, s in zip(ptrs, strides)]
+
+    b.gen_phi_loop(n, step, starts)
+    b.ret(None)
+    return func
+
+def ufunc_loop(func):
+    """Inner loop applying scalar function `func` element-wise"""
+    argtypes, restype = func.type.argtypes, func.type.restype
+
+    def body(b, ptrs):
+        args = [b.ptrload(t, [b.ptrcast(Pointer(t), [p])])
+                    for t, p in zip(argtypes, ptrs)]
+        result = b.call(restype, [func, args])
+        b.ptrstore(Void, [b.ptrcast(Pointer(restype), [ptrs[-1]]), result])
+
+    return build_loop(func.name + '_ufunc_loop', len(argtypes) + 1, body)
+
+def gufunc_loop(func, signature):
+    """Inner loop calling `func` for each element of the loop dimension"""
+    inputs, outputs = parse_signature(signature)
+    operands = inputs + outputs
+    nargs = len(operands)
+    corenames = []
+    for dims in operands:
+        corenames.extend(d for d in dims if d not in corenames)
+    argtypes = func.type.argtypes
+
+    def body(b, ptrs):
+        # Core dimensions follow the loop dimension, core strides (in bytes)
+        # follow the outer strides
+        dimensions, steps = b.func.args[1], b.func.args[2]
+        args = []
+        for i, (p, dims) in enumerate(zip(ptrs, operands)):
+            t = argtypes[i]
+            if t.is_pointer:
+                args.append(b.ptrcast(t, [p]))
+            else:
+                args.append(b.ptrload(t, [b.ptrcast(Pointer(t), [p])]))
+        for k, name in enumerate(corenames):
+            args.append(b.ptrload(Int64, [b.ptradd(
+                Pointer(Int64), [dimensions, Const(k + 1, Int64)])]))
+        k = nargs
+        for i, dims in enumerate(operands):
+            itemsize = Const(argtypes[i].base.bits // 8, Int64)
+            for _ in dims:
+                stride = b.ptrload(Int64, [b.ptradd(Pointer(Int64),
+                                                    [steps, Const(k, Int64)])])
+                args.append(b.div(Int64, [stride, itemsize]))
+                k += 1
+        b.call(Void, [func, args])
+
+    return build_loop(func.name + '_gufunc_loop', nargs, body)
+
+#===------------------------------------------------------------------===
+# Entry points
+#===------------------------------------------------------------------===
+
+def default_codegen():
+    try:
+        from pykit.codegen import llvmlite as codegen
+    except ImportError:
+        from pykit.codegen import c as codegen
+    return codegen
+
+def compile_loop(loop, codegen):
+    env = environment.fresh_env()
+    env["codegen.cache"] = {}
+    codegen.install(env)
+    lfunc, env = pipeline.codegen(loop, env)
+    codegen.optimize(lfunc, env)
+    cfunc = env["codegen.%s.ctypes" % codegen.name]
+    _keepalive.append(env)
+    return ctypes.cast(cfunc, ctypes.c_void_p).value
+
+def ufunc(func, codegen=None, name=None, doc=''):
+    """Create a NumPy ufunc from a pykit Function of scalars"""
+    codegen = codegen or default_codegen()
+    loop = compile_loop(ufunc_loop(func), codegen)
+    typenums = [typenum(t) for t in func.type.argtypes]
+    typenums.append(typenum(func.type.restype))
+    return register(loop, typenums, len(func.type.argtypes), 1,
+                    name or func.name, doc)
+
+def gufunc(func, signature, codegen=None, name=None, doc=''):
+    """
+    Create a NumPy generalized ufunc from a pykit Function with the given
+    signature, e.g. "(n),(n)->()". See the module docstring for the
+    arguments of the function.
+    """
+    codegen = codegen or default_codegen()
+    inputs, outputs = parse_signature(signature)
+    nargs = len(inputs) + len(outputs)
+    loop = compile_loop(gufunc_loop(func, signature), codegen)
+    typenums = []
+    for t in func.type.argtypes[:nargs]:
+        typenums.append(typenum(t.base if t.is_pointer else t))
+    return register(loop, typenums, len(inputs), len(outputs),
+                    name or func.name, doc, signature)
@@ -9,8 +9,12 @@ from os.path import join, abspath, dirname
 import copy
 
 from pykit.analysis import cfa
-from pykit.lower import lower_calls, lower_errcheck, lower_fields
-from pykit.codegen import resolve_typedefs, llvm
+from pykit.optimizations import (stackalloc, strength_reduction, refcount,
+                                 struct_layout, aos_to_soa)
+from pykit.transform import inline, dce, simplifycfg
+from pykit.lower import (lower_calls, lower_errcheck, lower_fields,
+                         lower_alloc)
+from pykit.codegen import resolve_typedefs
 
 root = abspath(dirname(__file__))
 
@@ -25,9 +29,11 @@ pipeline_stages = [
 ]
 
 pipeline_analyze = ["passes.cfa"]
-pipeline_optimize = []
+pipeline_optimize = ["passes.stackalloc", "passes.refcount",
+                     "passes.struct_layout"]
 pipeline_lower = ["passes.lower_calls", "passes.lower_errcheck",
-                  "passes.lower_fields"]
+                  "passes.lower_alloc", "passes.lower_fields",
+                  "passes.simplifycfg"]
 pipeline_codegen = ["passes.resolve_typedefs", "passes.codegen"]
 
 # ______________________________________________________________________
@@ -38,11 +44,20 @@ default_passes = {
     "passes.cfa": cfa,
 
     # Optimize
+    "passes.inline": inline,
+    "passes.dce": dce,
+    "passes.stackalloc": stackalloc,
+    "passes.strength_reduction": strength_reduction,
+    "passes.refcount": refcount,
+    "passes.struct_layout": struct_layout,
+    "passes.aos_to_soa": aos_to_soa,
 
     # Lower
+    "passes.lower_alloc": lower_alloc,
     "passes.lower_calls": lower_calls,
     "passes.lower_errcheck": lower_errcheck,
     "passes.lower_fields": lower_fields,
+    "passes.simplifycfg": simplifycfg,
 
     # Codegen
     "passes.resolve_typedefs": resolve_typedefs,
@@ -79,6 +94,9 @@ def fresh_env():
     env['types.typedefmap'] = dict(resolve_typedefs.typedef_map)
     env["codegen.impl"] = None
     env["codegen.cache"] = _codegen_cache
+    env["codegen.lazy"] = None # see pykit.codegen.lazy
+    env["lower.exceptions"] = "costful" # see pykit.lower.lower_errcheck
+    env["lower.allocator"] = "pool" # see pykit.lower.lower_alloc
 
     return env
 
@@ -7,5 +7,6 @@ from .value import (Module, GlobalValue, Function, Block, Operation, FuncArg,
 from .traversal import transform, visit, vvisit, ArgLoader, Combinator, combine
 from .verification import verify, verify_lowlevel
 from .builder import OpBuilder, Builder
+from .folding import ConstantFolder
 from .passes import FunctionPass, opgrouper
 from .copying import copy_module, copy_function
\ No newline at end of file
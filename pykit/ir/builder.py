@@ -5,12 +5,13 @@ Convenience IR builder.
 """
 
 from __future__ import print_function, division, absolute_import
+import functools
 from contextlib import contextmanager
 
 from pykit import error
 from pykit import types, config
 from pykit.ir import Value, Op, Block, Const, Undef, ops, findop, FuncArg
-from pykit.ir.verification import op_verifier
+from pykit.ir.verification import op_verifier, batched_verification
 from pykit.utils import flatten
 
 def make_arg(arg):
@@ -18,11 +19,28 @@ def make_arg(arg):
     return arg.result if isinstance(arg, (Op, Block)) else arg
 
 
+def _folding(opcode, build_op):
+    """Return the value folded by the builder's folder instead of an Op"""
+    @functools.wraps(build_op)
+    def fold(self, ty, args=None, result=None, **metadata):
+        if self.folder is not None and args:
+            value = self.folder.fold(opcode, ty, args)
+            if value is not None:
+                return value
+        return build_op(self, ty, args, result, **metadata)
+    return fold
+
+
 class OpBuilder(object):
     """
     I know how to build Operations.
+
+    With a folder (see pykit.ir.folding), operations are folded to constants
+    or existing values where possible instead of being built.
     """
 
+    folder = None
+
     def _op(op):
         """Helper to create Builder methods"""
         def _process(self, ty, args=None, result=None, **metadata):
@@ -30,7 +48,7 @@ class OpBuilder(object):
                 args = []
             assert ty is not None
             assert isinstance(args, list), args
-            assert not any(arg is None for arg in flatten(args)), args
+            assert op == 'ret' or not any(arg is None for arg in flatten(args)), args
             result = Op(op, ty, args, result)
             if metadata:
                 result.add_metadata(metadata)
@@ -52,17 +70,30 @@ class OpBuilder(object):
         if config.op_verify:
             build_op = op_verifier(build_op)
 
+        if not ops.is_void(op):
+            build_op = _folding(op, build_op)
+
         return build_op
 
     def _insert_op(self, op):
         """Implement in subclass that emits Operations"""
 
+    def batched_verification(self):
+        """
+        Verify the ops built in a with block together at its end:
+
+            with builder.batched_verification():
+                ...
+        """
+        return batched_verification()
+
     _const = lambda val: Const(val, types.Void)
 
     # __________________________________________________________________
     # IR constructors
 
     # Generated by pykit.utils._generate
+    Sqrt                 = _const(ops.Sqrt)
     Sin                  = _const(ops.Sin)
     Asin                 = _const(ops.Asin)
     Sinh                 = _const(ops.Sinh)
@@ -141,6 +172,7 @@ class OpBuilder(object):
     ptrstore             = _op(ops.ptrstore)
     ptrcast              = _op(ops.ptrcast)
     ptr_isnull           = _op(ops.ptr_isnull)
+    ptrfield             = _op(ops.ptrfield)
     ge                   = _op(ops.ge)
     getfield             = _op(ops.getfield)
     setfield             = _op(ops.setfield)
@@ -179,6 +211,7 @@ class OpBuilder(object):
     exc_matches          = _op(ops.exc_matches)
     store_tl_exc         = _op(ops.store_tl_exc)
     load_tl_exc          = _op(ops.load_tl_exc)
+    exc_unwind           = _op(ops.exc_unwind)
     gc_gotref            = _op(ops.gc_gotref)
     gc_giveref           = _op(ops.gc_giveref)
     gc_incref            = _op(ops.gc_incref)
@@ -199,9 +232,10 @@ class Builder(OpBuilder):
     Also provides convenience operations, such as loops, guards, etc.
     """
 
-    def __init__(self, func):
+    def __init__(self, func, folder=None):
         self.func = func
         self.module = func.module
+        self.folder = folder
         self._curblock = None
         self._lastop = None
 
@@ -293,28 +327,31 @@ class Builder(OpBuilder):
         Given an exception and an exception setup clause, generate
         exc_matches() checks
         """
-        catch_sites = [findop(block, 'exc_catch') for block in exc_setup.args]
+        catch_sites = [findop(block, 'exc_catch') for block in exc_setup.args[0]]
         for exc_catch in catch_sites:
-            for exc_type in exc_catch.args:
-                with self.if_(self.exc_matches(types.Bool, [exc, exc_type])):
+            for exc_type in exc_catch.args[0]:
+                matches = self.exc_matches(types.Bool, [exc, exc_type])
+                with self.if_(matches):
                     self.jump(exc_catch.block)
-                    block = self._curblock
-                self.position_at_end(block)
+                # Continue with the next check if it doesn't match
+                test, if_block, exit = matches.block.terminator.args
+                self.position_at_beginning(exit)
 
-    def gen_error_propagation(self, exc=None):
+    def gen_error_propagation(self, exc=None, exc_setup=None):
         """
         Propagate an exception. If `exc` is not given it will be loaded
-        to match in 'except' clauses.
+        to match in 'except' clauses. Exceptions not handled by the handlers
+        of `exc_setup` (by default those of the current block) are returned
+        to the caller.
         """
         assert self._curblock
 
         block = self._curblock
-        exc_setup = findop(block.leaders, 'exc_setup')
+        exc_setup = exc_setup or findop(block.leaders, 'exc_setup')
         if exc_setup:
             exc = exc or self.load_tl_exc(types.Exception)
             self._find_handler(exc, exc_setup)
-        else:
-            self.gen_ret_undef()
+        self.gen_ret_undef()
 
     def gen_ret_undef(self):
         """Generate a return with undefined value"""
@@ -438,3 +475,45 @@ class Builder(OpBuilder):
 
         self.position_at_beginning(body)
         return cond, body, exit
+
+    def gen_phi_loop(self, stop, body, inits=(), start=None, step=None,
+                     cmp='lt'):
+        """
+        Generate a loop in SSA form at the end of the current block:
+
+            for (i = start; cmp(i, stop); i += step)
+                values = body(builder, i, values)
+
+        The index and the loop-carried values (initially `inits`) are phis.
+        `body` emits the loop body and returns the next values. The
+        builder's position is set to the end of the exit block.
+
+        Returns (index, values, (condition_block, body_block, exit_block)).
+        """
+        ty = stop.type
+        start = start if start is not None else Const(0, ty)
+        step = step if step is not None else Const(1, ty)
+
+        entry = self._curblock
+        cond = self.func.new_block('cond', after=entry)
+        loop = self.func.new_block('body', after=cond)
+        exit = self.func.new_block('exit', after=loop)
+        self.jump(cond)
+
+        self.position_at_end(cond)
+        index = self.phi(ty, [[], []])
+        values = [self.phi(init.type, [[], []]) for init in inits]
+        self.cbranch(getattr(self, cmp)(types.Bool, [index, stop]), loop, exit)
+
+        self.position_at_end(loop)
+        nexts = body(self, index, values)
+        index_next = self.add(ty, [index, step])
+        latch = self._curblock
+        self.jump(cond)
+
+        index.set_args([[entry, latch], [start, index_next]])
+        for phi, init, next in zip(values, inits, nexts):
+            phi.set_args([[entry, latch], [init, next]])
+
+        self.position_at_end(exit)
+        return index, values, (cond, loop, exit)
@@ -19,6 +19,11 @@ from pykit.utils import invert, mergedicts
 # Python Version Compatibility
 #===------------------------------------------------------------------===
 
+try:
+    long
+except NameError:
+    long = int
+
 def divide(a, b):
     """
     `a / b` with python 2 semantics:
@@ -74,6 +79,7 @@ compare = {
 }
 
 math_funcs = {
+    ops.Sqrt        : np.sqrt,
     ops.Sin         : np.sin,
     ops.Asin        : np.arcsin,
     ops.Sinh        : np.sinh,
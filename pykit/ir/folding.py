@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+Folding at IR construction time. A Builder with a folder returns constants
+or existing values instead of emitting ops where it can:
+
+    b = Builder(func, folder=ConstantFolder())
+    b.add(Int32, [Const(2, Int32), Const(3, Int32)])   # Const(5, Int32)
+    b.mul(Int32, [x, Const(1, Int32)])                  # x
+
+Constants are evaluated with the definitions of pykit.ir.defs and wrapped
+to the result type. Folds that would depend on Python semantics differing
+from the target (negative integer division, division by zero, out of range
+shifts) are left to the code generator.
+"""
+
+from __future__ import print_function, division, absolute_import
+import math
+import ctypes
+
+from pykit import types
+from pykit.ir import ops, defs, Const, Struct
+
+int_identities = {
+    # opcode : (constant operand position(s), identity value)
+    ops.add:    ((0, 1), 0),
+    ops.sub:    ((1,),   0),
+    ops.mul:    ((0, 1), 1),
+    ops.div:    ((1,),   1),
+    ops.bitor:  ((0, 1), 0),
+    ops.bitxor: ((0, 1), 0),
+    ops.lshift: ((1,),   0),
+    ops.rshift: ((1,),   0),
+}
+
+def is_scalar(type):
+    type = types.resolve_typedef(type)
+    return type.is_bool or type.is_int or type.is_real
+
+def wrap(value, type):
+    """Convert a Python value to a value representable by scalar `type`"""
+    type = types.resolve_typedef(type)
+    if type.is_bool:
+        return bool(value)
+    elif type.is_int:
+        value = int(value) & ((1 << type.bits) - 1)
+        if not type.unsigned and value >= 1 << (type.bits - 1):
+            value -= 1 << type.bits
+        return value
+    elif type.bits == 32:
+        return ctypes.c_float(value).value
+    return float(value)
+
+def is_negative_zero(value):
+    return value == 0 and math.copysign(1, value) < 0
+
+class ConstantFolder(object):
+    """Fold constant operations and algebraic identities"""
+
+    def fold(self, opcode, type, args):
+        """Return a Value to use instead of the Op, or None"""
+        if opcode == ops.getfield:
+            return self.fold_getfield(type, *args)
+        elif opcode == ops.ptradd:
+            return self.fold_ptradd(type, *args)
+
+        if not all(isinstance(arg, Const) for arg in args):
+            if opcode in defs.binary or opcode in defs.compare:
+                return self.fold_identity(opcode, type, *args)
+            return None
+
+        if is_scalar(type) and all(is_scalar(arg.type) for arg in args):
+            value = self.evaluate(opcode, type, [arg.const for arg in args])
+            if value is not None:
+                return Const(wrap(value, type), type)
+
+    def evaluate(self, opcode, type, values):
+        """Evaluate a scalar operation on constant values, or return None"""
+        result_type = types.resolve_typedef(type)
+        if opcode == ops.convert:
+            [value] = values
+            if result_type.is_int and isinstance(value, float):
+                if math.isinf(value) or math.isnan(value):
+                    return None
+                return int(value) # truncates towards zero
+            return value
+        elif opcode in defs.unary:
+            if opcode == ops.invert and result_type.is_bool:
+                return None
+            return defs.unary[opcode](*values)
+        elif opcode in defs.compare and opcode not in (ops.is_, ops.contains):
+            return defs.compare[opcode](*values)
+        elif opcode in defs.binary:
+            a, b = values
+            is_int = not result_type.is_real
+            if opcode in (ops.div, ops.mod):
+                if b == 0 or (is_int or opcode == ops.mod) and (a < 0 or b < 0):
+                    return None
+            elif opcode in (ops.bitand, ops.bitor, ops.bitxor) and not is_int:
+                return None
+            elif opcode in (ops.lshift, ops.rshift):
+                if not result_type.is_int or not 0 <= b < result_type.bits:
+                    return None
+            if opcode == ops.div and not is_int:
+                return a / b
+            return defs.binary[opcode](a, b)
+
+    def fold_identity(self, opcode, type, a, b):
+        """x + 0 -> x, x * 0 -> 0, x - x -> 0, ..."""
+        result_type = types.resolve_typedef(type)
+        if a is b and types.resolve_typedef(a.type).is_int:
+            return self.fold_same(opcode, type, a)
+        elif result_type.is_int:
+            for pos, c, x in [(0, a, b), (1, b, a)]:
+                if not isinstance(c, Const) or x.type != type:
+                    continue
+                if opcode in int_identities:
+                    positions, identity = int_identities[opcode]
+                    if pos in positions and c.const == identity:
+                        return x
+                if opcode in (ops.mul, ops.bitand) and c.const == 0:
+                    return Const(0, type)
+                if opcode == ops.bitand and c.const == wrap(-1, type):
+                    return x
+        elif result_type.is_real and isinstance(b, Const) and a.type == type:
+            if opcode in (ops.mul, ops.div) and b.const == 1:
+                return a
+            elif opcode == ops.add and is_negative_zero(b.const):
+                return a
+            elif (opcode == ops.sub and b.const == 0 and
+                      not is_negative_zero(b.const)):
+                return a
+
+    def fold_same(self, opcode, type, x):
+        """Integer operations with identical operands"""
+        if opcode in (ops.bitand, ops.bitor) and x.type == type:
+            return x
+        elif opcode in (ops.sub, ops.bitxor):
+            return Const(0, type)
+        elif opcode in (ops.eq, ops.le, ops.ge):
+            return Const(True, type)
+        elif opcode in (ops.ne, ops.lt, ops.gt):
+            return Const(False, type)
+
+    def fold_getfield(self, type, struct, attr):
+        if isinstance(struct, Const) and isinstance(struct.const, Struct):
+            value = struct.const.values[struct.const.names.index(attr)]
+            if value.type == type:
+                return value
+
+    def fold_ptradd(self, type, ptr, offset):
+        if (isinstance(offset, Const) and offset.const == 0 and
+                ptr.type == type):
+            return ptr
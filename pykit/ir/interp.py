@@ -243,6 +243,13 @@ class Interp(object):
     def ptr_isnull(self, ptr):
         return ctypes.cast(ptr, ctypes.c_void_p).value == 0
 
+    def ptrfield(self, ptr, attr):
+        struct_type = types.resolve_typedef(self.op.args[0].type).base
+        index = struct_type.names.index(attr)
+        name, ctype = ptr._type_._fields_[index][:2]
+        addr = ctypes.addressof(ptr.contents) + getattr(ptr._type_, name).offset
+        return ctypes.cast(addr, ctypes.POINTER(ctype))
+
     def func_from_addr(self, ptr):
         type = self.op.type
         return ctypes.cast(ptr, types.to_ctypes(type))
@@ -305,6 +312,9 @@ class Interp(object):
         self.exception = exc
         self._propagate_exc() # Find exception handler
 
+    def exc_unwind(self):
+        self._propagate_exc()
+
     def _exc_match(self, exc_types):
         """
         See whether the current exception matches any of the exception types
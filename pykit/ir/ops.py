@@ -43,6 +43,7 @@ def op(name, *args):
 # IR Constants. Constants start with an uppercase letter
 
 # math
+Sqrt               = 'Sqrt'
 Sin                = 'Sin'
 Asin               = 'Asin'
 Sinh               = 'Sinh'
@@ -171,6 +172,7 @@ ptrload            = op('ptrload/v')          # expr pointer
 ptrstore           = op('ptrstore/vv')        # expr pointer, expr value
 ptrcast            = op('ptrcast/v')          # expr pointer
 ptr_isnull         = op('ptr_isnull/v')       # expr pointer
+ptrfield           = op('ptrfield/vo')        # expr pointer, str attr
 
 # ______________________________________________________________________
 # Attributes
@@ -252,6 +254,7 @@ addressof          = op('addressof/v')          # fn func
 exc_matches        = op('exc_matches/vv')       # expr exc, expr matcher
 store_tl_exc       = op('store_tl_exc/v')       # expr exc
 load_tl_exc        = op('load_tl_exc/')
+exc_unwind         = op('exc_unwind/')        # unwind with the pending exception
 
 # ______________________________________________________________________
 # Garbage collection
@@ -272,10 +275,11 @@ gc_dealloc         = op('gc_dealloc/v')       # expr value
 import fnmatch
 
 void_ops = (print, store, store_tl_exc, check_overflow, check_error,
-            exc_setup, exc_catch, jump, cbranch, exc_throw, ret, setfield)
+            exc_setup, exc_catch, jump, cbranch, exc_throw, exc_unwind, ret,
+            setfield)
 
 is_leader     = lambda x: x in (phi, exc_setup, exc_catch)
-is_terminator = lambda x: x in (jump, cbranch, exc_throw, ret)
+is_terminator = lambda x: x in (jump, cbranch, exc_throw, exc_unwind, ret)
 is_void       = lambda x: x in void_ops
 
 def oplist(pattern):
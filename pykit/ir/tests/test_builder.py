@@ -82,6 +82,18 @@ class TestBuilder(unittest.TestCase):
 
         self.assertEqual(interp.run(self.f, args=[10]), 100.0)
 
+    def test_phi_loop_builder(self):
+        # s = 0; for (i = 2; i < a; i += 3) s += i
+        const = partial(Const, type=types.Int32)
+        body = lambda b, i, values: [b.add(types.Int32, [values[0], i])]
+        i, [s], (cond, loop, exit) = self.b.gen_phi_loop(
+            self.a, body, [const(0)], const(2), const(3))
+        self.b.ret(self.b.convert(types.Float32, [s]))
+
+        self.assertEqual(opcodes(cond), ['phi', 'phi', 'lt', 'cbranch'])
+        self.assertEqual(opcodes(loop), ['add', 'add', 'jump'])
+        self.assertEqual(interp.run(self.f, args=[10]), 2 + 5 + 8)
+
     def test_splitblock_preserve_phis(self):
         """
         block1:
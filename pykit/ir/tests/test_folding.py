@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, ConstantFolder, Const, Struct, opcodes
+
+I, U8, F, B = types.Int32, types.UInt8, types.Float64, types.Bool
+
+def const(value, type=I):
+    return Const(value, type)
+
+class TestFolding(unittest.TestCase):
+
+    def setUp(self):
+        self.f = Function("testfunc", ['x', 'y'],
+                          types.Function(I, [I, F]))
+        self.b = Builder(self.f, folder=ConstantFolder())
+        self.b.position_at_end(self.f.new_block('entry'))
+        self.x, self.y = self.f.args
+
+    def assertConst(self, value, expected, type=I):
+        self.assertIsInstance(value, Const)
+        self.assertEqual(value.type, type)
+        self.assertEqual(value.const, expected)
+
+    def test_constants(self):
+        b = self.b
+        self.assertConst(b.add(I, [const(2), const(3)]), 5)
+        self.assertConst(b.mul(I, [b.add(I, [const(2), const(3)]), const(4)]),
+                         20)
+        self.assertConst(b.lt(B, [const(2), const(3)]), True, B)
+        self.assertConst(b.usub(I, [const(2)]), -2)
+        self.assertConst(b.div(F, [const(1, F), const(2, F)]), 0.5, F)
+        self.assertConst(b.convert(I, [const(-2.7, F)]), -2)
+        self.assertEqual(opcodes(self.f), [])
+
+    def test_wrap(self):
+        self.assertConst(self.b.add(U8, [const(255, U8), const(1, U8)]), 0, U8)
+        self.assertConst(self.b.mul(I, [const(2**30), const(4)]), 0)
+
+    def test_unfolded(self):
+        b = self.b
+        b.div(I, [const(-7), const(2)])     # Python rounds differently
+        b.div(I, [const(1), const(0)])
+        b.lshift(I, [const(1), const(32)])
+        self.assertEqual(opcodes(self.f), ['div', 'div', 'lshift'])
+
+    def test_identities(self):
+        b, x, y = self.b, self.x, self.y
+        self.assertIs(b.add(I, [const(0), x]), x)
+        self.assertIs(b.sub(I, [x, const(0)]), x)
+        self.assertIs(b.mul(I, [x, const(1)]), x)
+        self.assertIs(b.bitand(I, [x, const(-1)]), x)
+        self.assertIs(b.mul(F, [y, const(1.0, F)]), y)
+        self.assertConst(b.mul(I, [x, const(0)]), 0)
+        self.assertConst(b.sub(I, [x, x]), 0)
+        self.assertConst(b.eq(B, [x, x]), True, B)
+        self.assertEqual(opcodes(self.f), [])
+
+    def test_not_identities(self):
+        b, x, y = self.b, self.x, self.y
+        b.sub(I, [const(0), x])
+        b.add(F, [y, const(0.0, F)])        # -0.0 + 0.0 is 0.0
+        b.mul(F, [y, const(0.0, F)])        # NaN * 0.0 is NaN
+        b.sub(F, [y, y])
+        self.assertEqual(opcodes(self.f), ['sub', 'add', 'mul', 'sub'])
+
+    def test_getfield(self):
+        S = types.Struct(['a', 'b'], [I, F])
+        value = Struct(['a', 'b'], [const(1), const(2.0, F)])
+        self.assertConst(self.b.getfield(F, [Const(value, S), 'b']), 2.0, F)
+
+    def test_no_folder(self):
+        b = Builder(self.f)
+        b.position_at_end(self.f.startblock)
+        b.add(I, [const(2), const(3)])
+        self.assertEqual(opcodes(self.f), ['add'])
+
+
+if __name__ == '__main__':
+    unittest.main()
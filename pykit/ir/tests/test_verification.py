@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types, pipeline
+from pykit.ir import Function, Builder, Const, opcodes
+from pykit.ir.verification import batched_verification
+
+I = types.Int32
+
+class TestBatchedVerification(unittest.TestCase):
+
+    def setUp(self):
+        self.f = Function("testfunc", ['x'], types.Function(I, [I]))
+        self.b = Builder(self.f)
+        self.b.position_at_end(self.f.new_block('entry'))
+        self.x, = self.f.args
+
+    def error(self, build):
+        try:
+            build()
+        except AssertionError as e:
+            return e.args
+        self.fail("No verification error")
+
+    def test_batched(self):
+        b, x = self.b, self.x
+        with b.batched_verification() as batch:
+            y = b.add(I, [x, Const(1, I)])
+            b.ret(b.mul(I, [y, y]))
+            self.assertEqual(len(batch), 3)
+        self.assertEqual(opcodes(self.f), ['add', 'mul', 'ret'])
+
+    def test_deferred_error(self):
+        eager = self.error(lambda: self.b.add(I, [self.x])) # still emitted
+
+        def build():
+            with batched_verification():
+                self.b.add(I, [self.x, self.x])
+                self.b.add(I, [self.x])
+                self.assertEqual(opcodes(self.f), ['add', 'add', 'add'])
+        batched = self.error(build)
+        self.assertEqual(str(batched[0][1]), str(eager[0][1]))
+
+    def test_nested(self):
+        with batched_verification() as outer:
+            self.b.add(I, [self.x, self.x])
+            with batched_verification() as inner:
+                self.b.add(I, [self.x, self.x])
+            self.assertEqual((len(outer), len(inner)), (1, 1))
+
+    def test_pass(self):
+        def transform(func, env):
+            self.b.add(I, [self.x])
+            self.assertEqual(opcodes(func), ['add'])
+        self.error(lambda: pipeline.apply_transform(transform, self.f, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
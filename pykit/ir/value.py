@@ -126,8 +126,8 @@ class Function(Value):
 
     def new_block(self, label, ops=None, after=None):
         """Create a new block with name `label` and append it"""
-        assert label not in self.blockmap, label
         label = self.temp(label)
+        assert label not in self.blockmap, label
         return self.add_block(Block(label, self, ops), after)
 
     def add_block(self, block, after=None):
@@ -262,7 +262,7 @@ class Block(Value):
         """
         Return an iterator of basic block leaders
         """
-        for op in self.ops:
+        for op in self.ops.iter_inplace():
             if ops.is_leader(op.opcode):
                 yield op
             else:
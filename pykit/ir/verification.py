@@ -6,6 +6,9 @@ Verify the validity of pykit IR.
 
 from __future__ import print_function, division, absolute_import
 import functools
+import threading
+import collections
+from contextlib import contextmanager
 
 from pykit.types import (Boolean, Integral, Real, Struct, Pointer, Function,
                          VoidT, resolve_typedef)
@@ -48,18 +51,46 @@ def verify(value, env=None):
     return value, env
 
 def op_verifier(func):
-    """Verifying decorator for functions return a new (list of) Op"""
+    """
+    Verifying decorator for functions return a new (list of) Op. Inside
+    batched_verification() the ops are verified when the batch ends.
+    """
     @functools.wraps(func)
     def wrapper(*a, **kw):
         op = func(*a, **kw)
         if not isinstance(op, list):
             op = [op]
+        batches = getattr(_batches, 'stack', None)
+        if batches:
+            batches[-1].extend(op)
+            return op[-1]
         for op in op:
             verify_op_syntax(op)
         return op
 
     return wrapper
 
+_batches = threading.local() # stack of [Op] with deferred verification
+
+@contextmanager
+def batched_verification():
+    """
+    Defer the verification of ops built in this context by op_verifier()
+    and verify them all at once when the context exits without error:
+
+        with batched_verification():
+            ...build ops...
+    """
+    if not hasattr(_batches, 'stack'):
+        _batches.stack = []
+    batch = []
+    _batches.stack.append(batch)
+    try:
+        yield batch
+    finally:
+        _batches.stack.pop()
+    verify_ops_syntax(batch)
+
 #===------------------------------------------------------------------===
 # Internal verification
 #===------------------------------------------------------------------===
@@ -122,6 +153,46 @@ def verify_operation(op):
     assert op.result is not None, op
     verify_op_syntax(op)
 
+_syntax_types = {
+    ops.List:  list,
+    ops.Const: Constant,
+    ops.Value: Value,
+    ops.Any:   (Value, list),
+    ops.Obj:   object,
+}
+
+def verify_ops_syntax(oplist):
+    """
+    Verify the syntax of many Ops, looking up the syntax once per opcode.
+    Failures are reported by verify_op_syntax().
+    """
+    groups = collections.defaultdict(list)
+    for op in oplist:
+        groups[op.opcode].append(op)
+
+    for opcode, group in groups.items():
+        if opcode not in ops.op_syntax:
+            continue
+        syntax = ops.op_syntax[opcode]
+        vararg = syntax and syntax[-1] == ops.Star
+        if vararg:
+            syntax = syntax[:-1]
+        if any(expected not in _syntax_types for expected in syntax):
+            invalid = group # let verify_op_syntax() report it
+        else:
+            nargs = len(syntax)
+            if vararg:
+                invalid = [op for op in group if len(op.args) < nargs]
+            else:
+                invalid = [op for op in group if len(op.args) != nargs]
+            for i, expected in enumerate(syntax):
+                argtype = _syntax_types[expected]
+                if argtype is not object:
+                    invalid.extend(op for op in group if len(op.args) > i and
+                                       not isinstance(op.args[i], argtype))
+        for op in invalid:
+            verify_op_syntax(op)
+
 def verify_op_syntax(op):
     """
     Verify the syntactic structure of the Op (arity, List/Value/Const, etc)
@@ -194,6 +265,11 @@ class LowLevelVerifier(object):
         struct, attr, value = op.args
         assert struct.type.is_struct
 
+    def op_ptrfield(self, op):
+        ptr, attr = op.args
+        assert ptr.type.is_pointer and ptr.type.base.is_struct
+        assert op.type.is_pointer
+
 
 def verify_lowlevel(func):
     """
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lower dynamic memory allocation to the allocator runtime
+(pykit.runtime.allocator):
+
+    p = gc_alloc(n)         -->   p = ptrcast(call(pykit_alloc, [n * sizeof(T)]))
+    p = new_data(size)      -->   p = ptrcast(call(pykit_alloc, [size]))
+    gc_dealloc(p)           -->   call(pykit_free, [ptrcast(p)])
+
+where gc_alloc allocates n items of type T for a result of type T *, and
+new_data allocates size bytes.
+
+With env["lower.allocator"] set to "arena", allocations that do not
+escape the function are served from an arena created on entry, which is
+freed with everything allocated from it on every exit:
+
+    arena = call(pykit_arena_new, [])
+    p = ptrcast(call(pykit_arena_alloc, [arena, size]))
+    ...
+    call(pykit_arena_free, [arena])
+    ret(x)                              # or exc_throw, exc_unwind
+
+This runs after lower_errcheck, so that the error paths are explicit. With
+zero-cost exceptions, calls to pykit functions that may unwind through the
+function get a cleanup landing pad freeing the arena:
+
+    exc_setup([cleanup])
+    call(f, args)       # "exc.landingpad": cleanup
+    ...
+cleanup:
+    call(pykit_arena_free, [arena])
+    exc_unwind()
+
+gc_dealloc of arena allocations is removed. Allocations that escape
+(returned, stored, passed to calls, merged through phis, ...) use the pool,
+and so do allocations in loops, which would otherwise accumulate in the
+arena until the function returns.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit import types
+from pykit.analysis import loop_detection
+from pykit.ir import (ops, Op, Function, Builder, Undef, ConstantFolder,
+                      findop)
+from pykit.runtime import allocator
+
+allocations = (ops.gc_alloc, ops.new_data)
+
+def escapes(func, value):
+    """Whether pointer `value` may outlive the function activation"""
+    for use in func.uses[value]:
+        if use.opcode in (ops.ptrload, ops.ptr_isnull, ops.gc_dealloc,
+                          ops.getfield, ops.getindex):
+            continue
+        elif use.opcode == ops.ptrstore and use.args[1] is not value:
+            continue
+        elif (use.opcode in (ops.setfield, ops.setindex) and
+                  use.args[-1] is not value):
+            continue
+        elif (use.opcode in (ops.ptradd, ops.ptrcast) and
+                  use.args[0] is value and not escapes(func, use)):
+            continue
+        return True
+    return False
+
+def allocation(value):
+    """The pointer `value` is derived from through ptrcasts"""
+    while isinstance(value, Op) and value.opcode == ops.ptrcast:
+        value = value.args[0]
+    return value
+
+def allocation_size(builder, op):
+    """Size in bytes of allocation `op`"""
+    [n] = op.args
+    n = builder.convert(types.Int64, [n])
+    if op.opcode == ops.new_data:
+        return n
+    itemsize = builder.sizeof(types.Int64, [Undef(op.type.base)])
+    return builder.mul(types.Int64, [n, itemsize])
+
+class AllocationLowering(object):
+
+    def __init__(self, func, arena=False, unwind=False):
+        self.func = func
+        self.builder = Builder(func, folder=ConstantFolder())
+        self.arena = arena
+        self.unwind = unwind # whether calls may unwind (zero-cost exceptions)
+        self.symbols = {}
+
+    def call(self, name, args):
+        if name not in self.symbols:
+            self.symbols[name] = allocator.declare(name)
+        gv = self.symbols[name]
+        return self.builder.call(gv.type.restype, [gv, args])
+
+    def lower(self):
+        func = self.func
+        allocs = [op for op in func.ops if op.opcode in allocations]
+        local = set()
+        if self.arena and allocs:
+            loops = loop_detection.find_loops(func)
+            local = set(op for op in allocs
+                            if not loops.depth(op.block) and
+                               not escapes(func, op))
+
+        arena = None
+        if local:
+            arena = self.new_arena()
+
+        for op in func.ops:
+            if op.opcode == ops.gc_dealloc:
+                self.lower_dealloc(op, local)
+        for op in allocs:
+            self.lower_alloc(op, arena if op in local else None)
+
+    def new_arena(self):
+        """Create the arena on entry and free it on each exit"""
+        b = self.builder
+        entry = self.func.startblock
+        leaders = list(entry.leaders)
+        if leaders:
+            b.position_after(leaders[-1])
+        else:
+            b.position_at_beginning(entry)
+        arena = self.call('pykit_arena_new', [])
+
+        for op in self.func.ops:
+            if exits(op):
+                b.position_before(op)
+                self.call('pykit_arena_free', [arena])
+        if self.unwind:
+            self.cleanup(arena)
+        return arena
+
+    def cleanup(self, arena):
+        """Free the arena when unwinding through calls without landing pad"""
+        calls = [op for op in self.func.ops
+                     if op.opcode == ops.call and
+                        isinstance(op.args[0], Function) and
+                        not (op.metadata and 'exc.landingpad' in op.metadata)]
+        if not calls:
+            return
+
+        b = self.builder
+        cleanup = self.func.new_block("cleanup")
+        b.position_at_end(cleanup)
+        self.call('pykit_arena_free', [arena])
+        b.exc_unwind()
+
+        for block in set(op.block for op in calls):
+            # Blocks with handlers have landing pads for their calls
+            if findop(block.leaders, 'exc_setup') is None:
+                leaders = list(block.leaders)
+                if leaders:
+                    b.position_after(leaders[-1])
+                else:
+                    b.position_at_beginning(block)
+                b.exc_setup([cleanup])
+        for op in calls:
+            op.add_metadata({'exc.landingpad': cleanup})
+
+    def lower_alloc(self, op, arena):
+        b = self.builder
+        b.position_before(op)
+        size = allocation_size(b, op)
+        if arena is not None:
+            p = self.call('pykit_arena_alloc', [arena, size])
+        else:
+            p = self.call('pykit_alloc', [size])
+        op.replace_op(ops.ptrcast, [p])
+
+    def lower_dealloc(self, op, local):
+        [p] = op.args
+        if allocation(p) not in local:
+            self.builder.position_before(op)
+            p = self.builder.ptrcast(allocator.void_p, [p])
+            self.call('pykit_free', [p])
+        op.delete()
+
+
+def exits(op):
+    """Whether `op` leaves the function"""
+    if op.opcode == ops.exc_throw:
+        # Thrown exceptions may be caught by the handlers of the block
+        return findop(op.block.leaders, 'exc_setup') is None
+    return op.opcode in (ops.ret, ops.exc_unwind)
+
+def lower_alloc(func, env=None):
+    """Lower allocations with the allocator of the environment"""
+    env = env or {}
+    mode = env.get("lower.allocator", "pool")
+    assert mode in ("pool", "arena"), mode
+    unwind = env.get("lower.exceptions", "costful") == "zerocost"
+    AllocationLowering(func, arena=(mode == "arena"), unwind=unwind).lower()
+
+run = lower_alloc
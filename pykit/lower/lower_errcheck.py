@@ -2,10 +2,34 @@
 
 """
 Lower exception-related instructions.
+
+The exception model is pluggable, selected by env["lower.exceptions"]
+(a name in `exception_models` or a lowering function):
+
+    costful:    error return codes, every check_error is a compare and
+                branch on the hot path
+    zerocost:   table-driven unwinding. Calls to pykit functions are not
+                checked at all: the callee unwinds the stack on error, and
+                calls inside a try block become invokes whose landing pad
+                dispatches to the handlers. Only values following the
+                error return convention (e.g. from external functions) are
+                checked, and an error starts unwinding (exc_unwind).
+                Only the llvmlite code generator translates this model.
+
+Error paths are marked cold with the "exc.cold" metadata on the branch
+leading to them (the true branch), for the code generators.
 """
 
-from pykit import types
-from pykit.ir import visit, FunctionPass
+from pykit import types, error
+from pykit.ir import visit, findop, FunctionPass, Function, Op
+
+def mark_cold(branch):
+    """Mark the true branch of `branch` as an unlikely error path"""
+    branch.add_metadata({'exc.cold': True})
+
+def handlers(block):
+    """The exc_setup of a block, or None"""
+    return findop(block.leaders, 'exc_setup')
 
 class LowerExceptionChecksCostful(FunctionPass):
     """
@@ -19,12 +43,101 @@ class LowerExceptionChecksCostful(FunctionPass):
         result, badval = op.args
         self.builder.position_after(op)
 
-        with self.builder.if_(self.builder.eq(types.Bool, [result, badval])):
-            self.builder.gen_error_propagation()
+        cond = self.builder.eq(types.Bool, [result, badval])
+        with self.builder.if_(cond):
+            mark_cold(cond.block.terminator)
+            self.builder.gen_error_propagation(exc_setup=handlers(op.block))
+
+        op.delete()
+
+class LowerExceptionChecksZeroCost(FunctionPass):
+    """
+    Lower exception checks (check_error) for unwinding:
+
+        call(f, args)                       call(f, args)   # no check
+        check_error(result, bad)
+
+    inside a try block:
+
+        exc_setup([handlers])               exc_setup([landingpad])
+        call(f, args)               -->     call(f, args)   # invoke
+        check_error(result, bad)            jump(cont)
+                                        landingpad:
+                                            exc_matches(...) -> handlers
+                                        cont:
+                                            exc_setup([handlers])
+
+    The call gets the landing pad as "exc.landingpad" metadata. Values that
+    are not the result of a call to a pykit function are checked:
+
+        if (result == bad)
+            exc_unwind();       # or dispatch to the handlers in a try block
+    """
+
+    def op_check_error(self, op):
+        result, badval = op.args
+        exc_setup = handlers(op.block)
+
+        if isinstance(result, Op) and result.opcode == 'call' and \
+                isinstance(result.args[0], Function):
+            if exc_setup:
+                self.invoke(result, exc_setup)
+        else:
+            self.builder.position_after(op)
+            cond = self.builder.eq(types.Bool, [result, badval])
+            with self.builder.if_(cond):
+                mark_cold(cond.block.terminator)
+                self.unwind(exc_setup)
 
         op.delete()
 
+    def unwind(self, exc_setup):
+        """Dispatch to the handlers, keep unwinding if none matches"""
+        if exc_setup:
+            exc = self.builder.load_tl_exc(types.Exception)
+            self.builder._find_handler(exc, exc_setup)
+        self.builder.exc_unwind()
+
+    def invoke(self, call, exc_setup):
+        """Unwind from `call` to a landing pad dispatching to the handlers"""
+        self.builder.position_after(call)
+        block, cont = self.builder.splitblock(terminate=True)
+
+        # The continuation is still covered by the handlers
+        self.builder.position_at_beginning(cont)
+        self.builder.exc_setup(list(exc_setup.args[0]))
+
+        landingpad = self.func.new_block("landingpad", after=block)
+        self.builder.position_at_end(landingpad)
+        self.unwind(exc_setup)
+
+        exc_setup.set_args([[landingpad]])
+        call.add_metadata({'exc.landingpad': landingpad})
+
 def lower_costful(func, env=None):
     visit(LowerExceptionChecksCostful(func), func)
 
-run = lower_costful
\ No newline at end of file
+def lower_zerocost(func, env=None):
+    visit(LowerExceptionChecksZeroCost(func), func)
+
+exception_models = {
+    'costful': lower_costful,
+    'zerocost': lower_zerocost,
+}
+
+def check_model(model, codegen):
+    """Reject exception models the code generator cannot translate"""
+    supported = getattr(codegen, "exception_models", None)
+    if supported is not None and model not in supported:
+        raise error.CompileError(
+            "Exception model %r is not supported by %s (supported: %s)" % (
+                model, codegen.__name__, ", ".join(supported)))
+
+def run(func, env=None):
+    """Lower exception checks with the exception model of the environment"""
+    env = env or {}
+    model = env.get("lower.exceptions", "costful")
+    if not callable(model):
+        check_model(model, env.get("codegen.impl"))
+        model = exception_models[model]
+    model(func, env)
@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 
 """
-Rewrite field accesses on pointers.
+Rewrite field accesses on pointers to a field address computation and a
+scalar load or store, instead of copying the whole struct:
+
+    x = getfield(p, 'a')        -->     x = ptrload(ptrfield(p, 'a'))
+    setfield(p, 'a', x)         -->     ptrstore(ptrfield(p, 'a'), x)
 """
 
-from pykit.ir import Builder
+from pykit import types
+from pykit.ir import Builder, ops
 
 def lower_fields(func, env=None):
     b = Builder(func)
@@ -12,13 +17,14 @@ def lower_fields(func, env=None):
     for op in func.ops:
         if op.opcode in ("getfield", "setfield") and op.args[0].type.is_pointer:
             b.position_before(op)
-            p = op.args[0]
-            load = b.load(p.type.base, [p])
-            args = [load] + op.args[1:]
-            op.set_args(args)
+            p, attr = op.args[:2]
+            struct = types.resolve_typedef(p.type.base)
+            type = struct.types[struct.names.index(attr)]
+            field = b.ptrfield(types.Pointer(type), [p, attr])
 
-            if op.opcode == "setfield":
-                b.position_after(op)
-                b.store(op, p)
+            if op.opcode == "getfield":
+                op.replace_op(ops.ptrload, [field])
+            else:
+                op.replace_op(ops.ptrstore, [field, op.args[2]], types.Void)
 
-run = lower_fields
\ No newline at end of file
+run = lower_fields
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import os
+import unittest
+
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+
+from pykit import environment, pipeline, types
+from pykit.ir import Function, Builder, Const, opcodes, verify
+from pykit.lower import lower_alloc
+from pykit.tests import build_loop
+
+I = types.Int64
+P = types.Pointer(I)
+
+def make_alloc(escape=False):
+    """p = gc_alloc(n); p[0] = n; p[1] = 5; return p[0] + p[1]"""
+    func = Function("f", ['n'], types.Function(P if escape else I, [I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    n, = func.args
+    p = b.gc_alloc(P, [n])
+    q = b.ptradd(P, [p, Const(1, I)])
+    b.ptrstore(types.Void, [p, n])
+    b.ptrstore(types.Void, [q, Const(5, I)])
+    if escape:
+        b.ret(p)
+    else:
+        result = b.add(I, [b.ptrload(I, [p]), b.ptrload(I, [q])])
+        b.gc_dealloc(types.Void, [p])
+        b.ret(result)
+    return func
+
+def make_raising():
+    """g(x) raises when x == 7, f(n) allocates and returns g(n)"""
+    g = Function("g", ['x'], types.Function(I, [I]))
+    b = Builder(g)
+    b.position_at_end(g.new_block("entry"))
+    x, = g.args
+    b.check_error(x, Const(7, I))
+    b.ret(b.add(I, [x, Const(1, I)]))
+
+    f = Function("f", ['n'], types.Function(I, [I]))
+    b = Builder(f)
+    b.position_at_end(f.new_block("entry"))
+    n, = f.args
+    p = b.gc_alloc(P, [n])
+    b.ptrstore(types.Void, [p, n])
+    result = b.call(I, [g, [b.ptrload(I, [p])]])
+    b.check_error(result, Const(-1, I))
+    b.gc_dealloc(types.Void, [p])
+    b.ret(result)
+    return f, g
+
+def allocate(b, i):
+    """Loop term allocating, using and freeing a buffer (see build_loop)"""
+    p = b.gc_alloc(P, [Const(1, I)])
+    b.ptrstore(types.Void, [p, i])
+    value = b.ptrload(I, [p])
+    b.gc_dealloc(types.Void, [p])
+    return value
+
+def callees(func):
+    return [op.args[0].name for op in func.ops if op.opcode == 'call']
+
+def exits(func):
+    return [op for op in func.ops
+                if op.opcode in ('ret', 'exc_throw', 'exc_unwind')]
+
+def frees_arena(op):
+    """Whether `op` is preceded by a call to pykit_arena_free"""
+    ops = list(op.block.ops)
+    i = ops.index(op)
+    return (i > 0 and ops[i - 1].opcode == 'call' and
+            ops[i - 1].args[0].name == 'pykit_arena_free')
+
+@unittest.skipIf(not which(os.environ.get('CC', 'cc')), "no C compiler")
+class TestLowerAlloc(unittest.TestCase):
+
+    def test_pool(self):
+        func = make_alloc()
+        lower_alloc.run(func, {"lower.allocator": "pool"})
+        verify(func)
+        self.assertEqual(callees(func), ['pykit_alloc', 'pykit_free'])
+        self.assertNotIn('gc_alloc', opcodes(func))
+        self.assertNotIn('gc_dealloc', opcodes(func))
+
+    def test_arena(self):
+        func = make_alloc()
+        lower_alloc.run(func, {"lower.allocator": "arena"})
+        verify(func)
+        self.assertEqual(callees(func), ['pykit_arena_new', 'pykit_arena_alloc',
+                                         'pykit_arena_free'])
+        self.assertEqual(opcodes(func)[-2:], ['call', 'ret'])
+
+    def test_arena_escaping(self):
+        func = make_alloc(escape=True)
+        lower_alloc.run(func, {"lower.allocator": "arena"})
+        self.assertEqual(callees(func), ['pykit_alloc'])
+
+    def test_arena_loop(self):
+        func, _, _ = build_loop(allocate, type=I)
+        lower_alloc.run(func, {"lower.allocator": "arena"})
+        verify(func)
+        self.assertEqual(callees(func), ['pykit_alloc', 'pykit_free'])
+
+    def lower(self, func, exceptions):
+        env = environment.fresh_env()
+        env["lower.allocator"] = "arena"
+        env["lower.exceptions"] = exceptions
+        pipeline.lower(func, env)
+        verify(func)
+
+    def test_arena_error_return(self):
+        f, g = make_raising()
+        self.lower(f, "costful")
+        self.assertEqual(len(exits(f)), 2)
+        for op in exits(f):
+            self.assertTrue(frees_arena(op), op)
+
+    def test_arena_unwind(self):
+        f, g = make_raising()
+        self.lower(f, "zerocost")
+        [call] = [op for op in f.ops
+                      if op.opcode == 'call' and op.args[0] is g]
+        cleanup = call.metadata['exc.landingpad']
+        self.assertEqual(opcodes(cleanup), ['call', 'exc_unwind'])
+        for op in exits(f):
+            self.assertTrue(frees_arena(op), op)
+
+    def test_execute_unwind(self):
+        try:
+            from pykit.codegen import llvmlite as codegen
+        except ImportError:
+            raise unittest.SkipTest("llvmlite is not installed")
+        env = environment.fresh_env()
+        env["codegen.cache"] = {}
+        env["lower.allocator"] = "arena"
+        env["lower.exceptions"] = "zerocost"
+        codegen.install(env)
+        f, g = make_raising()
+        pipeline.lower(g, env)
+        pipeline.lower(f, env)
+        lfunc, env = pipeline.codegen(f, env)
+        codegen.verify(lfunc, env)
+        self.assertEqual(codegen.execute(lfunc, env, 3), 4)
+        # The arena is freed by the cleanup, unwinding stops at the entry
+        self.assertEqual(codegen.execute(lfunc, env, 7), 0)
+
+    def test_execute(self):
+        from pykit.codegen import c as codegen
+        for mode in ("pool", "arena"):
+            env = environment.fresh_env()
+            env["codegen.cache"] = {}
+            env["lower.allocator"] = mode
+            codegen.install(env)
+            func = make_alloc()
+            pipeline.lower(func, env)
+            cfunc, env = pipeline.codegen(func, env)
+            self.assertEqual(codegen.execute(cfunc, env, 10), 15)
+
+            func, _, _ = build_loop(allocate, name="g", type=I)
+            pipeline.lower(func, env)
+            cfunc, env = pipeline.codegen(func, env)
+            self.assertEqual(codegen.execute(cfunc, env, 10), 45)
+
+
+if __name__ == '__main__':
+    unittest.main()
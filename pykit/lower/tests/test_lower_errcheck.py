@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import
 from pykit.tests import *
+from pykit import error
 from pykit.lower import lower_errcheck
 
 class TestExcCheckLowering(SourceTestCase):
@@ -18,4 +19,64 @@ class TestExcCheckLowering(SourceTestCase):
         lower_errcheck.lower_costful(self.f)
         self.eq(findop(self.f, 'ret').args[0], Undef(types.Float32))
         self.eq(opcodes(self.f)[:3], ['eq', 'cbranch', 'ret'])
-        assert not findop(self.f, 'check_error')
\ No newline at end of file
+        assert not findop(self.f, 'check_error')
+
+I = types.Int32
+
+def make_call(handler=False):
+    """f(x) = g(x) + 1, with g(x) raising when x == -1"""
+    g = Function("g", ['x'], types.Function(I, [I]))
+    b = Builder(g)
+    b.position_at_end(g.new_block("entry"))
+    x, = g.args
+    b.check_error(x, Const(-1, I))
+    b.ret(x)
+
+    f = Function("f", ['x'], types.Function(I, [I]))
+    b = Builder(f)
+    entry = f.new_block("entry")
+    b.position_at_end(entry)
+    if handler:
+        handler_block = f.new_block("handler")
+        b.exc_setup([handler_block])
+    result = b.call(I, [g, f.args])
+    b.check_error(result, Const(-1, I))
+    b.ret(b.add(I, [result, Const(1, I)]))
+    if handler:
+        b.position_at_end(handler_block)
+        b.exc_catch([Const(Exception, types.Exception)])
+        b.ret(Const(0, I))
+    return f, g
+
+class TestZeroCostLowering(unittest.TestCase):
+
+    def test_model_from_env(self):
+        f, g = make_call()
+        lower_errcheck.run(f, {"lower.exceptions": "zerocost"})
+        self.assertEqual(opcodes(f), ['call', 'add', 'ret'])
+
+    def test_unsupported_model(self):
+        from pykit.codegen.c import c_codegen
+        f, g = make_call()
+        env = {"lower.exceptions": "zerocost", "codegen.impl": c_codegen}
+        self.assertRaises(error.CompileError, lower_errcheck.run, f, env)
+        self.assertTrue(findop(f, 'check_error'))
+
+    def test_unwind(self):
+        f, g = make_call()
+        lower_errcheck.lower_zerocost(g)
+        self.assertEqual(opcodes(g), ['eq', 'cbranch', 'exc_unwind', 'ret'])
+        cbranch = findop(g, 'cbranch')
+        self.assertTrue(cbranch.metadata['exc.cold'])
+
+    def test_invoke(self):
+        f, g = make_call(handler=True)
+        lower_errcheck.lower_zerocost(f)
+        call = findop(f, 'call')
+        landingpad = call.metadata['exc.landingpad']
+        self.assertEqual(findop(f, 'exc_setup').args[0], [landingpad])
+        self.assertEqual(opcodes(landingpad),
+                         ['load_tl_exc', 'exc_matches', 'cbranch'])
+        self.assertIn('exc_unwind', opcodes(f))
+        self.assertFalse(findop(f, 'check_error'))
+        verify(f)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import ctypes
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, opcodes, verify, interp
+from pykit.lower import lower_fields
+
+I = types.Int64
+S = types.Struct(['a', 'b'], [types.Int32, I])
+P = types.Pointer(S)
+
+class CStruct(ctypes.Structure):
+    _fields_ = [('f0', ctypes.c_int32), ('f1', ctypes.c_int64)]
+
+def build():
+    """p.b = x; return p.b + p.a"""
+    func = Function("foo", ['p', 'x'], types.Function(I, [P, I]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    p, x = func.args
+    b.setfield(p, 'b', x)
+    a = b.convert(I, [b.getfield(types.Int32, [p, 'a'])])
+    b.ret(b.add(I, [b.getfield(I, [p, 'b']), a]))
+    return func
+
+class TestLowerFields(unittest.TestCase):
+
+    def test_lower_fields(self):
+        func = build()
+        lower_fields.run(func)
+        verify(func)
+        self.assertEqual(opcodes(func), [
+            'ptrfield', 'ptrstore', 'ptrfield', 'ptrload', 'convert',
+            'ptrfield', 'ptrload', 'add', 'ret'])
+
+        fields = [op for op in func.ops if op.opcode == 'ptrfield']
+        self.assertEqual([op.args[1] for op in fields], ['b', 'a', 'b'])
+        self.assertEqual([op.type for op in fields],
+                         [types.Pointer(I), types.Pointer(types.Int32),
+                          types.Pointer(I)])
+
+    def test_interp(self):
+        func = build()
+        lower_fields.run(func)
+        struct = CStruct(3, 0)
+        result = interp.run(func, args=[ctypes.pointer(struct), 10])
+        self.assertEqual(result, 13)
+        self.assertEqual(struct.f1, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+Array-of-structs to struct-of-arrays transformation. An array of structs
+that is only accessed field by field is split into one array per field, so
+that loops touching a single field access contiguous memory:
+
+    p = gc_alloc(n)                         p_x = gc_alloc(n)
+                                            p_y = gc_alloc(n)
+    e = getindex(p, [i])        -->
+    x = getfield(e, 'x')                    x = ptrload(getindex(p_x, [i]))
+    setfield(e, 'y', v)                     ptrstore(getindex(p_y, [i]), v)
+    gc_dealloc(p)                           gc_dealloc(p_x); gc_dealloc(p_y)
+
+where p is a { x, y } *. The array must not escape: every use is a
+getindex with a single index whose element pointer is only used by
+getfield and setfield, or a gc_dealloc. Only arrays accessed in a loop
+are transformed.
+
+This pass is not part of the default pipeline, add "passes.aos_to_soa" to
+env["pipeline.optimize"] to enable it.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit import types
+from pykit.analysis import loop_detection
+from pykit.ir import ops, Builder
+
+def is_field_access(op, element):
+    return (op.opcode == ops.getfield or
+            (op.opcode == ops.setfield and op.args[2] is not element))
+
+def is_element(func, op, array):
+    """Whether `op` is an element pointer of `array` used field-wise"""
+    return (op.opcode == ops.getindex and op.args[0] is array and
+            len(op.args[1]) == 1 and
+            all(is_field_access(use, op) for use in func.uses[op]))
+
+def candidates(func, loops):
+    """Arrays of structs that can be split"""
+    for op in func.ops:
+        if op.opcode != ops.gc_alloc or not op.type.base.is_struct:
+            continue
+        uses = func.uses[op]
+        elements = [use for use in uses if use.opcode == ops.getindex]
+        if (all(is_element(func, use, op) or use.opcode == ops.gc_dealloc
+                    for use in uses) and
+                any(loops.depth(use.block) for use in elements)):
+            yield op
+
+def split(func, array):
+    """Split `array` into one array per field"""
+    b = Builder(func)
+    struct = array.type.base
+
+    b.position_before(array)
+    [n] = array.args
+    arrays = dict((name, b.gc_alloc(types.Pointer(type), [n]))
+                      for name, type in zip(struct.names, struct.types))
+
+    for use in list(func.uses[array]):
+        if use.opcode == ops.gc_dealloc:
+            b.position_before(use)
+            for name in struct.names:
+                b.gc_dealloc(types.Void, [arrays[name]])
+            use.delete()
+            continue
+
+        [index] = use.args[1]
+        for access in list(func.uses[use]):
+            name = access.args[1]
+            b.position_before(access)
+            field = arrays[name]
+            pointer = b.getindex(field.type, [field, [index]])
+            if access.opcode == ops.getfield:
+                access.replace_op(ops.ptrload, [pointer])
+            else:
+                access.replace_op(ops.ptrstore, [pointer, access.args[2]],
+                                  types.Void)
+        use.delete()
+
+    array.delete()
+
+def aos_to_soa(func):
+    """Split arrays of structs, return the number of arrays split"""
+    loops = loop_detection.find_loops(func)
+    arrays = list(candidates(func, loops))
+    for array in arrays:
+        split(func, array)
+    return len(arrays)
+
+def run(func, env=None):
+    aos_to_soa(func)
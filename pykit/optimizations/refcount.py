@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reference count optimization. Removes redundant gc_incref/gc_decref pairs:
+
+    gc_incref(x)                            # removed
+    y = getfield(x, 'a')        -->         y = getfield(x, 'a')
+    gc_decref(x)                            # removed
+
+A pair on the same value is cancelled if no op between them may release a
+reference (calls, decrefs, stores, ...), since such an op could free the
+object kept alive by the incref. The pair may be in one block, or the
+incref in a block A and the decref in a block B executed exactly as often,
+i.e. A dominates B, B post-dominates A, and neither can repeat without the
+other.
+
+Borrowed values are kept alive by someone else for the whole function:
+function arguments (by the caller) and constants (which are immortal).
+Pairs on arguments are cancelled across ops that may release references,
+and refcount ops on constants and globals are removed altogether.
+
+run() records the number of ops eliminated in
+env["optimizations.refcount.eliminated"].
+"""
+
+from __future__ import print_function, division, absolute_import
+import collections
+
+from pykit.analysis import cfa
+from pykit.ir import ops, Const, GlobalValue, FuncArg
+from pykit.transform import dce
+
+import networkx as nx
+
+refcount_ops = (ops.gc_incref, ops.gc_decref)
+
+# Ops that do not release references
+no_release = dce.effect_free | set([
+    'convert', 'call_math', 'sizeof', 'ptradd', 'check_overflow',
+    'gc_incref', 'gc_gotref', 'gc_giveref', 'jump', 'cbranch',
+])
+
+def is_immortal(value):
+    return isinstance(value, (Const, GlobalValue))
+
+def is_borrowed(value):
+    """Whether `value` is kept alive for the duration of the function"""
+    return is_immortal(value) or isinstance(value, FuncArg)
+
+def may_release(op):
+    return op.opcode not in no_release
+
+def cancel(incref, decref):
+    incref.delete()
+    decref.delete()
+    return 2
+
+# ______________________________________________________________________
+
+def remove_immortal(func):
+    """Remove refcount ops on constants and globals"""
+    dead = [op for op in func.ops
+                if op.opcode in refcount_ops and is_immortal(op.args[0])]
+    for op in dead:
+        op.delete()
+    return len(dead)
+
+def cancel_local(block):
+    """Cancel incref/decref pairs within a block"""
+    eliminated = 0
+    pending = collections.defaultdict(list) # { value : [incref] }
+    for op in list(block.ops):
+        if op.opcode == ops.gc_incref:
+            pending[op.args[0]].append(op)
+            continue
+        elif op.opcode == ops.gc_decref and pending.get(op.args[0]):
+            eliminated += cancel(pending[op.args[0]].pop(), op)
+            continue
+
+        if may_release(op):
+            # Only borrowed values are still guaranteed to be alive
+            for value in list(pending):
+                if not is_borrowed(value):
+                    del pending[value]
+
+    return eliminated
+
+def postdominators(func, cfg):
+    """{ block : immediate post-dominator }"""
+    rcfg, exit, stuck = dce.reverse_cfg(func, cfg)
+    return nx.immediate_dominators(rcfg, exit)
+
+def postdominates(ipdoms, b, a):
+    """Whether block `b` post-dominates block `a`"""
+    while a in ipdoms and ipdoms[a] is not a:
+        a = ipdoms[a]
+        if a is b:
+            return True
+    return False
+
+def region(cfg, start, stop):
+    """Blocks reachable from the successors of `start` without passing `stop`"""
+    seen = set()
+    worklist = [start]
+    while worklist:
+        block = worklist.pop()
+        for succ in cfg.successors(block):
+            if succ is not stop and succ not in seen:
+                seen.add(succ)
+                worklist.append(succ)
+    return seen
+
+def can_cancel(cfg, incref, decref):
+    """
+    Whether an incref and decref in different blocks, where the incref
+    dominates and the decref post-dominates, can be cancelled.
+    """
+    a, b = incref.block, decref.block
+    between = region(cfg, a, b)
+    if a in between or b in region(cfg, b, a):
+        return False # one executes more often than the other
+    if is_borrowed(incref.args[0]):
+        return True
+
+    tail, head = list(a.ops), list(b.ops)
+    ops_between = tail[tail.index(incref) + 1:] + head[:head.index(decref)]
+    for block in between:
+        ops_between.extend(block.ops)
+    return not any(may_release(op) for op in ops_between)
+
+def cancel_global(func):
+    """Cancel incref/decref pairs in control equivalent blocks"""
+    cfg = cfa.cfg(func)
+    dominators = cfa.compute_dominators(func, cfg)
+    ipdoms = postdominators(func, cfg)
+
+    decrefs = collections.defaultdict(list) # { value : [decref] }
+    for op in func.ops:
+        if op.opcode == ops.gc_decref:
+            decrefs[op.args[0]].append(op)
+
+    eliminated = 0
+    for incref in [op for op in func.ops if op.opcode == ops.gc_incref]:
+        a = incref.block
+        for decref in decrefs[incref.args[0]]:
+            b = decref.block
+            if (b is not a and a in dominators[b] and
+                    postdominates(ipdoms, b, a) and
+                    can_cancel(cfg, incref, decref)):
+                decrefs[incref.args[0]].remove(decref)
+                eliminated += cancel(incref, decref)
+                break
+
+    return eliminated
+
+# ______________________________________________________________________
+
+def optimize_refcounts(func):
+    """Remove redundant refcount ops, return the number of ops eliminated"""
+    eliminated = remove_immortal(func)
+    for block in func.blocks:
+        eliminated += cancel_local(block)
+    eliminated += cancel_global(func)
+    return eliminated
+
+def run(func, env=None):
+    eliminated = optimize_refcounts(func)
+    if env is not None:
+        env["optimizations.refcount.eliminated"] = eliminated
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Stack allocation of aggregates that do not escape (see analysis.escape).
+
+    t = new_tuple(x, y)
+    a = getindex(t, 0)
+    n = length(t)
+
+    # -->
+
+    t = alloca()                # in the entry block, of type { f0, f1 } *
+    setfield(t, 'f0', x)
+    setfield(t, 'f1', y)
+    a = getfield(t, 'f0')
+    n = constant(2)
+
+Tuples and lists are laid out as structs with fields f0, f1, ...; they are
+only rewritten if every index is a constant within bounds.
+"""
+
+from __future__ import print_function, division, absolute_import
+import numbers
+
+from pykit import types
+from pykit.ir import ops, Builder, Const
+from pykit.analysis import escape
+
+def stack_layout(op):
+    """Return the struct type to use for stack allocating `op`, or None"""
+    type = types.resolve_typedef(op.type)
+    [elems] = op.args
+    if op.opcode == ops.new_struct and type.is_struct:
+        return type
+    elif op.opcode == ops.new_tuple and type.is_tuple:
+        bases = list(type.bases)
+    elif op.opcode == ops.new_list and type.is_list:
+        if type.count not in (-1, len(elems)):
+            return None
+        bases = [type.base] * len(elems)
+    else:
+        return None
+
+    names = ['f%d' % i for i in range(len(elems))]
+    return types.Struct(names, bases)
+
+def field_index(use, nfields):
+    """Constant in-bounds index of a getindex/setindex use, or None"""
+    indices = use.args[1]
+    if len(indices) != 1 or not isinstance(indices[0], Const):
+        return None
+    index = indices[0].const
+    if not isinstance(index, numbers.Integral) or isinstance(index, bool):
+        return None
+    if index < 0:
+        index += nfields
+    if 0 <= index < nfields:
+        return index
+
+def can_stack_allocate(func, op):
+    """Whether the non-escaping allocation `op` can be moved to the stack"""
+    layout = stack_layout(op)
+    if layout is None:
+        return False
+    for use in func.uses[op]:
+        if (use.opcode in (ops.getindex, ops.setindex) and
+                field_index(use, len(layout.names)) is None):
+            return False
+        if use.opcode == ops.setindex and op.opcode == ops.new_tuple:
+            return False
+    return True
+
+def stack_allocate(func, op, builder):
+    """Rewrite allocation `op` to an alloca with field stores"""
+    layout = stack_layout(op)
+    names = layout.names
+
+    builder.position_at_beginning(func.startblock)
+    ptr = builder.alloca(types.Pointer(layout), [])
+
+    builder.position_before(op)
+    [elems] = op.args
+    for name, elem in zip(names, elems):
+        builder.setfield(ptr, name, elem)
+
+    for use in list(func.uses[op]):
+        if use.opcode == ops.getindex:
+            name = names[field_index(use, len(names))]
+            use.replace_op(ops.getfield, [ptr, name])
+        elif use.opcode == ops.setindex:
+            name = names[field_index(use, len(names))]
+            use.replace_op(ops.setfield, [ptr, name, use.args[2]])
+        elif use.opcode == ops.length:
+            use.replace_uses(Const(len(names), use.type))
+            use.delete()
+        else:
+            use.replace_args({op: ptr})
+
+    op.delete()
+    return ptr
+
+def run(func, env=None):
+    """Move non-escaping tuples, structs and fixed-size lists to the stack"""
+    b = Builder(func)
+    for op in escape.non_escaping(func):
+        if can_stack_allocate(func, op):
+            stack_allocate(func, op, b)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Loop strength reduction. Derived induction variables computed with a
+multiplication are replaced by a new phi that is incremented every
+iteration, and pointers computed with ptradd from an induction variable
+by an incremented pointer:
+
+    i  = phi([pre, latch], [0, i2])         i  = phi([pre, latch], [0, i2])
+    j  = mul(i, 4)                          j  = phi([pre, latch], [0, j2])
+    p2 = ptradd(p, j)              -->      p2 = phi([pre, latch], [p, p3])
+    i2 = add(i, 1)                          i2 = add(i, 1)
+                                            j2 = add(j, 4)
+                                            p3 = ptradd(p2, 4)
+
+The multiplications for the initial values and steps are emitted outside
+the loop, at the end of the predecessors of the loop header.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit.ir import Builder, Op, Const, ops
+from pykit.analysis import cfa, loop_detection, induction
+from pykit.analysis.induction import add, mul, is_const
+
+def materialize(builder, expr, type):
+    """Emit the Ops computing expression `expr` of the given type"""
+    if is_const(expr):
+        return Const(expr, type)
+    elif isinstance(expr, tuple):
+        opcode, a, b = expr
+        args = [materialize(builder, a, type), materialize(builder, b, type)]
+        if opcode == 'add':
+            return builder.add(type, args)
+        elif opcode == 'div':
+            return builder.div(type, args)
+        elif opcode == 'max':
+            return maximum(builder, type, *args)
+        return builder.mul(type, args)
+    return expr
+
+def maximum(builder, type, a, b):
+    """max(a, b) = b + max(a - b, 0) for signed integers, without branches"""
+    x = builder.sub(type, [a, b])
+    sign = builder.rshift(type, [x, Const(type.bits - 1, type)])
+    x = builder.bitand(type, [x, builder.invert(type, [sign])])
+    return builder.add(type, [x, b])
+
+def reduce_iv(func, builder, iv):
+    """Replace derived induction variable `iv` by a new phi, return the phi"""
+    op, basic = iv.op, iv.basic
+    header = basic.phi.block
+    int_type = basic.phi.type
+
+    # Initial values, emitted at the end of each predecessor
+    inits = []
+    for pred, init in basic.inits.items():
+        builder.position_before(pred.terminator)
+        start = add(mul(iv.factor, induction._expr(init)), iv.offset)
+        value = materialize(builder, start, int_type)
+        if iv.pointer is not None:
+            value = builder.ptradd(op.type, [iv.pointer, value])
+        inits.append((pred, value))
+
+    # New phi, incremented with the basic induction variable
+    builder.position_at_beginning(header)
+    phi = builder.phi(op.type, [[], []])
+
+    # Step, computed outside the loop (see candidates())
+    pred, _ = inits[0]
+    builder.position_before(pred.terminator)
+    step = materialize(builder, mul(iv.factor, basic.step), int_type)
+
+    builder.position_after(basic.update)
+    if iv.pointer is not None:
+        update = builder.ptradd(op.type, [phi, step])
+    else:
+        update = builder.add(op.type, [phi, step])
+
+    latches = [p for p, v in zip(*basic.phi.args) if v is basic.update]
+    phi.set_args([[p for p, v in inits] + latches,
+                  [v for p, v in inits] + [update] * len(latches)])
+
+    op.replace_uses(phi)
+    op.delete()
+    return phi
+
+def candidates(ivs):
+    """Derived induction variables worth reducing"""
+    result = []
+    for op, iv in ivs.items():
+        if iv.is_basic or is_const(iv.factor) and iv.factor in (0, 1):
+            continue
+        if len(iv.basic.inits) > 1 and not is_const(mul(iv.factor,
+                                                        iv.basic.step)):
+            continue # no single place to compute the step outside the loop
+        if op.opcode == ops.mul or (op.opcode == ops.ptradd and
+                                    isinstance(op.args[1], Op) and
+                                    op.args[1].opcode == ops.mul):
+            result.append(iv)
+    return result
+
+def delete_dead(ops_):
+    """Delete unused arithmetic feeding reduced induction variables"""
+    worklist = list(ops_)
+    while worklist:
+        op = worklist.pop()
+        if (op.result is not None and op.opcode in (ops.add, ops.sub, ops.mul)
+                and not op.function.uses[op]):
+            args = [arg for arg in op.args if isinstance(arg, Op)]
+            op.delete()
+            worklist.extend(args)
+
+def reduce_loop(func, builder, loop, cfg):
+    """Strength reduce the induction variables of one loop"""
+    ivs = induction.find_induction_variables(func, loop, cfg)
+
+    # Reduce pointers first, the multiplications feeding them may die
+    reduced = sorted(candidates(ivs), key=lambda iv: iv.op.opcode != ops.ptradd)
+    for iv in reduced:
+        if iv.op.result is None:
+            continue # deleted as dead
+        operands = [arg for arg in iv.op.args if isinstance(arg, Op)]
+        reduce_iv(func, builder, iv)
+        delete_dead(operands)
+
+    return reduced
+
+def run(func, env=None):
+    """Strength reduce derived induction variables of all loops"""
+    cfg = cfa.cfg(func)
+    loops = loop_detection.find_loops(func, cfg)
+    builder = Builder(func)
+    for loop in loop_detection.postorder(loops.loops):
+        if not loop.irreducible:
+            reduce_loop(func, builder, loop, cfg)
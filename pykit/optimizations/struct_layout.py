@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+Struct layout optimization. Fields of structs private to a function are
+reordered by decreasing alignment, which minimizes padding:
+
+    { a: Int8, b: Int64, c: Int8 }      -->     { b: Int64, a: Int8, c: Int8 }
+      24 bytes                                    16 bytes
+
+Fields are accessed by name, so only the types of Ops, constants and
+undefined values change. A struct is externally visible, and keeps its
+layout, if it occurs (possibly nested) in the signature of the function,
+in the arguments or result of a call, or in an op that depends on the
+layout of its operands (ptrcast, convert, sizeof, addressof).
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+
+from pykit import types
+from pykit.ir import ops, Op, Const, Undef, Struct
+from pykit.utils import nestedmap
+
+pointer_size = ctypes.sizeof(ctypes.c_void_p)
+
+layout_ops = (ops.call, ops.ptrcast, ops.convert, ops.sizeof, ops.addressof)
+
+# ______________________________________________________________________
+# Layout
+
+def alignment(type):
+    """Alignment of a type in bytes, or None if unknown"""
+    if type.is_typedef:
+        return alignment(type.type)
+    elif type.is_bool:
+        return 1
+    elif type.is_int or type.is_real:
+        return type.bits // 8
+    elif type.is_pointer:
+        return pointer_size
+    elif type.is_struct:
+        aligns = [alignment(t) for t in type.types]
+        if None not in aligns:
+            return max(aligns or [1])
+
+def sizeof(type):
+    """Size of a type in bytes with C layout rules, or None if unknown"""
+    if type.is_typedef:
+        return sizeof(type.type)
+    elif type.is_struct:
+        offset = 0
+        for t in type.types:
+            size, align = sizeof(t), alignment(t)
+            if size is None or align is None:
+                return None
+            offset = _align(offset, align) + size
+        return _align(offset, alignment(type))
+    elif alignment(type) is not None:
+        return alignment(type)
+
+def _align(offset, align):
+    return (offset + align - 1) // align * align
+
+def reorder(type):
+    """Struct `type` with its fields reordered by decreasing alignment"""
+    fields = list(zip(type.names, type.types))
+    fields.sort(key=lambda field: -alignment(field[1]))
+    return types.Struct([n for n, t in fields], [t for n, t in fields])
+
+# ______________________________________________________________________
+
+def components(type, result):
+    """Add `type` and all types it is composed of to `result`"""
+    if type in result:
+        return result
+    result.add(type)
+    if type.is_typedef:
+        components(type.type, result)
+    elif type.is_struct:
+        for t in type.types:
+            components(t, result)
+    elif type.is_pointer:
+        components(type.base, result)
+    elif type.is_function:
+        components(type.restype, result)
+        for t in type.argtypes:
+            components(t, result)
+    return result
+
+def visible_types(func):
+    """Types whose layout is visible outside of `func`"""
+    visible = components(func.type, set())
+    for op in func.ops:
+        if op.opcode in layout_ops:
+            components(op.type, visible)
+            for arg in op.args[1] if op.opcode == ops.call else op.args:
+                if hasattr(arg, 'type'):
+                    components(arg.type, visible)
+        for arg in op.args:
+            if not isinstance(arg, (Op, Const, Undef, list)):
+                if hasattr(arg, 'type'): # e.g. GlobalValue, Function
+                    components(arg.type, visible)
+    return visible
+
+class Relayout(object):
+    """Rewrite types with the new struct layouts"""
+
+    def __init__(self, visible):
+        self.visible = visible
+        self.cache = {}
+
+    def type(self, type):
+        if type not in self.cache:
+            self.cache[type] = self._type(type)
+        return self.cache[type]
+
+    def _type(self, type):
+        if type in self.visible or type.is_typedef:
+            return type
+        elif type.is_struct:
+            struct = types.Struct(list(type.names),
+                                  [self.type(t) for t in type.types])
+            if sizeof(struct) is not None and \
+                    sizeof(reorder(struct)) < sizeof(struct):
+                return reorder(struct)
+            return struct
+        elif type.is_pointer:
+            return types.Pointer(self.type(type.base))
+        return type
+
+    def value(self, arg):
+        if isinstance(arg, Const):
+            return Const(self.const(arg.const, arg.type), self.type(arg.type))
+        elif isinstance(arg, Undef):
+            return Undef(self.type(arg.type))
+        return arg
+
+    def const(self, value, type):
+        if not isinstance(value, Struct):
+            return value
+        new_type = self.type(type)
+        fields = dict(zip(value.names, value.values))
+        return Struct(list(new_type.names),
+                      [self.value(fields[name]) for name in new_type.names])
+
+def optimize_layout(func):
+    """
+    Reorder the fields of structs private to `func`. Returns
+    { old struct type : new struct type } for the reordered structs.
+    """
+    relayout = Relayout(visible_types(func))
+    for op in func.ops:
+        op.type = relayout.type(op.type)
+        args = nestedmap(relayout.value, op.args)
+        if args != op.args:
+            op.set_args(args)
+
+    return dict((old, new) for old, new in relayout.cache.items()
+                    if old.is_struct and old.names != new.names)
+
+def run(func, env=None):
+    optimize_layout(func)
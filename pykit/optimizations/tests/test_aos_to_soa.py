@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const, opcodes, verify
+from pykit.optimizations import aos_to_soa
+
+I = types.Int64
+S = types.Struct(['x', 'y'], [I, types.Float64])
+P = types.Pointer(S)
+
+def build(escape=False):
+    """
+    p = gc_alloc(n)
+    for i in range(n):
+        p[i].x = i
+        s += p[i].x
+    gc_dealloc(p)
+    """
+    func = Function("foo", ['n'], types.Function(I, [I]))
+    entry, cond, body, exit = [func.new_block(name) for name in
+                                   ('entry', 'cond', 'body', 'exit')]
+    n, = func.args
+    b = Builder(func)
+    with b.at_end(entry):
+        p = b.gc_alloc(P, [n])
+        if escape:
+            b.ptrstore(types.Void, [b.alloca(types.Pointer(P), []), p])
+        b.jump(cond)
+    with b.at_end(cond):
+        i = b.phi(I, [[], []])
+        s = b.phi(I, [[], []])
+        b.cbranch(b.lt(types.Bool, [i, n]), body, exit)
+    with b.at_end(body):
+        e = b.getindex(P, [p, [i]])
+        b.setfield(e, 'x', i)
+        s2 = b.add(I, [s, b.getfield(I, [e, 'x'])])
+        i2 = b.add(I, [i, Const(1, I)])
+        b.jump(cond)
+    with b.at_end(exit):
+        b.gc_dealloc(types.Void, [p])
+        b.ret(s)
+    i.set_args([[entry, body], [Const(0, I), i2]])
+    s.set_args([[entry, body], [Const(0, I), s2]])
+    return func
+
+class TestAoSToSoA(unittest.TestCase):
+
+    def test_split(self):
+        func = build()
+        self.assertEqual(aos_to_soa.aos_to_soa(func), 1)
+        verify(func)
+
+        allocs = [op for op in func.ops if op.opcode == 'gc_alloc']
+        self.assertEqual([op.type for op in allocs],
+                         [types.Pointer(I), types.Pointer(types.Float64)])
+        self.assertEqual(opcodes(func.get_block('body')),
+            ['getindex', 'ptrstore', 'getindex', 'ptrload', 'add', 'add',
+             'jump'])
+        self.assertEqual(opcodes(func.get_block('exit')),
+                         ['gc_dealloc', 'gc_dealloc', 'ret'])
+
+    def test_escape(self):
+        self.assertEqual(aos_to_soa.aos_to_soa(build(escape=True)), 0)
+
+    def test_outside_loop(self):
+        func = Function("foo", ['n'], types.Function(I, [I]))
+        b = Builder(func)
+        b.position_at_end(func.new_block("entry"))
+        p = b.gc_alloc(P, func.args)
+        e = b.getindex(P, [p, [Const(0, I)]])
+        b.setfield(e, 'x', Const(1, I))
+        b.ret(b.getfield(I, [e, 'x']))
+        self.assertEqual(aos_to_soa.aos_to_soa(func), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
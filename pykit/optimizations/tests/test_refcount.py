@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const, opcodes, verify
+from pykit.optimizations import refcount
+
+I = types.Int32
+P = types.Pointer(types.Struct(['a'], [I]))
+
+def build():
+    func = Function("foo", ['p'], types.Function(I, [P]))
+    entry = func.new_block("entry")
+    b = Builder(func)
+    b.position_at_end(entry)
+    return func, b
+
+def make_callee():
+    func = Function("callee", [], types.Function(types.Void, []))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    b.ret(None)
+    return func
+
+def if_(b, test, body):
+    """Generate `if test: body()`, return the exit block"""
+    with b.if_(test):
+        body()
+        exit = test.block.terminator.args[2]
+        b.jump(exit)
+    return exit
+
+class TestRefcount(unittest.TestCase):
+
+    def test_local(self):
+        func, b = build()
+        obj = b.ptrcast(P, [func.args[0]])
+        b.gc_incref(types.Void, [obj])
+        value = b.getfield(I, [obj, 'a'])
+        b.gc_decref(types.Void, [obj])
+        b.ret(value)
+
+        env = {}
+        refcount.run(func, env)
+        verify(func)
+        self.assertEqual(opcodes(func), ['ptrcast', 'getfield', 'ret'])
+        self.assertEqual(env["optimizations.refcount.eliminated"], 2)
+
+    def test_release(self):
+        # The call may release the last other reference to obj
+        func, b = build()
+        obj = b.ptrcast(P, [func.args[0]])
+        b.gc_incref(types.Void, [obj])
+        b.call(types.Void, [make_callee(), []])
+        b.gc_decref(types.Void, [obj])
+        b.ret(Const(0, I))
+
+        self.assertEqual(refcount.optimize_refcounts(func), 0)
+        self.assertEqual(opcodes(func), ['ptrcast', 'gc_incref', 'call',
+                                         'gc_decref', 'ret'])
+
+    def test_borrowed(self):
+        func, b = build()
+        p, = func.args
+        b.gc_incref(types.Void, [p])
+        b.call(types.Void, [make_callee(), []])
+        b.gc_decref(types.Void, [p])
+        b.gc_incref(types.Void, [Const(0, P)])
+        b.ret(Const(0, I))
+
+        self.assertEqual(refcount.optimize_refcounts(func), 3)
+        self.assertEqual(opcodes(func), ['call', 'ret'])
+
+    def test_dominating_paths(self):
+        func, b = build()
+        p, = func.args
+        obj = b.ptrcast(P, [p])
+        b.gc_incref(types.Void, [obj])
+        value = b.getfield(I, [obj, 'a'])
+        test = b.gt(types.Bool, [value, Const(0, I)])
+        exit = if_(b, test, lambda: b.getfield(I, [obj, 'a']))
+        b.position_at_end(exit)
+        b.gc_decref(types.Void, [obj])
+        b.ret(value)
+
+        self.assertEqual(refcount.optimize_refcounts(func), 2)
+        verify(func)
+        self.assertNotIn('gc_incref', opcodes(func))
+        self.assertNotIn('gc_decref', opcodes(func))
+
+    def test_conditional_decref(self):
+        # The decref does not post-dominate the incref
+        func, b = build()
+        p, = func.args
+        obj = b.ptrcast(P, [p])
+        b.gc_incref(types.Void, [obj])
+        test = b.gt(types.Bool, [b.getfield(I, [obj, 'a']), Const(0, I)])
+        exit = if_(b, test, lambda: b.gc_decref(types.Void, [obj]))
+        b.position_at_end(exit)
+        b.ret(Const(0, I))
+
+        self.assertEqual(refcount.optimize_refcounts(func), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
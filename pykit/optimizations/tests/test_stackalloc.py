@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const, opcodes, verify
+from pykit.optimizations import stackalloc
+
+I = types.Int32
+
+def build(restype=I):
+    func = Function("foo", ['x', 'y'], types.Function(restype, [I, I]))
+    entry = func.new_block("entry")
+    b = Builder(func)
+    b.position_at_end(entry)
+    return func, b
+
+class TestStackAllocation(unittest.TestCase):
+
+    def test_tuple(self):
+        func, b = build()
+        x, y = func.args
+        t = b.new_tuple(types.Tuple([I, I]), [[x, y]])
+        a = b.getindex(I, [t, [Const(-1, I)]])
+        n = b.length(I, [t])
+        b.ret(b.add(I, [a, n]))
+
+        stackalloc.run(func)
+        verify(func)
+        self.assertEqual(opcodes(func), ['alloca', 'setfield', 'setfield',
+                                         'getfield', 'add', 'ret'])
+        alloca = func.startblock.head
+        self.assertEqual(alloca.type.base.names, ['f0', 'f1'])
+        self.assertEqual(a.args, [alloca, 'f1'])
+
+    def test_struct(self):
+        S = types.Struct(['a', 'b'], [I, I])
+        func, b = build()
+        x, y = func.args
+        s = b.new_struct(S, [[x, y]])
+        b.setfield(s, 'a', y)
+        b.ret(b.getfield(I, [s, 'a']))
+
+        stackalloc.run(func)
+        verify(func)
+        self.assertEqual(opcodes(func), ['alloca', 'setfield', 'setfield',
+                                         'setfield', 'getfield', 'ret'])
+        self.assertEqual(func.startblock.head.type, types.Pointer(S))
+
+    def test_list(self):
+        L = types.List(I, 2)
+        func, b = build()
+        x, y = func.args
+        l = b.new_list(L, [[x, y]])
+        b.setindex(types.Void, [l, [Const(1, I)], x])
+        b.ret(b.getindex(I, [l, [Const(1, I)]]))
+
+        stackalloc.run(func)
+        self.assertEqual(opcodes(func), ['alloca', 'setfield', 'setfield',
+                                         'setfield', 'getfield', 'ret'])
+
+    def test_dynamic_index(self):
+        L = types.List(I, 2)
+        func, b = build()
+        x, y = func.args
+        l = b.new_list(L, [[x, y]])
+        b.ret(b.getindex(I, [l, [x]]))
+
+        stackalloc.run(func)
+        self.assertEqual(opcodes(func), ['new_list', 'getindex', 'ret'])
+
+    def test_escaping(self):
+        T = types.Tuple([I, I])
+        func, b = build(T)
+        x, y = func.args
+        t = b.new_tuple(T, [[x, y]])
+        b.ret(t)
+
+        stackalloc.run(func)
+        self.assertEqual(opcodes(func), ['new_tuple', 'ret'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const, opcodes, verify, interp
+from pykit.optimizations import strength_reduction
+
+I = types.Int32
+
+def build():
+    """
+    s = 0
+    for (i = 0; i < n; i++)
+        s += i * 4 + k * i
+    return s
+    """
+    func = Function("foo", ['n', 'k'], types.Function(I, [I, I]))
+    entry, cond, body, exit = [func.new_block(name) for name in
+                                   ('entry', 'cond', 'body', 'exit')]
+    n, k = func.args
+    b = Builder(func)
+    with b.at_end(entry):
+        b.jump(cond)
+    with b.at_end(cond):
+        i = b.phi(I, [[], []])
+        s = b.phi(I, [[], []])
+        b.cbranch(b.lt(types.Bool, [i, n]), body, exit)
+    with b.at_end(body):
+        j = b.mul(I, [i, Const(4, I)])
+        jk = b.mul(I, [k, i])
+        s2 = b.add(I, [b.add(I, [s, j]), jk])
+        i2 = b.add(I, [i, Const(1, I)])
+        b.jump(cond)
+    with b.at_end(exit):
+        b.ret(s)
+    i.set_args([[entry, body], [Const(0, I), i2]])
+    s.set_args([[entry, body], [Const(0, I), s2]])
+    return func
+
+class TestStrengthReduction(unittest.TestCase):
+
+    def test_reduce_mul(self):
+        func = build()
+        expected = [interp.run(func, args=[n, 3]) for n in (0, 1, 7)]
+
+        strength_reduction.run(func)
+        verify(func)
+        self.assertNotIn('mul', opcodes(func))
+        self.assertEqual([interp.run(func, args=[n, 3]) for n in (0, 1, 7)],
+                         expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
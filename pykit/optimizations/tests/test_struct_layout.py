@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const, Struct, verify
+from pykit.optimizations import struct_layout
+
+I8, I64 = types.Int8, types.Int64
+S = types.Struct(['a', 'b', 'c'], [I8, I64, I8])
+Reordered = types.Struct(['b', 'a', 'c'], [I64, I8, I8])
+
+def build(argtypes=()):
+    func = Function("foo", ['arg%d' % i for i in range(len(argtypes))],
+                    types.Function(I64, list(argtypes)))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    return func, b
+
+class TestStructLayout(unittest.TestCase):
+
+    def test_layout(self):
+        self.assertEqual(struct_layout.sizeof(S), 24)
+        self.assertEqual(struct_layout.sizeof(Reordered), 16)
+        self.assertEqual(struct_layout.alignment(S), 8)
+        self.assertEqual(struct_layout.reorder(S), Reordered)
+
+    def test_reorder(self):
+        func, b = build()
+        p = b.alloca(types.Pointer(S), [])
+        b.setfield(p, 'b', Const(1, I64))
+        b.ret(b.getfield(I64, [p, 'b']))
+
+        reordered = struct_layout.optimize_layout(func)
+        verify(func)
+        self.assertEqual(reordered, {S: Reordered})
+        self.assertEqual(p.type, types.Pointer(Reordered))
+
+    def test_constant(self):
+        func, b = build()
+        value = Struct(['a', 'b', 'c'],
+                       [Const(1, I8), Const(2, I64), Const(3, I8)])
+        field = b.getfield(I64, [Const(value, S), 'b'])
+        b.ret(field)
+
+        struct_layout.optimize_layout(func)
+        const = field.args[0]
+        self.assertEqual(const.type, Reordered)
+        self.assertEqual(const.const.names, ['b', 'a', 'c'])
+        self.assertEqual([c.const for c in const.const.values], [2, 1, 3])
+
+    def test_visible(self):
+        # Arguments and nested types keep their layout
+        Outer = types.Struct(['s'], [types.Pointer(S)])
+        func, b = build([types.Pointer(Outer)])
+        p = b.alloca(types.Pointer(S), [])
+        b.ret(b.getfield(I64, [p, 'b']))
+
+        self.assertEqual(struct_layout.optimize_layout(func), {})
+        self.assertEqual(p.type, types.Pointer(S))
+
+    def test_no_gain(self):
+        T = types.Struct(['a', 'b'], [I8, I64])
+        func, b = build()
+        p = b.alloca(types.Pointer(T), [])
+        b.ret(b.getfield(I64, [p, 'b']))
+
+        self.assertEqual(struct_layout.optimize_layout(func), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,8 @@ Pipeline that determines phase ordering and execution.
 from __future__ import print_function, division, absolute_import
 import types
 
+from pykit.ir.verification import batched_verification
+
 # ______________________________________________________________________
 # Execute pipeline
 
@@ -20,10 +22,12 @@ def _check_transform_result(transform, result):
 
 
 def apply_transform(transform, func, env):
-    if isinstance(transform, types.ModuleType):
-        result = transform.run(func, env)
-    else:
-        result = transform(func, env)
+    # Ops built by the transform are verified when it is done
+    with batched_verification():
+        if isinstance(transform, types.ModuleType):
+            result = transform.run(func, env)
+        else:
+            result = transform(func, env)
 
     _check_transform_result(transform, result)
     return result or (func, env)
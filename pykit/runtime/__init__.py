@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+"""
+Native runtime libraries, compiled with the system C compiler on first use.
+"""
@@ -0,0 +1,196 @@
+/*
+ * Memory allocator runtime for pykit (see pykit/runtime/allocator.py).
+ *
+ * Pool allocator: small allocations are served from per-thread free lists
+ * of size classes (multiples of 16 bytes up to 512 bytes), carved from
+ * 64KB chunks. Each allocation is preceded by a 16-byte header holding its
+ * size class. Freed blocks go back to the free list of the freeing thread;
+ * chunks are never returned to the system. Large allocations use malloc.
+ *
+ * Arenas: bump allocation from a list of chunks, freed all at once with
+ * pykit_arena_free(). The first chunk of freed arenas is cached per thread.
+ */
+
+#include <stdlib.h>
+#include <stdint.h>
+
+#define ALIGN           16
+#define NCLASSES        32
+#define MAX_SMALL       (NCLASSES * ALIGN)
+#define LARGE           NCLASSES
+#define POOL_CHUNK      (64 * 1024)
+#define ARENA_CHUNK     (16 * 1024)
+#define ARENA_CACHE     8
+
+#define round_up(n)     (((n) + ALIGN - 1) & ~(size_t) (ALIGN - 1))
+
+typedef struct freeblock {
+    struct freeblock *next;
+} freeblock_t;
+
+typedef union {
+    size_t cls;
+    char pad[ALIGN];
+} header_t;
+
+static __thread freeblock_t *freelists[NCLASSES];
+static __thread char *pool_ptr, *pool_end;
+
+/* ______________________________________________________________________ */
+/* Pool allocator */
+
+static void *
+pool_carve(size_t size)
+{
+    void *p;
+    if ((size_t) (pool_end - pool_ptr) < size) {
+        /* The rest of the current chunk is abandoned */
+        pool_ptr = malloc(POOL_CHUNK);
+        if (pool_ptr == NULL)
+            return NULL;
+        pool_end = pool_ptr + POOL_CHUNK;
+    }
+    p = pool_ptr;
+    pool_ptr += size;
+    return p;
+}
+
+void *
+pykit_alloc(int64_t size)
+{
+    header_t *header;
+    size_t cls;
+
+    if (size <= 0)
+        size = 1;
+
+    if ((size_t) size > MAX_SMALL) {
+        header = malloc(sizeof(header_t) + (size_t) size);
+        if (header == NULL)
+            return NULL;
+        header->cls = LARGE;
+        return header + 1;
+    }
+
+    cls = (round_up((size_t) size) / ALIGN) - 1;
+    if (freelists[cls] != NULL) {
+        header = (header_t *) freelists[cls];
+        freelists[cls] = freelists[cls]->next;
+    } else {
+        header = pool_carve(sizeof(header_t) + (cls + 1) * ALIGN);
+        if (header == NULL)
+            return NULL;
+    }
+    header->cls = cls;
+    return header + 1;
+}
+
+void
+pykit_free(void *p)
+{
+    header_t *header;
+    freeblock_t *block;
+    size_t cls;
+
+    if (p == NULL)
+        return;
+
+    header = (header_t *) p - 1;
+    cls = header->cls;
+    if (cls == LARGE) {
+        free(header);
+    } else {
+        /* The link overwrites the header */
+        block = (freeblock_t *) header;
+        block->next = freelists[cls];
+        freelists[cls] = block;
+    }
+}
+
+/* ______________________________________________________________________ */
+/* Arenas */
+
+typedef struct chunk {
+    struct chunk *prev;
+    size_t size;
+} chunk_t;
+
+typedef struct {
+    char *ptr, *end;
+    chunk_t *chunks;    /* most recent chunk, the first one is cached */
+} pykit_arena_t;
+
+static __thread chunk_t *arena_cache[ARENA_CACHE];
+static __thread int arena_ncached;
+
+static chunk_t *
+new_chunk(size_t size)
+{
+    chunk_t *chunk;
+    if (size == ARENA_CHUNK && arena_ncached > 0)
+        return arena_cache[--arena_ncached];
+    chunk = malloc(size);
+    if (chunk != NULL)
+        chunk->size = size;
+    return chunk;
+}
+
+static void
+free_chunk(chunk_t *chunk)
+{
+    if (chunk->size == ARENA_CHUNK && arena_ncached < ARENA_CACHE)
+        arena_cache[arena_ncached++] = chunk;
+    else
+        free(chunk);
+}
+
+pykit_arena_t *
+pykit_arena_new(void)
+{
+    /* The arena lives in its first chunk */
+    chunk_t *chunk = new_chunk(ARENA_CHUNK);
+    pykit_arena_t *arena;
+    if (chunk == NULL)
+        return NULL;
+    chunk->prev = NULL;
+    arena = (pykit_arena_t *) ((char *) chunk + round_up(sizeof(chunk_t)));
+    arena->ptr = (char *) arena + round_up(sizeof(pykit_arena_t));
+    arena->end = (char *) chunk + ARENA_CHUNK;
+    arena->chunks = chunk;
+    return arena;
+}
+
+void *
+pykit_arena_alloc(pykit_arena_t *arena, int64_t size)
+{
+    void *p;
+    size_t n = round_up(size <= 0 ? 1 : (size_t) size);
+
+    if ((size_t) (arena->end - arena->ptr) < n) {
+        size_t chunksize = round_up(sizeof(chunk_t)) + n;
+        chunk_t *chunk;
+        if (chunksize < ARENA_CHUNK)
+            chunksize = ARENA_CHUNK;
+        chunk = new_chunk(chunksize);
+        if (chunk == NULL)
+            return NULL;
+        chunk->prev = arena->chunks;
+        arena->chunks = chunk;
+        arena->ptr = (char *) chunk + round_up(sizeof(chunk_t));
+        arena->end = (char *) chunk + chunksize;
+    }
+    p = arena->ptr;
+    arena->ptr += n;
+    return p;
+}
+
+void
+pykit_arena_free(pykit_arena_t *arena)
+{
+    chunk_t *chunk = arena->chunks, *prev;
+    while (chunk != NULL) {
+        prev = chunk->prev;
+        free_chunk(chunk);
+        chunk = prev;
+    }
+}
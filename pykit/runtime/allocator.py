@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pooled and arena memory allocator (allocator.c):
+
+    pykit_alloc(size)               size-class pooled allocation
+    pykit_free(p)                   free a pooled allocation
+    pykit_arena_new()               new arena
+    pykit_arena_alloc(arena, size)  bump allocation from an arena
+    pykit_arena_free(arena)         free an arena with all its allocations
+
+The library is compiled once and cached on disk (see codegen.c.c_utils).
+Functions are declared as external GlobalValues with their addresses, for
+lowering passes (see pykit.lower.lower_alloc).
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+from os.path import join, dirname
+
+from pykit import types
+from pykit.ir import GlobalValue
+from pykit.codegen.c import c_utils
+
+void_p = types.Pointer(types.Void)
+arena_p = void_p # pykit_arena_t *
+
+signatures = {
+    'pykit_alloc':          types.Function(void_p, [types.Int64]),
+    'pykit_free':           types.Function(types.Void, [void_p]),
+    'pykit_arena_new':      types.Function(arena_p, []),
+    'pykit_arena_alloc':    types.Function(void_p, [arena_p, types.Int64]),
+    'pykit_arena_free':     types.Function(types.Void, [arena_p]),
+}
+
+_library = []
+
+def library():
+    """The allocator library (a ctypes CDLL), compiled on first use"""
+    if not _library:
+        with open(join(dirname(__file__), 'allocator.c')) as f:
+            path = c_utils.compile_source(f.read())
+        _library.append(c_utils.load_library(path))
+    return _library[0]
+
+def address(name):
+    return ctypes.cast(getattr(library(), name), ctypes.c_void_p).value
+
+def declare(name):
+    """External GlobalValue for allocator function `name`"""
+    return GlobalValue(name, signatures[name], external=True,
+                       address=address(name))
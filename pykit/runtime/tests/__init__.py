@@ -0,0 +1 @@
+import pykit.tests # compile the runtime into a temporary cache
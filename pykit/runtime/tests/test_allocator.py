@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import os
+import ctypes
+import unittest
+
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+
+from pykit.runtime import allocator
+
+def function(name, restype, *argtypes):
+    cfunc = getattr(allocator.library(), name)
+    cfunc.restype = restype
+    cfunc.argtypes = argtypes
+    return cfunc
+
+@unittest.skipIf(not which(os.environ.get('CC', 'cc')), "no C compiler")
+class TestAllocator(unittest.TestCase):
+
+    def setUp(self):
+        void_p, int64 = ctypes.c_void_p, ctypes.c_int64
+        self.alloc = function('pykit_alloc', void_p, int64)
+        self.free = function('pykit_free', None, void_p)
+        self.arena_new = function('pykit_arena_new', void_p)
+        self.arena_alloc = function('pykit_arena_alloc', void_p, void_p, int64)
+        self.arena_free = function('pykit_arena_free', None, void_p)
+
+    def test_size_classes(self):
+        p = self.alloc(24)
+        self.assertEqual(p % 16, 0)
+        self.free(p)
+        self.assertEqual(self.alloc(20), p) # same size class, reused
+        q = self.alloc(100)
+        self.assertNotEqual(q, p)
+        self.free(q)
+        self.free(p)
+
+    def test_large(self):
+        p = self.alloc(1 << 20)
+        ctypes.memset(p, 1, 1 << 20)
+        self.free(p)
+
+    def test_arena(self):
+        arena = self.arena_new()
+        pointers = [self.arena_alloc(arena, size)
+                        for size in (8, 1000, 100000, 24)]
+        for p, size in zip(pointers, (8, 1000, 100000, 24)):
+            self.assertEqual(p % 16, 0)
+            ctypes.memset(p, 0xff, size)
+        self.assertEqual(len(set(pointers)), 4)
+        self.arena_free(arena)
+
+    def test_declare(self):
+        gv = allocator.declare('pykit_alloc')
+        self.assertTrue(gv.external)
+        self.assertEqual(gv.address,
+                         ctypes.cast(self.alloc, ctypes.c_void_p).value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import
 
+import os
+import atexit
+import shutil
+import tempfile
 import unittest
 import collections
 
@@ -9,6 +13,18 @@ from pykit.ir import *
 from pykit.analysis import cfa
 from pykit.utils import *
 
+# ______________________________________________________________________
+# Libraries compiled by the tests (C code generator, allocator runtime) go
+# to a temporary cache instead of the user's (see pykit.codegen.c.c_utils)
+
+def _remove_cache(path, pid=os.getpid()):
+    if os.getpid() == pid: # not in forked workers
+        shutil.rmtree(path, ignore_errors=True)
+
+_cachedir = tempfile.mkdtemp(prefix='pykit-tests-')
+os.environ['PYKIT_CACHE_DIR'] = _cachedir
+atexit.register(_remove_cache, _cachedir)
+
 # ______________________________________________________________________
 
 State = collections.namedtuple('State', 'm f b entry env')
@@ -83,6 +99,77 @@ class TestFunction(object):
 
 # ______________________________________________________________________
 
+def build_loop(term=None, name="f", argnames=('n',), start=0, stop=None,
+               step=1, cmp='lt', type=types.Int32):
+    """
+    Build a function summing term(b, i) (i by default) in a loop:
+
+        entry:
+            jump(cond)
+        cond:
+            i = phi([entry, body], [start, i2])
+            s = phi([entry, body], [0, s2])
+            cbranch(cmp(i, stop), body, exit)
+        body:
+            s2 = add(s, term(b, i))
+            i2 = add(i, step)
+            jump(cond)
+        exit:
+            ret(s)
+
+    `stop` defaults to the first argument. All arguments are of `type`.
+    Returns (func, (entry, cond, body, exit), (i, s, i2, s2)).
+    """
+    func = Function(name, list(argnames),
+                    types.Function(type, [type] * len(argnames)))
+    entry = func.new_block("entry")
+    b = Builder(func)
+    b.position_at_end(entry)
+
+    def body(b, i, values):
+        [s] = values
+        return [b.add(type, [s, term(b, i) if term else i])]
+
+    stop = func.args[0] if stop is None else Const(stop, type)
+    i, [s], (cond, loop, exit) = b.gen_phi_loop(
+        stop, body, [Const(0, type)], Const(start, type), Const(step, type),
+        cmp)
+    b.ret(s)
+
+    [i2, s2] = [phi.args[1][1] for phi in (i, s)]
+    return func, (entry, cond, loop, exit), (i, s, i2, s2)
+
+def square(b, i):
+    """Loop term of sum(i * i for i in range(n)), see build_loop"""
+    return b.mul(i.type, [i, i])
+
+def build_caller(callee, type=types.Int32):
+    """callee(int(x)) + sin(x), for a callee taking and returning `type`"""
+    F = types.Float64
+    func = Function("caller", ['x'], types.Function(F, [F]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    x, = func.args
+    result = b.call(type, [callee, [b.convert(type, [x])]])
+    sin = b.call_math(F, ['Sin', [x]])
+    b.ret(b.add(F, [b.convert(F, [result]), sin]))
+    return func
+
+def build_math():
+    """sqrt(x) + atan(x) + pow(x, x)"""
+    F = types.Float64
+    func = Function("math", ['x'], types.Function(F, [F]))
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    x, = func.args
+    sqrt = b.call_math(F, ['Sqrt', [x]])
+    atan = b.call_math(F, ['Atan', [x]])
+    pow = b.call_math(F, ['Pow', [x, x]])
+    b.ret(b.add(F, [b.add(F, [sqrt, atan]), pow]))
+    return func
+
+# ______________________________________________________________________
+
 def mark_test(f, argtuples=None, suite=None):
     """Mark a function-based set as a test"""
     suite = suite or unittest.TestSuite()
@@ -1,28 +1,214 @@
 # -*- coding: utf-8 -*-
 
 """
-Dead code elimination.
+Aggressive dead code elimination.
+
+Ops are assumed dead until proven live. Side-effecting ops are live, and
+liveness propagates to operands, to the branches a live block is control
+dependent on, and for phis to the terminators of the incoming blocks. All
+other ops are deleted in a single run, including chains of dead ops.
+Conditional branches that are not live are replaced by a jump to the
+immediate post-dominator, which removes dead blocks and empty loops.
 """
 
-from pykit.analysis import loop_detection
+from __future__ import print_function, division, absolute_import
+
+from pykit.analysis import cfa
+from pykit.ir import Op, Builder
+from pykit.utils import flatten
+
+import networkx as nx
 
 effect_free = set([
     'alloca', 'load', 'new_list', 'new_tuple', 'new_dict', 'new_set',
     'new_struct', 'new_data', 'new_exc', 'phi', 'exc_setup', 'exc_catch',
-    'ptrload', 'ptrcast', 'ptr_isnull', 'getfield', 'getindex',
+    'ptrload', 'ptrcast', 'ptr_isnull', 'ptrfield', 'getfield', 'getindex',
     'add', 'sub', 'mul', 'div', 'mod', 'lshift', 'rshift', 'bitand', 'bitor',
     'bitxor', 'invert', 'not_', 'uadd', 'usub', 'eq', 'ne', 'lt', 'le',
     'gt', 'ge', 'is_', 'addressof',
 ])
 
-def dce(func, env=None):
+class Exit(object):
+    """Virtual exit node of the reverse CFG"""
+
+    def __repr__(self):
+        return "Exit"
+
+def reverse_cfg(func, cfg):
+    """
+    Reverse CFG with a virtual exit node as root. Blocks without successors
+    and blocks that cannot reach such a block (infinite loops) are
+    connected to the exit.
+
+    Returns (reverse_cfg, exit, blocks_not_reaching_exit)
+    """
+    exit = Exit()
+    rcfg = cfg.reverse(copy=True)
+    rcfg.add_node(exit)
+    for block in cfg.nodes():
+        if not list(cfg.successors(block)):
+            rcfg.add_edge(exit, block)
+
+    # Connect infinite loops to the exit
+    reached = _reach(rcfg, exit, set())
+    stuck = set(cfg.nodes()) - reached
+    for block in func.blocks:
+        if block in stuck and block not in reached:
+            rcfg.add_edge(exit, block)
+            _reach(rcfg, block, reached)
+
+    return rcfg, exit, stuck
+
+def _reach(graph, root, seen):
+    """Add all nodes reachable from root to `seen`"""
+    seen.add(root)
+    worklist = [root]
+    while worklist:
+        node = worklist.pop()
+        for succ in graph.successors(node):
+            if succ not in seen:
+                seen.add(succ)
+                worklist.append(succ)
+    return seen
+
+def control_dependences(func, cfg):
     """
-    Eliminate dead code.
+    Compute the control dependences of each block:
 
-    TODO: Prune branches, dead loops
+        { block : set of blocks whose terminators decide whether block
+                  executes }
+
+    Also returns the immediate post-dominators and the virtual exit node.
     """
+    rcfg, exit, stuck = reverse_cfg(func, cfg)
+    ipdoms = nx.immediate_dominators(rcfg, exit)
+    frontiers = nx.dominance_frontiers(rcfg, exit)
+    cds = dict((block, set(frontiers.get(block, ())))
+                   for block in cfg.nodes())
+    return cds, ipdoms, exit, stuck
+
+# ______________________________________________________________________
+
+def mark(func, cds, ipdoms, exit, stuck):
+    """Compute the set of live Ops"""
+    live = set()
+    live_blocks = set()
+    worklist = []
+
+    def mark_live(op):
+        if op not in live:
+            live.add(op)
+            worklist.append(op)
+
+    # Roots: side effects, exception handling and unavoidable branches
     for op in func.ops:
-        if op.opcode in effect_free and len(func.uses[op]) == 0:
-            op.delete()
+        if op.opcode == 'cbranch':
+            if op.block in stuck or ipdoms[op.block] is exit:
+                mark_live(op)
+        elif op.opcode == 'jump':
+            pass
+        elif op.opcode not in effect_free or op.opcode in ('exc_setup',
+                                                           'exc_catch'):
+            mark_live(op)
+
+    while worklist:
+        op = worklist.pop()
+        for arg in flatten(op.args):
+            if isinstance(arg, Op):
+                mark_live(arg)
+
+        if op.opcode == 'phi':
+            for pred in op.args[0]:
+                mark_live(pred.terminator)
+
+        block = op.block
+        if block not in live_blocks:
+            live_blocks.add(block)
+            for dep in cds[block]:
+                mark_live(dep.terminator)
+
+    return live
+
+def region(start, stop, cfg):
+    """Blocks reachable from `start` without going through `stop`"""
+    seen = set([start])
+    worklist = [start]
+    while worklist:
+        block = worklist.pop()
+        for succ in cfg.successors(block):
+            if succ is not stop and succ not in seen:
+                seen.add(succ)
+                worklist.append(succ)
+    return seen
+
+def sweep(func, cfg, live, ipdoms):
+    """Rewrite dead branches and delete dead blocks and Ops"""
+    b = Builder(func)
+
+    # -------------------------------------------------
+    # Redirect dead branches to their immediate post-dominator
+
+    incoming = [] # [(phi, block, value)]
+    for block in list(func.blocks):
+        branch = block.terminator
+        if branch.opcode != 'cbranch' or branch in live:
+            continue
+
+        target = ipdoms[block]
+        blocks = region(block, target, cfg)
+        for phi in target.leaders:
+            if phi.opcode == 'phi' and phi in live:
+                for pred, value in zip(*phi.args):
+                    if pred in blocks:
+                        incoming.append((phi, block, value))
+                        break
+
+        b.position_after(branch)
+        b.jump(target)
+        branch.delete()
+
+    # -------------------------------------------------
+    # Delete blocks that became unreachable and fix up phis
+
+    flow = cfa.cfg(func)
+    cfa.delete_unreachable(func, flow)
+
+    for phi, block, value in incoming:
+        preds, values = phi.args
+        if block not in preds:
+            phi.set_args([preds + [block], values + [value]])
+
+    for target in func.blocks:
+        for phi in target.leaders:
+            if phi.opcode == 'phi':
+                preds = set(flow.predecessors(target))
+                pairs = [(p, v) for p, v in zip(*phi.args) if p in preds]
+                if len(pairs) != len(phi.args[0]):
+                    phi.set_args([[p for p, v in pairs],
+                                  [v for p, v in pairs]])
+
+    # -------------------------------------------------
+    # Delete dead Ops
+
+    dead = [op for op in func.ops
+                   if op not in live and op.opcode != 'jump']
+    for op in dead:
+        op.set_args([[] if isinstance(arg, list) else None
+                          for arg in op.args])
+    for op in dead:
+        op.delete()
+
+    return dead
+
+def dce(func, env=None):
+    """
+    Eliminate dead code, dead branches and dead loops.
+    """
+    cfa.delete_unreachable(func)
+
+    cfg = cfa.cfg(func)
+    cds, ipdoms, exit, stuck = control_dependences(func, cfg)
+    live = mark(func, cds, ipdoms, exit, stuck)
+    sweep(func, cfg, live, ipdoms)
 
-run = dce
\ No newline at end of file
+run = dce
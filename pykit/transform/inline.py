@@ -5,60 +5,105 @@ Function inlining.
 """
 
 from pykit.error import CompileError
-from pykit.analysis import loop_detection
-from pykit.ir import Function, Builder, findallops, copy_function, verify
+from pykit.analysis import cfa, loop_detection
+from pykit.analysis.callgraph import callgraph, module_callgraph, bottom_up
+from pykit.ir import (Function, Block, Const, Builder, findallops, copy_function,
+                      verify)
+from pykit.utils import flatten
 from pykit.transform import ret as ret_normalization
 
 def rewrite_return(func):
-    """Rewrite ret ops to assign to a variable instead, which is returned"""
-    ret_normalization.run(func)
-    [ret] = findallops(func, 'ret')
+    """
+    Rewrite ret ops to assign to a variable instead, which is returned.
+    Functions with a single return are left alone. The final ret is removed.
+
+    Returns (return value, block that held the ret).
+    """
+    rets = findallops(func, 'ret')
+    if len(rets) != 1:
+        ret_normalization.run(func)
+        rets = findallops(func, 'ret')
+
+    [ret] = rets
     [value] = ret.args
+    block = ret.block
     ret.delete()
-    return value
+    return value, block
 
-def inline(func, call):
+def inline(func, call, verify_result=True):
     """
-    Inline the call instruction into func.
-
-    :param uses: defuse information
+    Inline the call instruction into func. Use information of `func` is
+    updated incrementally, so many calls can be inlined in a row before
+    verifying the function once.
     """
     callee = call.args[0]
     # assert_inlinable(func, call, callee, uses)
 
     builder = Builder(func)
-    builder.position_before(call)
-    inline_header, inline_exit = builder.splitblock()
+    inline_header, inline_exit = split_before(func, call)
     new_callee = copy_function(callee, temper=func.temp)
-    result = rewrite_return(new_callee)
+    result, return_block = rewrite_return(new_callee)
 
     # Fix up arguments
-    for funcarg, arg in zip(new_callee.args, call.args[1]):
+    argmap = dict(zip(new_callee.args, call.args[1]))
+    for funcarg, arg in argmap.items():
         funcarg.replace_uses(arg)
+    result = argmap.get(result, result)
 
-    # Copy blocks
+    # Copy blocks and register the uses of the copied ops with `func`
     after = inline_header
     for block in new_callee.blocks:
         block.parent = None
         func.add_block(block, after=after)
         after = block
+        for op in block:
+            func.add_op(op)
 
     # Fix up wiring
+    builder.position_at_end(inline_header)
     builder.jump(new_callee.startblock)
-    with builder.at_end(new_callee.exitblock):
+    with builder.at_end(return_block):
         builder.jump(inline_exit)
 
     # Fix up final result of call
     if result is not None:
         # non-void return
-        result.unlink()
-        result.result = call.result
-        call.replace(result)
-    else:
-        call.delete()
+        call.replace_uses(result)
+    call.delete()
+
+    if verify_result:
+        verify(func)
+
+def split_before(func, op):
+    """
+    Split the block of `op` before `op`, moving `op` and all following ops
+    into a new block. Phis in successor blocks are updated. The original
+    block is left unterminated.
+
+    Returns (old_block, new_block).
+    """
+    block = op.block
+    newblock = func.add_block(Block(func.temp(block.name), func), after=block)
+    trailing = list(block.ops.iter_from(op))
+    for trailing_op in trailing:
+        trailing_op.unlink()
+    newblock.extend(trailing)
+
+    for target in successors(newblock):
+        for phi in target.leaders:
+            if phi.opcode == 'phi':
+                preds, values = phi.args
+                if any(pred is block for pred in preds):
+                    preds = [newblock if pred is block else pred
+                                 for pred in preds]
+                    phi.set_args([preds, values])
 
-    func.reset_uses()
-    verify(func)
+    return block, newblock
+
+def successors(block):
+    """Blocks targeted by the terminator of `block`"""
+    return [arg for arg in flatten(block.terminator.args)
+                    if isinstance(arg, Block)]
 
 def assert_inlinable(func, call, callee, uses):
     """
@@ -84,3 +129,138 @@ def assert_inlinable(func, call, callee, uses):
         if len(uses[call]) != 2:
             return CompileError("Can only")
         loops = loop_detection.find_natural_loops(func)
+
+#===------------------------------------------------------------------===
+# Module inliner
+#===------------------------------------------------------------------===
+
+class CostModel(object):
+    """
+    Inlining policy. The cost of inlining a call site is the size of the
+    callee (in ops), minus the call overhead and a bonus for each constant
+    argument. A call site is inlined if its cost is below the threshold,
+    which grows with the loop depth of the call site:
+
+        cost(call) <= threshold + loop_bonus * loop_depth(call)
+
+    Growth is bounded per function (relative to its original size) and for
+    the module as a whole.
+    """
+
+    def __init__(self, threshold=25, call_cost=5, const_arg_bonus=5,
+                 loop_bonus=15, function_growth=3.0, function_slack=50,
+                 module_growth=1.5, module_slack=200):
+        self.threshold = threshold
+        self.call_cost = call_cost
+        self.const_arg_bonus = const_arg_bonus
+        self.loop_bonus = loop_bonus
+        self.function_growth = function_growth
+        self.function_slack = function_slack
+        self.module_growth = module_growth
+        self.module_slack = module_slack
+
+    def cost(self, call, callee_size):
+        """Cost of inlining `call`, given the size of the callee"""
+        args = call.args[1]
+        nconst = sum(isinstance(arg, Const) for arg in args)
+        return (callee_size - self.call_cost - len(args)
+                            - self.const_arg_bonus * nconst)
+
+    def threshold_at(self, loop_depth):
+        """Maximum cost for a call site at the given loop depth"""
+        return self.threshold + self.loop_bonus * loop_depth
+
+    def function_budget(self, size):
+        """Maximum size of a function with original size `size`"""
+        return int(size * self.function_growth) + self.function_slack
+
+    def module_budget(self, size):
+        """Maximum size of a module with original size `size`"""
+        return int(size * self.module_growth) + self.module_slack
+
+
+def function_size(func):
+    """Size of a function in number of ops (excluding phis and jumps)"""
+    return sum(1 for op in func.ops if op.opcode not in ('phi', 'jump'))
+
+def inlinable(func, call, scc):
+    """Whether `call` in `func` can be inlined, `scc` holds its SCC members"""
+    callee = call.args[0]
+    if not isinstance(callee, Function) or not callee.blocks.head:
+        return False
+    if callee is func or callee in scc:
+        return False # (mutual) recursion
+    if len(call.args[1]) != len(callee.args):
+        return False
+    if any(op.opcode == 'exc_setup' for op in call.block.leaders):
+        return False # handlers would not cover the inlined blocks
+    return not findallops(callee, 'yield')
+
+def inline_graph(graph, env=None, costmodel=None):
+    """
+    Inline call sites in all functions of the call graph, bottom-up, so
+    that callees are inlined into before they are themselves inlined.
+
+    Returns the set of changed functions.
+    """
+    costmodel = costmodel or (env or {}).get("inline.costmodel") or CostModel()
+    sizes = dict((func, function_size(func)) for func in graph.nodes())
+    module_size = sum(sizes.values())
+    module_budget = costmodel.module_budget(module_size)
+    changed = set()
+
+    for scc in bottom_up(graph):
+        members = set(scc)
+        for func in scc:
+            budget = costmodel.function_budget(sizes[func])
+            candidates = select_calls(func, members, sizes, costmodel)
+
+            # Inline in reverse program order: every block split then
+            # only moves the ops up to the previously inlined call site
+            inlined = False
+            for call, cost in reversed(candidates):
+                callee_size = sizes[call.args[0]]
+                growth = callee_size - 1
+                if (sizes[func] + growth > budget or
+                        module_size + growth > module_budget):
+                    continue
+
+                inline(func, call, verify_result=False)
+                sizes[func] += growth
+                module_size += growth
+                inlined = True
+
+            if inlined:
+                cfa.run(func)
+                module_size -= sizes[func]
+                sizes[func] = function_size(func)
+                module_size += sizes[func]
+                changed.add(func)
+
+    for func in changed:
+        verify(func)
+
+    return changed
+
+def select_calls(func, scc, sizes, costmodel):
+    """Select call sites worth inlining in program order: [(call, cost)]"""
+    calls = [op for op in func.ops
+                    if op.opcode == 'call' and inlinable(func, op, scc)]
+    if not calls:
+        return []
+
+    loops = loop_detection.find_loops(func)
+    selected = []
+    for call in calls:
+        cost = costmodel.cost(call, sizes[call.args[0]])
+        if cost <= costmodel.threshold_at(loops.depth(call.block)):
+            selected.append((call, cost))
+    return selected
+
+def inline_module(module, env=None, costmodel=None):
+    """Inline call sites in all functions of the module"""
+    return inline_graph(module_callgraph(module), env, costmodel)
+
+def run(func, env=None):
+    """Inline call sites in `func` and the functions it (transitively) calls"""
+    inline_graph(callgraph(func), env)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+Control flow graph simplification:
+
+    - fold cbranch on constants and cbranch with identical targets to jumps
+    - thread jumps through empty blocks
+    - remove unreachable blocks
+    - merge blocks into their single predecessor
+
+This cleans up after lowering passes and the Builder, which leave behind
+trampoline blocks and branches on constants. Phis are kept up to date.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit.analysis import cfa
+from pykit.ir import ops, Block, Const
+
+def phis(block):
+    return [op for op in block.leaders if op.opcode == ops.phi]
+
+def remove_incoming(block, pred):
+    """Remove incoming values from `pred` from the phis in `block`"""
+    for phi in phis(block):
+        preds, values = phi.args
+        if any(p is pred for p in preds):
+            incoming = [(p, v) for p, v in zip(preds, values) if p is not pred]
+            phi.set_args([[p for p, v in incoming], [v for p, v in incoming]])
+
+def incoming_value(phi, pred):
+    """Incoming value of `phi` for predecessor `pred`, or None"""
+    for p, v in zip(*phi.args):
+        if p is pred:
+            return v
+
+def same_value(a, b):
+    if isinstance(a, Const) and isinstance(b, Const):
+        return a.type == b.type and a.const == b.const
+    return a is b
+
+# ______________________________________________________________________
+
+def fold_branches(func):
+    """
+    Rewrite cbranch on constants and cbranch with identical targets to
+    jumps. Returns whether anything changed.
+    """
+    changed = False
+    for block in func.blocks:
+        op = block.terminator
+        if op.opcode != ops.cbranch:
+            continue
+
+        test, true_block, false_block = op.args
+        if true_block is false_block:
+            taken, untaken = true_block, None
+        elif isinstance(test, Const):
+            if test.const:
+                taken, untaken = true_block, false_block
+            else:
+                taken, untaken = false_block, true_block
+        else:
+            continue
+
+        if untaken is not None:
+            remove_incoming(untaken, block)
+        op.replace_op(ops.jump, [taken])
+        changed = True
+
+    return changed
+
+def thread_jumps(func):
+    """
+    Thread jumps through empty blocks (blocks with only a jump), so that
+    the empty blocks become unreachable. Returns whether anything changed.
+    """
+    # Blocks referenced as exception handlers are kept as is
+    handlers = set()
+    for op in func.ops:
+        if op.opcode == ops.exc_setup:
+            handlers.update(op.args[0])
+
+    forwards = {} # { empty block : target }
+    for block in func.blocks:
+        op = block.head
+        if (block is not func.startblock and block not in handlers and
+                op.opcode == ops.jump):
+            forwards[block] = op.args[0]
+
+    destinations = {} # { empty block : (final target, last empty block) }
+    def destination(block):
+        """Follow a chain of empty blocks, None for cycles"""
+        path, seen = [], set()
+        while block in forwards and block not in destinations:
+            if block in seen:
+                return None
+            path.append(block)
+            seen.add(block)
+            block = forwards[block]
+
+        if block in destinations:
+            dest = destinations[block]
+        elif path:
+            dest = (block, path[-1])
+        else:
+            return None
+
+        for empty in path:
+            destinations[empty] = dest
+        return dest
+
+    changed = False
+    for block in func.blocks:
+        op = block.terminator
+        replacements = {}
+        for target in op.args:
+            if not isinstance(target, Block) or target not in forwards:
+                continue
+            dest = destination(target)
+            if dest is None or dest[0] is block:
+                continue
+
+            final, last = dest
+            if _can_thread(block, final, last):
+                for phi in phis(final):
+                    if incoming_value(phi, block) is None:
+                        preds, values = phi.args
+                        phi.set_args([preds + [block],
+                                      values + [incoming_value(phi, last)]])
+                replacements[target] = final
+
+        if replacements:
+            op.set_args([replacements.get(arg, arg) for arg in op.args])
+            changed = True
+
+    return changed
+
+def _can_thread(pred, target, last):
+    """
+    Whether the edge from `pred` into a chain of empty blocks can be
+    redirected to `target`, where `last` is the last block of the chain.
+    """
+    for phi in phis(target):
+        value = incoming_value(phi, pred)
+        if value is not None and not same_value(value,
+                                                incoming_value(phi, last)):
+            return False
+    return True
+
+# ______________________________________________________________________
+
+def simplify_cfg(func, env=None):
+    """Simplify the CFG of `func` until no more simplifications apply"""
+    changed = True
+    while changed:
+        changed = fold_branches(func)
+        changed |= thread_jumps(func)
+        changed |= bool(cfa.delete_unreachable(func))
+        changed |= bool(cfa.simplify(func, cfa.cfg(func)))
+
+run = simplify_cfg
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const, opcodes, verify, interp
+from pykit.transform import dce
+from pykit.tests import build_loop
+
+I = types.Int32
+
+def build_dce_loop(return_sum):
+    """
+    A sum loop (see pykit.tests.build_loop) with in the entry block:
+
+        a = n + 1; b = a * a; c = b - n     # dead chain
+        r = n * 3
+
+    returning s if return_sum else r
+    """
+    func, (entry, cond, body, exit), _ = build_loop()
+    b = Builder(func)
+    n = func.get_arg('n')
+    b.position_before(entry.terminator)
+    a = b.add(I, [n, Const(1, I)])
+    b.sub(I, [b.mul(I, [a, a]), n])
+    r = b.mul(I, [n, Const(3, I)])
+    if not return_sum:
+        exit.terminator.set_args([r])
+    return func
+
+class TestDCE(unittest.TestCase):
+
+    def test_dead_chain_and_loop(self):
+        func = build_dce_loop(return_sum=False)
+        dce.dce(func)
+        verify(func)
+        self.assertEqual(opcodes(func), ['mul', 'jump', 'jump', 'ret'])
+        self.assertEqual(interp.run(func, args=[5]), 15)
+
+    def test_live_loop(self):
+        func = build_dce_loop(return_sum=True)
+        dce.dce(func)
+        verify(func)
+        self.assertEqual(opcodes(func), ['jump', 'phi', 'phi', 'lt', 'cbranch',
+                                         'add', 'add', 'jump', 'ret'])
+        self.assertEqual(interp.run(func, args=[5]), 10)
+
+    def test_unreachable(self):
+        func = Function("g", ['x'], types.Function(I, [I]))
+        entry, dead, exit = [func.new_block(name)
+                                 for name in ('entry', 'dead', 'exit')]
+        b = Builder(func)
+        x = func.get_arg('x')
+        with b.at_end(entry):
+            b.jump(exit)
+        with b.at_end(dead):
+            y = b.add(I, [x, x])
+            b.print(y)
+            b.jump(exit)
+        with b.at_end(exit):
+            p = b.phi(I, [[entry, dead], [x, y]])
+            b.ret(p)
+
+        dce.dce(func)
+        verify(func)
+        self.assertEqual([block.name for block in func.blocks],
+                         ['entry', 'exit'])
+        self.assertEqual(p.args, [[entry], [x]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,10 +4,13 @@ from __future__ import print_function, division, absolute_import
 import unittest
 import textwrap
 
+from pykit import types
 from pykit.analysis import cfa
 from pykit.parsing import from_c
 from pykit.transform import ret, inline
-from pykit.ir import opcodes, findallops, verify, interp
+from pykit.tests import build_loop
+from pykit.ir import (Module, Function, Builder, Const, opcodes, findallops,
+                      verify, interp)
 
 class TestInlining(unittest.TestCase):
 
@@ -67,3 +70,70 @@ class TestInlining(unittest.TestCase):
         # TODO: update phi when splitting blocks
         # result2 = interp.run(func)
         # assert result == result2
+
+
+I = types.Int32
+
+def build_square(mod):
+    """int square(int x) { return x * x; }"""
+    func = Function("square", ['x'], types.Function(I, [I]))
+    mod.add_function(func)
+    b = Builder(func)
+    b.position_at_end(func.new_block("entry"))
+    x = func.get_arg('x')
+    b.ret(b.mul(I, [x, x]))
+    return func
+
+def build_sum_squares(mod, callee):
+    """int sum(int n) { s = 0; for i in range(n): s += callee(i); return s }"""
+    call = lambda b, i: b.call(I, [callee, [i]])
+    func, _, _ = build_loop(call, name="sum")
+    mod.add_function(func)
+    return func
+
+class TestModuleInlining(unittest.TestCase):
+
+    def test_inline_module(self):
+        mod = Module()
+        square = build_square(mod)
+        func = build_sum_squares(mod, square)
+        expected = interp.run(func, args=[10])
+
+        changed = inline.inline_module(mod)
+        self.assertEqual(changed, set([func]))
+        self.assertEqual(findallops(func, 'call'), [])
+        self.assertEqual(interp.run(func, args=[10]), expected)
+
+    def test_inline_bottom_up(self):
+        mod = Module()
+        square = build_square(mod)
+        func = build_sum_squares(mod, square)
+        g = Function("g", ['n'], types.Function(I, [I]))
+        mod.add_function(g)
+        b = Builder(g)
+        b.position_at_end(g.new_block("entry"))
+        b.ret(b.call(I, [func, [Const(5, I)]]))
+
+        inline.inline_module(mod)
+        self.assertEqual(findallops(g, 'call'), [])
+        self.assertTrue(findallops(g, 'mul'))
+        self.assertEqual(interp.run(g, args=[0]), 30)
+
+    def test_cost_model(self):
+        mod = Module()
+        square = build_square(mod)
+        func = build_sum_squares(mod, square)
+
+        costmodel = inline.CostModel(threshold=-100, loop_bonus=0)
+        self.assertEqual(inline.inline_module(mod, costmodel=costmodel), set())
+        self.assertEqual(len(findallops(func, 'call')), 1)
+
+    def test_recursion(self):
+        mod = Module()
+        func = Function("f", ['x'], types.Function(I, [I]))
+        mod.add_function(func)
+        b = Builder(func)
+        b.position_at_end(func.new_block("entry"))
+        b.ret(b.call(I, [func, [func.get_arg('x')]]))
+
+        self.assertEqual(inline.inline_module(mod), set())
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from pykit import types
+from pykit.ir import Function, Builder, Const, opcodes, verify, interp
+from pykit.transform import simplifycfg
+
+I = types.Int32
+
+class TestSimplifyCFG(unittest.TestCase):
+
+    def test_simplify(self):
+        """
+        entry: cbranch(c, t1, e1)
+        t1:    jump(t2)                 # trampolines, threaded
+        t2:    jump(join)
+        e1:    y = x + 1; jump(join)
+        join:  p = phi(t2: x, e1: y); cbranch(true, exit, dead)
+        dead:  jump(exit)               # folded away
+        exit:  ret(phi(join: p, dead: 0))
+        """
+        func = Function("f", ['c', 'x'], types.Function(I, [types.Bool, I]))
+        names = ['entry', 't1', 't2', 'e1', 'join', 'dead', 'exit']
+        entry, t1, t2, e1, join, dead, exit = map(func.new_block, names)
+        b = Builder(func)
+        c, x = func.args
+        with b.at_end(entry):
+            b.cbranch(c, t1, e1)
+        with b.at_end(t1):
+            b.jump(t2)
+        with b.at_end(t2):
+            b.jump(join)
+        with b.at_end(e1):
+            y = b.add(I, [x, Const(1, I)])
+            b.jump(join)
+        with b.at_end(join):
+            p = b.phi(I, [[t2, e1], [x, y]])
+            b.cbranch(Const(True, types.Bool), exit, dead)
+        with b.at_end(dead):
+            b.jump(exit)
+        with b.at_end(exit):
+            b.ret(b.phi(I, [[join, dead], [p, Const(0, I)]]))
+
+        simplifycfg.run(func)
+        verify(func)
+        self.assertEqual(opcodes(func), ['cbranch', 'add', 'jump', 'phi', 'ret'])
+        self.assertEqual(list(func.blocks), [entry, e1, join])
+        self.assertEqual(p.args, [[e1, entry], [y, x]])
+        self.assertEqual(interp.run(func, args=[True, 3]), 3)
+        self.assertEqual(interp.run(func, args=[False, 3]), 4)
+
+    def test_identical_targets(self):
+        func = Function("f", ['c'], types.Function(I, [types.Bool]))
+        entry, exit = func.new_block('entry'), func.new_block('exit')
+        b = Builder(func)
+        with b.at_end(entry):
+            b.cbranch(func.get_arg('c'), exit, exit)
+        with b.at_end(exit):
+            b.ret(Const(1, I))
+
+        simplifycfg.run(func)
+        verify(func)
+        self.assertEqual(opcodes(func), ['ret'])
+
+    def test_phi_conflict(self):
+        """Do not thread an edge if the phi values would disagree"""
+        func = Function("f", ['c'], types.Function(I, [types.Bool]))
+        entry, empty, exit = map(func.new_block, ['entry', 'empty', 'exit'])
+        b = Builder(func)
+        with b.at_end(entry):
+            b.cbranch(func.get_arg('c'), empty, exit)
+        with b.at_end(empty):
+            b.jump(exit)
+        with b.at_end(exit):
+            b.ret(b.phi(I, [[entry, empty], [Const(1, I), Const(2, I)]]))
+
+        simplifycfg.run(func)
+        verify(func)
+        self.assertEqual(len(list(func.blocks)), 3)
+        self.assertEqual(interp.run(func, args=[True]), 2)
+        self.assertEqual(interp.run(func, args=[False]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
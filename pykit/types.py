@@ -18,6 +18,8 @@ class Type(object):
     def __nonzero__(self):
         return True
 
+    __bool__ = __nonzero__
+
     def __hash__(self):
         obj = tuple(tuple(c) if isinstance(c, list) else c for c in self)
         return hash(obj)
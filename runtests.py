@@ -11,7 +11,9 @@ if len(sys.argv) > 1:
     kwds["pattern"] = '*' + sys.argv[1] + '*'
 
 root = dirname(abspath(pykit.__file__))
-order = ['parsing', 'ir', 'adt', 'utils', 'analysis', 'transform', 'lower',
-         'codegen', join('codegen', 'llvm')]
+order = ['parsing', 'ir', 'adt', 'utils', 'analysis', 'transform',
+         'optimizations', 'lower', 'runtime', 'codegen',
+         join('codegen', 'llvm'), join('codegen', 'llvmlite'),
+         join('codegen', 'c')]
 dirs = [join(root, pkg, 'tests') for pkg in order]
 sys.exit(pykit.run_tests(dirs, **kwds))
\ No newline at end of file
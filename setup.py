@@ -41,6 +41,7 @@ setup(
         '': ['*.md', '*.cfg'],
         'pykit': ['*.txt'],
         'pykit.ir': ['*.h'],
+        'pykit.runtime': ['*.c'],
         },
     ext_modules=[],
     cmdclass=cmdclass,